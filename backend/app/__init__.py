@@ -1,11 +1,51 @@
 import os
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import inspect, text
 
-from .models import db
+from .models import db, ContactSearchTerm
+from .cache import init_cache, get_contact_cache, get_user_cache
+from .metrics import init_metrics, get_metrics, metrics_authorized
+from .json_provider import init_json
+from .utils.rate_limit import TokenBucketLimiter
+from .jobs import recover_jobs
+from .schema import sync_schema
+from .utils.search import rebuild_index
 from config import config
 
 
+def migrate_app(app):
+    """
+    Prepare the upload folder and database schema
+    
+    Builds the search index of existing contacts when its table is created.
+    
+    Args:
+        app: Flask app, its app context must be active
+    
+    Returns:
+        List of schema changes applied
+    """
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    search_index_missing = not inspect(db.engine).has_table(ContactSearchTerm.__tablename__)
+    changes = sync_schema()
+    
+    # The n-gram table of the first search index, replaced by contact_search_terms
+    if inspect(db.engine).has_table('contact_search_tokens'):
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE contact_search_tokens'))
+        changes.append('dropped table contact_search_tokens')
+    
+    # Contacts created before the search index existed must be indexed to be found
+    if search_index_missing:
+        count = rebuild_index()
+        db.session.commit()
+        if count:
+            changes.append(f'indexed {count} contacts for search')
+    return changes
+
+
 def create_app(config_name=None):
     """Application factory for creating Flask app"""
     if config_name is None:
@@ -14,30 +54,80 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Client IPs for the login rate limit come from X-Forwarded-For behind a proxy.
+    # The WSGI callable is wrapped, not the app, so gunicorn hooks still get the Flask app
+    if app.config['TRUSTED_PROXY_HOPS']:
+        hops = app.config['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    
     # Initialize extensions
     db.init_app(app)
     CORS(app, supports_credentials=True)
-    
-    # Create upload folder if not exists
-    if not os.path.exists(app.config.get('UPLOAD_FOLDER', 'uploads')):
-        os.makedirs(app.config.get('UPLOAD_FOLDER', 'uploads'))
+    init_cache(app)
+    init_json(app)
+    init_metrics(app)
+    # Created here so an invalid LOGIN_RATE_LIMIT_* fails at startup, not on the first login
+    app.extensions['login_limiter'] = TokenBucketLimiter(
+        app.config['LOGIN_RATE_LIMIT_BURST'],
+        app.config['LOGIN_RATE_LIMIT_PER_MINUTE'] / 60
+    )
     
     # Register blueprints
     from .routes.auth import auth_bp
     from .routes.contacts import contacts_bp
     from .routes.import_export import import_export_bp
+    from .routes.jobs import jobs_bp
+    from .routes.uploads import uploads_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(contacts_bp, url_prefix='/api/contacts')
     app.register_blueprint(import_export_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
+    
+    # Production servers run `flask migrate` once at deploy time instead
+    if app.config['AUTO_MIGRATE']:
+        with app.app_context():
+            for change in migrate_app(app):
+                app.logger.info('Schema: %s', change)
+        # Under gunicorn every worker does this in post_fork instead
+        recover_jobs(app)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    @app.cli.command('migrate')
+    def migrate():
+        """Create the upload folder, database tables, new columns and indexes"""
+        changes = migrate_app(app)
+        for change in changes:
+            print(change)
+        print(f'{len(changes)} schema changes applied')
+    
+    @app.cli.command('reindex-search')
+    def reindex_search():
+        """Rebuild the contact search index"""
+        count = rebuild_index()
+        db.session.commit()
+        print(f'Indexed {count} contacts')
     
     @app.route('/api/health')
     def health_check():
         """Health check endpoint"""
         return {'status': 'ok', 'message': 'Address Book API is running'}
     
+    @app.route('/api/cache/stats')
+    def cache_stats():
+        """Contact and user cache hit/miss counters of this process"""
+        if not metrics_authorized():
+            return {'error': '未授权访问监控数据'}, 401
+        return {**get_contact_cache().stats(), 'users': get_user_cache().stats()}
+    
+    @app.route('/api/metrics')
+    def metrics():
+        """Request, SQL and cache metrics of this process in the Prometheus text format"""
+        if not metrics_authorized():
+            return {'error': '未授权访问监控数据'}, 401
+        metrics = get_metrics()
+        if metrics is None:
+            return {'error': '未启用性能监控'}, 404
+        return metrics.render(get_contact_cache().stats(), get_user_cache().stats()), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    
     return app
@@ -0,0 +1,271 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, has_app_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from .models import User, RoutingSession
+from .routes.auth import get_current_user_id
+
+
+class LRUCache:
+    """
+    In-process LRU cache with per-key TTL
+    
+    Implements the subset of the Redis client interface used by
+    ContactCache (get, set with ex, incr, delete), so a redis.Redis
+    client can be used in its place.
+    """
+    
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ex=None):
+        """Store a value, expiring after ex seconds if given"""
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return True
+    
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            value = int(value) + 1
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            return value
+    
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+    
+    def __len__(self):
+        return len(self._data)
+
+
+class ContactCache:
+    """
+    Per-user cache of serialized contact responses
+    
+    Every key embeds the user's contacts_version, which mutations bump in
+    the database in the same transaction as the change. Older entries are
+    never read again and age out of the backend, and all server processes
+    agree on the current version.
+    """
+    
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Request threads update the counters concurrently
+        self._stats_lock = threading.Lock()
+    
+    def get(self, user_id, version, key):
+        value = self.backend.get(f'contacts:{user_id}:{version}:{key}')
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    
+    def set(self, user_id, version, key, value):
+        self.backend.set(f'contacts:{user_id}:{version}:{key}', value, ex=self.ttl)
+    
+    def stats(self):
+        """Hit/miss counters of this process"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'size': len(self.backend) if isinstance(self.backend, LRUCache) else None
+        }
+
+
+class UserCache:
+    """
+    Per-process cache of user profiles as returned by User.to_dict
+    
+    Entries are dropped when a change to the user is committed in this
+    process, other processes see it once the TTL expires.
+    """
+    
+    def __init__(self, max_size=10000, ttl=60):
+        self.backend = LRUCache(max_size=max_size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Lookups answered by the request memo, without touching the cache
+        self.memo_hits = 0
+        # Request threads update the counters concurrently
+        self._stats_lock = threading.Lock()
+    
+    def get(self, user_id):
+        profile = self.backend.get(user_id)
+        with self._stats_lock:
+            if profile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return profile
+    
+    def record_memo_hit(self):
+        """Count a lookup answered by the request memo"""
+        with self._stats_lock:
+            self.memo_hits += 1
+    
+    def set(self, user_id, profile):
+        self.backend.set(user_id, profile, ex=self.ttl)
+    
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+    
+    def stats(self):
+        """Hit/miss counters of this process, queries_saved counts both cache and memo hits"""
+        with self._stats_lock:
+            hits, misses, memo_hits = self.hits, self.misses, self.memo_hits
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'memo_hits': memo_hits,
+            'queries_saved': hits + memo_hits,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'size': len(self.backend)
+        }
+
+
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+def _invalidate_changed_users(session):
+    user_ids = session.info.pop('changed_user_ids', None)
+    if user_ids and has_app_context() and 'user_cache' in current_app.extensions:
+        for user_id in user_ids:
+            current_app.extensions['user_cache'].invalidate(user_id)
+
+
+def _forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+
+# Drop cached profiles once changes to them are committed
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_changed)
+event.listen(RoutingSession, 'after_commit', _invalidate_changed_users)
+event.listen(RoutingSession, 'after_rollback', _forget_changed_users)
+
+
+def init_cache(app):
+    """Create the contact cache from CACHE_BACKEND, local or redis"""
+    backend_name = app.config['CACHE_BACKEND']
+    if backend_name == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package')
+        backend = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+    elif backend_name == 'local':
+        backend = LRUCache(max_size=app.config['CACHE_MAX_SIZE'])
+    else:
+        raise ValueError(f'Unknown CACHE_BACKEND: {backend_name}')
+    
+    app.extensions['contact_cache'] = ContactCache(backend, ttl=app.config['CACHE_TTL'])
+    app.extensions['user_cache'] = UserCache(
+        max_size=app.config['USER_CACHE_MAX_SIZE'],
+        ttl=app.config['USER_CACHE_TTL']
+    )
+
+
+def get_contact_cache():
+    """Get the contact cache of the current app"""
+    return current_app.extensions['contact_cache']
+
+
+def get_user_cache():
+    """Get the user profile cache of the current app"""
+    return current_app.extensions['user_cache']
+
+
+def invalidate_contacts(user_id):
+    """
+    Invalidate cached responses and ETags of a user, call before committing the change
+    
+    Returns:
+        The user's new contacts version
+    """
+    return User.bump_contacts_version(user_id)
+
+
+def _make_etag(user_id, version, key):
+    """Strong ETag for a response of a user at a contacts version"""
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return f'{user_id}-{version}-{digest}'
+
+
+def cached_per_user(f):
+    """
+    Decorator caching successful JSON responses per user and query string
+    
+    The response carries a strong ETag derived from the user's contacts
+    version. A matching If-None-Match is answered with 304 before any
+    contact row is loaded or serialized.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        cache = get_contact_cache()
+        user_id = get_current_user_id()
+        # read_replica has already read the version from the primary
+        version = g.get('contacts_version')
+        if version is None:
+            version = User.get_contacts_version(user_id)
+        if version is None:
+            return f(*args, **kwargs)
+        
+        key = f'{request.path}?{"&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))}'
+        etag = _make_etag(user_id, version, key)
+        
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            body = cache.get(user_id, version, key)
+            if body is not None:
+                response = Response(body, status=200, mimetype='application/json')
+            else:
+                response = f(*args, **kwargs)
+                response, status = response if isinstance(response, tuple) else (response, 200)
+                if status != 200:
+                    return response, status
+                cache.set(user_id, version, key, response.get_data())
+        
+        response.set_etag(etag)
+        # Let browsers keep the response but revalidate it on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
@@ -0,0 +1,41 @@
+from functools import wraps
+from flask import current_app, g
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from .models import db, REPLICA_BIND_KEY
+from .routes.auth import get_current_user_id
+
+
+def _contacts_version(engine, user_id):
+    """Read a user's contacts version from one engine"""
+    with engine.connect() as connection:
+        return connection.execute(
+            text('SELECT contacts_version FROM users WHERE id = :user_id'), {'user_id': user_id}
+        ).scalar()
+
+
+def read_replica(f):
+    """
+    Decorator running the request's reads on the read replica when one is configured
+    
+    The replica is only used if it has caught up with the user's latest
+    change on the primary, so users always read their own writes. The
+    choice holds for the whole request, including streamed responses.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if REPLICA_BIND_KEY in current_app.config.get('SQLALCHEMY_BINDS', {}):
+            user_id = get_current_user_id()
+            primary_version = _contacts_version(db.engines[None], user_id)
+            # Reused by cached_per_user instead of reading it again
+            g.contacts_version = primary_version
+            try:
+                replica_version = _contacts_version(db.engines[REPLICA_BIND_KEY], user_id)
+            except SQLAlchemyError as e:
+                # An unreachable replica must not fail reads the primary can serve
+                current_app.logger.warning('Read replica unavailable: %s', e)
+                replica_version = None
+            if primary_version is not None and replica_version is not None and replica_version >= primary_version:
+                g.use_read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,296 @@
+import json
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from .models import db, Contact, ContactMethod, Job
+from .utils.bulk_import import bulk_import_contacts
+from .utils.dedupe import dedupe_import_contacts
+from .utils.excel import write_contacts_to_excel
+from .utils.formats import EXPORT_FORMATS, iter_contacts_from_path, iter_export_chunks
+
+
+def _job_folder(app):
+    """Folder holding uploaded files and results of jobs"""
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], 'jobs')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _get_executor(app):
+    """Get the app's worker pool, creating it on first use"""
+    executor = app.extensions.get('job_executor')
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+        app.extensions['job_executor'] = executor
+    return executor
+
+
+def _worker_name():
+    """Identify this process in Job.worker"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _process_alive(pid):
+    """Whether a process of this host is running, assumed so where it cannot be checked"""
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_file(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def active_job_count(app):
+    """Number of jobs queued or running in this process"""
+    return len(app.extensions.get('active_jobs', ()))
+
+
+def recover_jobs(app):
+    """
+    Fail the pending and running jobs of processes of this host that exited
+    
+    Jobs run in the thread pool of the process that created them and are
+    lost with it, e.g. when gunicorn recycles a worker. Call when a process
+    starts, jobs of live processes and of other hosts are left alone.
+    
+    Returns:
+        Number of jobs marked as failed
+    """
+    host = socket.gethostname()
+    with app.app_context():
+        jobs = Job.query.filter(
+            Job.status.in_(['pending', 'running']),
+            Job.worker.startswith(f'{host}:', autoescape=True)
+        ).all()
+        
+        count = 0
+        for job in jobs:
+            pid = int(job.worker.rsplit(':', 1)[1])
+            # This process just started, so its PID on a job is a reused one
+            if pid != os.getpid() and _process_alive(pid):
+                continue
+            app.logger.warning('Job %s of exited process %s marked as failed', job.id, job.worker)
+            job.status = 'failed'
+            job.error = '任务执行中断，请重新提交'
+            job.finished_at = datetime.utcnow()
+            # Like failed jobs, the upload is not needed and a partial export is useless
+            _remove_file(job.file_path)
+            job.file_path = None
+            count += 1
+        db.session.commit()
+    return count
+
+
+def _remove_expired_files(app):
+    """Delete the files of jobs finished more than JOB_FILES_EXPIRES ago, without committing"""
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['JOB_FILES_EXPIRES'])
+    for job in Job.query.filter(Job.finished_at < cutoff, Job.file_path.isnot(None)).all():
+        _remove_file(job.file_path)
+        job.file_path = None
+
+
+def create_import_job(user_id, file, file_format, params=None):
+    """
+    Save an uploaded file and queue its import
+    
+    Args:
+        user_id: Owner ID
+        file: Uploaded FileStorage
+        file_format: One of IMPORT_FORMATS
+        params: Optional dict of job options
+        
+    Returns:
+        The created Job
+    """
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    file_path = os.path.join(_job_folder(app), f'{job_id}.upload')
+    file.save(file_path)
+    
+    return _submit(app, Job(
+        id=job_id,
+        user_id=user_id,
+        kind='import',
+        file_format=file_format,
+        params=json.dumps(params or {}),
+        file_path=file_path
+    ))
+
+
+def create_import_job_from_path(user_id, path, file_format, params=None):
+    """
+    Queue the import of a file already on disk, e.g. a completed chunked upload
+    
+    Args:
+        user_id: Owner ID
+        path: Path of the file, it is moved into the job folder
+        file_format: One of IMPORT_FORMATS
+        params: Optional dict of job options
+        
+    Returns:
+        The created Job
+    """
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    file_path = os.path.join(_job_folder(app), f'{job_id}.upload')
+    os.replace(path, file_path)
+    
+    return _submit(app, Job(
+        id=job_id,
+        user_id=user_id,
+        kind='import',
+        file_format=file_format,
+        params=json.dumps(params or {}),
+        file_path=file_path
+    ))
+
+
+def create_export_job(user_id, file_format, params=None):
+    """
+    Queue an export of all contacts of a user
+    
+    Args:
+        user_id: Owner ID
+        file_format: One of EXPORT_FORMATS
+        params: Optional dict of job options
+        
+    Returns:
+        The created Job
+    """
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    extension = EXPORT_FORMATS[file_format][1]
+    
+    return _submit(app, Job(
+        id=job_id,
+        user_id=user_id,
+        kind='export',
+        file_format=file_format,
+        params=json.dumps(params or {}),
+        file_path=os.path.join(_job_folder(app), f'{job_id}.{extension}')
+    ))
+
+
+def _submit(app, job):
+    """Store a job and hand it to the worker pool"""
+    _remove_expired_files(app)
+    job.worker = _worker_name()
+    db.session.add(job)
+    db.session.commit()
+    
+    active_jobs = app.extensions.setdefault('active_jobs', set())
+    future = _get_executor(app).submit(_run_job, app, job.id)
+    active_jobs.add(future)
+    future.add_done_callback(active_jobs.discard)
+    return job
+
+
+def _run_job(app, job_id):
+    """Run a job in a worker thread"""
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return
+        
+        job.status = 'running'
+        db.session.commit()
+        
+        try:
+            if job.kind == 'import':
+                result = _run_import(app, job)
+            else:
+                result = _run_export(app, job)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            app.logger.exception('Job %s failed', job_id)
+        else:
+            job.status = 'succeeded'
+            job.result = json.dumps(result, ensure_ascii=False)
+        
+        # Uploaded files are not needed any more and partial exports are useless
+        if job.kind == 'import' or job.status == 'failed':
+            _remove_file(job.file_path)
+            job.file_path = None
+        
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _run_import(app, job):
+    """
+    Import an uploaded file
+    
+    Each batch is committed together with the job progress, so a failed
+    import keeps the batches that were already imported.
+    """
+    def on_batch(imported_count):
+        job.progress = imported_count
+    
+    params = job.get_params()
+    contacts_data = iter_contacts_from_path(
+        job.file_path, job.file_format, params.get('workers', 1), params.get('sheets', 'active')
+    )
+    on_duplicate = params.get('on_duplicate', 'insert')
+    if on_duplicate != 'insert':
+        return dedupe_import_contacts(
+            job.user_id,
+            contacts_data,
+            on_duplicate,
+            batch_size=app.config['IMPORT_BATCH_SIZE'],
+            atomic=False,
+            on_batch=on_batch
+        )
+    
+    imported_count = bulk_import_contacts(
+        job.user_id,
+        contacts_data,
+        batch_size=app.config['IMPORT_BATCH_SIZE'],
+        atomic=False,
+        on_batch=on_batch
+    )
+    
+    return {'imported_count': imported_count}
+
+
+def _run_export(app, job):
+    """Export the contacts of the job owner into the result file"""
+    params = job.get_params()
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    
+    job.total = Contact.query.filter_by(user_id=job.user_id).count()
+    db.session.commit()
+    
+    def counted(rows):
+        for count, row in enumerate(rows, 1):
+            yield row
+            if count % chunk_size == 0:
+                job.progress = count
+                db.session.commit()
+        job.progress = job.total
+    
+    type_max_count = ContactMethod.max_count_per_type(job.user_id) if job.file_format in ('xlsx', 'csv') else {}
+    rows = counted(Contact.iter_with_methods(job.user_id, chunk_size))
+    
+    if job.file_format == 'xlsx':
+        with open(job.file_path, 'wb') as output:
+            write_contacts_to_excel(rows, type_max_count, output)
+    else:
+        with open(job.file_path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in iter_export_chunks(job.file_format, rows, type_max_count, params.get('version', '3.0')):
+                output.write(chunk)
+    
+    return {'exported_count': job.total, 'file_size': os.path.getsize(job.file_path)}
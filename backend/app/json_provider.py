@@ -0,0 +1,58 @@
+from datetime import date
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """Encode the types neither encoder handles natively"""
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """
+    Flask's default provider, with datetimes written in ISO 8601
+    
+    Matches the output of OrjsonProvider, so row serializers can leave
+    datetimes to the encoder whichever provider is active.
+    """
+    
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, several times faster than the json module"""
+    
+    def dumps(self, obj, **kwargs):
+        # Sorted keys like the default provider, so response bodies stay the same
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if self._app.debug:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def init_json(app):
+    """Set the app's JSON provider from JSON_PROVIDER: auto, orjson or stdlib"""
+    name = app.config['JSON_PROVIDER']
+    if name not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f'Unknown JSON_PROVIDER: {name}')
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson requires the orjson package')
+    
+    if name != 'stdlib' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = StdlibJSONProvider(app)
@@ -0,0 +1,247 @@
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Held while a request is profiled, one profiler can run per process
+_profiler_lock = threading.Lock()
+
+
+class Metrics:
+    """
+    In-process request metrics rendered in the Prometheus text format
+    
+    Every server process keeps its own counters, Prometheus adds up the
+    scrapes of all workers.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.duration_buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self.duration_sum = defaultdict(float)
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.serialize_seconds = defaultdict(float)
+        self.response_bytes = defaultdict(int)
+    
+    def observe(self, endpoint, method, status, duration, sql_queries, sql_seconds, serialize_seconds, response_bytes):
+        """Record one finished request"""
+        route = (endpoint, method)
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.duration_buckets[route][bisect_left(DURATION_BUCKETS, duration)] += 1
+            self.duration_sum[route] += duration
+            self.sql_queries[route] += sql_queries
+            self.sql_seconds[route] += sql_seconds
+            self.serialize_seconds[route] += serialize_seconds
+            self.response_bytes[route] += response_bytes
+    
+    def render(self, cache_stats=None, user_cache_stats=None):
+        """Prometheus text exposition of all metrics"""
+        lines = []
+        
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+        
+        def labels(endpoint, method, **extra):
+            pairs = {'endpoint': endpoint, 'method': method, **extra}
+            return ','.join(f'{key}="{value}"' for key, value in pairs.items())
+        
+        with self._lock:
+            family('addressbook_requests_total', 'counter', 'Requests by endpoint, method and status')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'addressbook_requests_total{{{labels(endpoint, method, status=status)}}} {count}')
+            
+            family('addressbook_request_duration_seconds', 'histogram', 'Request wall time')
+            for (endpoint, method), buckets in sorted(self.duration_buckets.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',), buckets):
+                    cumulative += count
+                    lines.append(f'addressbook_request_duration_seconds_bucket{{{labels(endpoint, method, le=bound)}}} {cumulative}')
+                lines.append(f'addressbook_request_duration_seconds_sum{{{labels(endpoint, method)}}} {self.duration_sum[(endpoint, method)]:.6f}')
+                lines.append(f'addressbook_request_duration_seconds_count{{{labels(endpoint, method)}}} {cumulative}')
+            
+            for name, values, help_text in (
+                ('addressbook_sql_queries_total', self.sql_queries, 'SQL statements executed'),
+                ('addressbook_sql_seconds_total', self.sql_seconds, 'Time spent in SQL statements'),
+                ('addressbook_serialize_seconds_total', self.serialize_seconds, 'Time spent encoding JSON'),
+                ('addressbook_response_bytes_total', self.response_bytes, 'Response body bytes, streamed bodies excluded')
+            ):
+                family(name, 'counter', help_text)
+                for (endpoint, method), value in sorted(values.items()):
+                    value_text = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{{labels(endpoint, method)}}} {value_text}')
+        
+        if cache_stats is not None:
+            family('addressbook_contact_cache_hits_total', 'counter', 'Contact cache hits')
+            lines.append(f"addressbook_contact_cache_hits_total {cache_stats['hits']}")
+            family('addressbook_contact_cache_misses_total', 'counter', 'Contact cache misses')
+            lines.append(f"addressbook_contact_cache_misses_total {cache_stats['misses']}")
+        
+        if user_cache_stats is not None:
+            family('addressbook_user_cache_hits_total', 'counter', 'User profile cache hits')
+            lines.append(f"addressbook_user_cache_hits_total {user_cache_stats['hits']}")
+            family('addressbook_user_cache_misses_total', 'counter', 'User profile cache misses')
+            lines.append(f"addressbook_user_cache_misses_total {user_cache_stats['misses']}")
+            family('addressbook_user_queries_saved_total', 'counter', 'User queries avoided by the cache and the request memo')
+            lines.append(f"addressbook_user_queries_saved_total {user_cache_stats['queries_saved']}")
+        
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and conn.info.get('query_start'):
+        g.sql_seconds = g.get('sql_seconds', 0.0) + time.perf_counter() - conn.info['query_start'].pop()
+        g.sql_queries = g.get('sql_queries', 0) + 1
+
+
+def _timed_dumps(dumps):
+    """Wrap a JSON provider's dumps to add its time to the request"""
+    def wrapper(obj, **kwargs):
+        if not has_request_context():
+            return dumps(obj, **kwargs)
+        start = time.perf_counter()
+        try:
+            return dumps(obj, **kwargs)
+        finally:
+            g.serialize_seconds = g.get('serialize_seconds', 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+def _start_profiler():
+    """
+    Profile the current request unless another one is being profiled
+    
+    Python 3.12+ allows one active profiler per process and raises
+    ValueError for a second one, so concurrent requests skip profiling
+    instead of failing. A profiler started outside the app, e.g. by
+    py-spy or a debugger, makes every request skip it.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profiler_lock.release()
+        return
+    g.profiler = profiler
+
+
+def _stop_profiler():
+    """Stop the profiler of the current request, returns it or None if it was not profiled"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+    return profiler
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    endpoint = current_app.config['PROFILE_ENDPOINT']
+    if endpoint and request.endpoint == endpoint and random.random() < current_app.config['PROFILE_SAMPLE_RATE']:
+        _start_profiler()
+
+
+def _observe_request(status, response_bytes):
+    """Record the current request, returns its SQL and JSON encoding time for Server-Timing"""
+    g.request_observed = True
+    duration = time.perf_counter() - g.request_start
+    sql_queries = g.get('sql_queries', 0)
+    sql_seconds = g.get('sql_seconds', 0.0)
+    serialize_seconds = g.get('serialize_seconds', 0.0)
+    current_app.extensions['metrics'].observe(
+        request.endpoint or 'unmatched',
+        request.method,
+        status,
+        duration,
+        sql_queries,
+        sql_seconds,
+        serialize_seconds,
+        response_bytes
+    )
+    return duration, sql_queries, sql_seconds, serialize_seconds
+
+
+def _finish_request(response):
+    profiler = _stop_profiler()
+    if profiler is not None:
+        folder = current_app.config['PROFILE_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        profiler.dump_stats(os.path.join(folder, f'{request.endpoint}-{time.time_ns()}.prof'))
+    
+    duration, sql_queries, sql_seconds, serialize_seconds = _observe_request(
+        response.status_code,
+        0 if response.is_streamed else response.calculate_content_length() or 0
+    )
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={sql_seconds * 1000:.2f};desc="{sql_queries} queries"',
+        f'serialize;dur={serialize_seconds * 1000:.2f}',
+        f'total;dur={duration * 1000:.2f}'
+    ])
+    return response
+
+
+def _teardown_request(exc):
+    # The profiler is still running if the view raised
+    _stop_profiler()
+    # after_request handlers are skipped when an exception propagates
+    if 'request_start' in g and not g.get('request_observed'):
+        _observe_request(500, 0)
+
+
+def metrics_authorized():
+    """
+    Whether the request may read the metrics and cache statistics
+    
+    They are served only when METRICS_TOKEN is set, to requests sending it
+    as a bearer token.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def init_metrics(app):
+    """
+    Turn on request instrumentation when METRICS_ENABLED is set
+    
+    Adds a Server-Timing header with SQL and JSON encoding time to every
+    response, collects the counters served by /api/metrics, and dumps a
+    cProfile of a sample of PROFILE_ENDPOINT requests to PROFILE_FOLDER.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+    
+    app.extensions['metrics'] = Metrics()
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.json.dumps = _timed_dumps(app.json.dumps)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+
+
+def get_metrics():
+    """Metrics of the current app, None when instrumentation is off"""
+    return current_app.extensions.get('metrics')
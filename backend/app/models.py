@@ -1,8 +1,36 @@
-from datetime import datetime
+import json
+import os
+from datetime import datetime, timedelta
+from collections import defaultdict
+from flask import current_app, g, has_app_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 
-db = SQLAlchemy()
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND_KEY = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Session sending SELECTs to the read replica in read_replica requests
+    
+    Everything else, including flushes, goes to the primary.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and getattr(clause, 'is_select', False)
+            and has_app_context()
+            and g.get('use_read_replica')
+        ):
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(db.Model):
@@ -14,18 +42,43 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped in the same transaction as every change to the user's contacts
+    contacts_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Highest contacts version of the pruned tombstones, older sync cursors miss deletions
+    tombstones_pruned_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationship with contacts
     contacts = db.relationship('Contact', backref='owner', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hash and set the password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set the password with PASSWORD_HASH_METHOD"""
+        self.password_hash = generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         """Check if the provided password matches"""
         return check_password_hash(self.password_hash, password)
     
+    @classmethod
+    def bump_contacts_version(cls, user_id):
+        """
+        Mark the user's contacts as changed, call before committing the change
+        
+        The UPDATE locks the user row until commit, so concurrent changes of
+        one user get versions in commit order.
+        
+        Returns:
+            The new version, to be stored on the changed contacts
+        """
+        db.session.execute(
+            db.update(cls).where(cls.id == user_id).values(contacts_version=cls.contacts_version + 1)
+        )
+        return cls.get_contacts_version(user_id)
+    
+    @classmethod
+    def get_contacts_version(cls, user_id):
+        """Get the change version of the user's contacts"""
+        return db.session.query(cls.contacts_version).filter_by(id=user_id).scalar()
+    
     def to_dict(self):
         """Convert user to dictionary"""
         return {
@@ -39,6 +92,12 @@ class User(db.Model):
 class Contact(db.Model):
     """Contact model"""
     __tablename__ = 'contacts'
+    __table_args__ = (
+        db.Index('ix_contacts_user_change_version', 'user_id', 'change_version'),
+        # Keyset order of exports
+        db.Index('ix_contacts_user_name', 'user_id', 'name', 'id'),
+        db.Index('ix_contacts_import_token', 'import_token'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -46,12 +105,27 @@ class Contact(db.Model):
     is_favorite = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # User's contacts_version at the last change of this contact or its methods
+    change_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Hash of name, favorite status and methods, current while content_hash_version == change_version
+    content_hash = db.Column(db.String(40))
+    content_hash_version = db.Column(db.Integer)
+    # Batch of the bulk insert that created the contact, used to read back the new IDs
+    import_token = db.Column(db.String(32))
     
     # Relationship with contact methods
     methods = db.relationship('ContactMethod', backref='contact', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self, include_methods=True):
-        """Convert contact to dictionary"""
+    # Columns of to_dict, in order
+    DICT_COLUMNS = ('id', 'user_id', 'name', 'is_favorite', 'created_at', 'updated_at')
+    
+    def to_dict(self, include_methods=True, methods=None):
+        """Convert contact to dictionary
+
+        Args:
+            include_methods: Whether to include the contact methods
+            methods: Preloaded ContactMethod list, avoids a per-contact query
+        """
         data = {
             'id': self.id,
             'user_id': self.user_id,
@@ -61,13 +135,96 @@ class Contact(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
         if include_methods:
-            data['methods'] = [method.to_dict() for method in self.methods]
+            if methods is None:
+                methods = self.methods
+            data['methods'] = [method.to_dict() for method in methods]
         return data
 
+    @classmethod
+    def select_rows(cls, query, columns=None):
+        """
+        Make a contact query return plain rows instead of Contact objects
+        
+        Args:
+            query: Filtered and ordered Contact query
+            columns: Names of the columns to select, all to_dict columns by default
+        """
+        return query.with_entities(*(getattr(cls, column) for column in columns or cls.DICT_COLUMNS))
+    
+    @staticmethod
+    def serialize_rows(rows, include_methods=True):
+        """
+        Convert rows of select_rows to dictionaries shaped like to_dict
+        
+        Skips ORM object hydration and leaves datetimes to the app's JSON
+        provider, which writes them in ISO 8601 like to_dict.
+        """
+        data = [row._asdict() for row in rows]
+        if include_methods:
+            methods_map = ContactMethod.rows_by_contact([item['id'] for item in data])
+            for item in data:
+                item['methods'] = methods_map.get(item['id'], [])
+        return data
+    
+    @staticmethod
+    def serialize_many(contacts, include_methods=True):
+        """Convert a list of contacts to dictionaries with batched method loading"""
+        if not include_methods:
+            return [contact.to_dict(include_methods=False) for contact in contacts]
+        
+        methods_map = ContactMethod.group_by_contact([contact.id for contact in contacts])
+        return [
+            contact.to_dict(methods=methods_map.get(contact.id, []))
+            for contact in contacts
+        ]
+
+    @classmethod
+    def iter_with_methods(cls, user_id, chunk_size=1000):
+        """
+        Stream the contacts of a user ordered by name, with their methods
+        
+        Contacts are read in keyset-paginated chunks so that memory use does
+        not depend on the size of the address book, and the methods of each
+        chunk are loaded with one query.
+        
+        Yields:
+            (Contact, list of ContactMethod) tuples
+        """
+        last_key = None
+        while True:
+            query = cls.query.filter_by(user_id=user_id)
+            if last_key is not None:
+                name, contact_id = last_key
+                query = query.filter(db.or_(
+                    cls.name > name,
+                    db.and_(cls.name == name, cls.id > contact_id)
+                ))
+            contacts = query.order_by(cls.name, cls.id).limit(chunk_size).all()
+            if not contacts:
+                return
+            
+            methods_map = ContactMethod.group_by_contact([contact.id for contact in contacts])
+            for contact in contacts:
+                yield contact, methods_map.get(contact.id, [])
+            
+            last_key = (contacts[-1].name, contacts[-1].id)
+            # Release the chunk from the identity map before loading the next one
+            for contact in contacts:
+                for method in methods_map.get(contact.id, []):
+                    db.session.expunge(method)
+                db.session.expunge(contact)
+
+
+# List order (is_favorite desc, name, id), read from the index without sorting
+db.Index('ix_contacts_user_favorite_name', Contact.user_id, Contact.is_favorite.desc(), Contact.name, Contact.id)
+
 
 class ContactMethod(db.Model):
     """Contact method model for storing multiple contact ways"""
     __tablename__ = 'contact_methods'
+    __table_args__ = (
+        db.Index('ix_contact_methods_contact_type', 'contact_id', 'type'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id'), nullable=False, index=True)
@@ -77,6 +234,78 @@ class ContactMethod(db.Model):
     # Valid contact method types
     VALID_TYPES = ['phone', 'email', 'address', 'social']
     
+    # Max number of ids per IN (...) clause when batch loading
+    BATCH_SIZE = 1000
+    
+    @classmethod
+    def group_by_contact(cls, contact_ids):
+        """
+        Load the methods of many contacts at once
+        
+        Args:
+            contact_ids: List of contact IDs
+            
+        Returns:
+            Dict mapping contact ID to its list of ContactMethod objects
+        """
+        methods_map = defaultdict(list)
+        contact_ids = list(contact_ids)
+        for start in range(0, len(contact_ids), cls.BATCH_SIZE):
+            chunk = contact_ids[start:start + cls.BATCH_SIZE]
+            # Index order, so the methods are read without sorting
+            methods = cls.query.filter(cls.contact_id.in_(chunk)).order_by(cls.contact_id, cls.id).all()
+            for method in methods:
+                methods_map[method.contact_id].append(method)
+        return methods_map
+    
+    @classmethod
+    def rows_by_contact(cls, contact_ids):
+        """
+        Load the methods of many contacts as dictionaries, without ORM objects
+        
+        Args:
+            contact_ids: List of contact IDs
+            
+        Returns:
+            Dict mapping contact ID to its list of method dicts shaped like to_dict
+        """
+        table = cls.__table__
+        methods_map = defaultdict(list)
+        contact_ids = list(contact_ids)
+        for start in range(0, len(contact_ids), cls.BATCH_SIZE):
+            chunk = contact_ids[start:start + cls.BATCH_SIZE]
+            rows = db.session.execute(
+                db.select(table.c.id, table.c.contact_id, table.c.type, table.c.value)
+                .where(table.c.contact_id.in_(chunk))
+                .order_by(table.c.contact_id, table.c.id)
+            )
+            for method_id, contact_id, method_type, value in rows:
+                methods_map[contact_id].append({
+                    'id': method_id,
+                    'contact_id': contact_id,
+                    'type': method_type,
+                    'value': value
+                })
+        return methods_map
+    
+    @classmethod
+    def max_count_per_type(cls, user_id):
+        """
+        Find the largest number of methods of each type on one contact
+        
+        Returns:
+            Dict mapping method type to max count
+        """
+        per_contact = (
+            db.session.query(cls.type.label('type'), db.func.count(cls.id).label('count'))
+            .join(Contact, Contact.id == cls.contact_id)
+            .filter(Contact.user_id == user_id)
+            .group_by(cls.contact_id, cls.type)
+            .subquery()
+        )
+        rows = db.session.query(per_contact.c.type, db.func.max(per_contact.c.count)).group_by(per_contact.c.type)
+        return {method_type: count for method_type, count in rows}
+    
     def to_dict(self):
         """Convert contact method to dictionary"""
         return {
@@ -85,3 +314,147 @@ class ContactMethod(db.Model):
             'type': self.type,
             'value': self.value
         }
+
+
+class ContactTombstone(db.Model):
+    """Record of a deleted contact for delta sync"""
+    __tablename__ = 'contact_tombstones'
+    __table_args__ = (
+        db.Index('ix_contact_tombstones_user_change_version', 'user_id', 'change_version'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    contact_id = db.Column(db.Integer, nullable=False)
+    change_version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @classmethod
+    def prune(cls, user_id):
+        """
+        Delete the user's tombstones older than TOMBSTONE_RETENTION, without committing
+        
+        Records the highest pruned version on the user, a sync cursor older
+        than it may miss deletions.
+        
+        Returns:
+            Number of tombstones deleted
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['TOMBSTONE_RETENTION'])
+        expired = db.session.query(db.func.max(cls.change_version)).filter(
+            cls.user_id == user_id,
+            cls.deleted_at < cutoff
+        ).scalar()
+        if expired is None:
+            return 0
+        
+        db.session.execute(
+            db.update(User).where(User.id == user_id, User.tombstones_pruned_version < expired)
+            .values(tombstones_pruned_version=expired)
+        )
+        return db.session.execute(
+            db.delete(cls).where(cls.user_id == user_id, cls.change_version <= expired)
+        ).rowcount
+
+
+class ContactSearchTerm(db.Model):
+    """
+    Search index entry for a contact's name and method values
+    
+    field is the score of a search matching the term: 3 for a prefix of
+    the name, 2 for any n-gram of the name, 1 for a method value.
+    """
+    __tablename__ = 'contact_search_terms'
+    __table_args__ = (
+        db.Index('ix_contact_search_terms_lookup', 'user_id', 'term', 'field', 'contact_id'),
+    )
+    
+    NAME_PREFIX = 3
+    NAME = 2
+    VALUE = 1
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'), nullable=False, index=True)
+    term = db.Column(db.String(3), nullable=False)
+    field = db.Column(db.SmallInteger, nullable=False)
+
+
+class Job(db.Model):
+    """Background import/export job"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # import, export
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    file_format = db.Column(db.String(20), nullable=False)
+    params = db.Column(db.Text)  # JSON encoded job options
+    file_path = db.Column(db.String(500))  # Uploaded file for imports, result file for exports
+    progress = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer)
+    result = db.Column(db.Text)  # JSON encoded result
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    # host:pid of the process whose thread pool runs the job
+    worker = db.Column(db.String(100))
+    
+    # Valid job kinds and statuses
+    KINDS = ['import', 'export']
+    STATUSES = ['pending', 'running', 'succeeded', 'failed']
+    
+    def get_params(self):
+        """Decode the job options"""
+        return json.loads(self.params) if self.params else {}
+    
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'format': self.file_format,
+            'progress': self.progress or 0,
+            'total': self.total,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class Upload(db.Model):
+    """Chunked upload of an import file, written to disk part by part"""
+    __tablename__ = 'uploads'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_format = db.Column(db.String(20), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)  # Total size announced by the client
+    file_path = db.Column(db.String(500), nullable=False)
+    job_id = db.Column(db.String(32))  # Import job started when the upload was completed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def get_offset(self):
+        """Number of bytes received so far, where the next part starts"""
+        if self.job_id:
+            return self.size
+        try:
+            return os.path.getsize(self.file_path)
+        except OSError:
+            return 0
+    
+    def to_dict(self):
+        """Convert upload to dictionary"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'format': self.file_format,
+            'size': self.size,
+            'offset': self.get_offset(),
+            'job_id': self.job_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, current_app, g, request, jsonify, session
 from functools import wraps
 from ..models import db, User
+from ..utils.passwords import get_password_hasher, PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -20,6 +21,48 @@ def get_current_user_id():
     return session.get('user_id')
 
 
+def load_current_user():
+    """
+    Get the profile of the logged in user as returned by User.to_dict
+    
+    Loaded at most once per request and cached per process, so most
+    requests do not query the user at all. Callers must not modify the
+    returned dict.
+    
+    Returns:
+        Profile dict, or None if not logged in or the user no longer exists
+    """
+    user_cache = current_app.extensions['user_cache']
+    if 'current_user' in g:
+        user_cache.record_memo_hit()
+        return g.current_user
+    
+    user_id = get_current_user_id()
+    profile = None
+    if user_id is not None:
+        profile = user_cache.get(user_id)
+        if profile is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                profile = user.to_dict()
+                user_cache.set(user_id, profile)
+    
+    g.current_user = profile
+    return profile
+
+
+def _get_login_limiter():
+    """Get the app's login rate limiter, created by create_app"""
+    return current_app.extensions['login_limiter']
+
+
+def _retry_response(message, retry_after):
+    """Error response telling the client when to try again"""
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -51,7 +94,10 @@ def register():
     
     # Create new user
     user = User(username=username, email=email)
-    user.set_password(password)
+    try:
+        user.password_hash = get_password_hasher().hash(password)
+    except PasswordHasherBusy:
+        return _retry_response('服务器繁忙，请稍后再试', 1), 503
     
     db.session.add(user)
     db.session.commit()
@@ -80,13 +126,27 @@ def login():
     if not username or not password:
         return jsonify({'error': '请输入用户名和密码'}), 400
     
-    # Find user by username or email
-    user = User.query.filter(
-        (User.username == username) | (User.email == username)
-    ).first()
-    
-    if not user or not user.check_password(password):
-        return jsonify({'error': '用户名或密码错误'}), 401
+    # Throttle per client and per account before spending CPU on hashing
+    retry_after = _get_login_limiter().consume(f'ip:{request.remote_addr}', f'user:{username.lower()}')
+    if retry_after:
+        return _retry_response('登录尝试过于频繁，请稍后再试', retry_after), 429
+    
+    # Find user by username, then by email, each lookup uses its unique index
+    user = User.query.filter_by(username=username).first()
+    if user is None and '@' in username:
+        user = User.query.filter_by(email=username).first()
+    
+    hasher = get_password_hasher()
+    try:
+        if not user or not hasher.verify(user.password_hash, password):
+            return jsonify({'error': '用户名或密码错误'}), 401
+        
+        # Upgrade hashes made with older parameters while the password is at hand
+        if hasher.needs_rehash(user.password_hash):
+            user.password_hash = hasher.hash(password)
+            db.session.commit()
+    except PasswordHasherBusy:
+        return _retry_response('服务器繁忙，请稍后再试', 1), 503
     
     # Set session
     session.permanent = True
@@ -102,13 +162,16 @@ def login():
 @login_required
 def get_current_user():
     """Get current logged in user info"""
-    user_id = get_current_user_id()
-    user = User.query.get(user_id)
+    user = load_current_user()
     
     if not user:
         return jsonify({'error': '用户不存在'}), 404
     
-    return jsonify({'user': user.to_dict()}), 200
+    response = jsonify({'user': user})
+    response.add_etag()
+    # Let browsers keep the response but revalidate it on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 
 @auth_bp.route('/logout', methods=['POST'])
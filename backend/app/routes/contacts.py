@@ -1,20 +1,68 @@
+import base64
+import json
+from datetime import datetime
 from flask import Blueprint, request, jsonify
+from sqlalchemy import and_, or_, not_, func, bindparam, insert, update, delete
 from .auth import login_required, get_current_user_id
-from ..models import db, Contact, ContactMethod
+from ..models import db, User, Contact, ContactMethod, ContactTombstone
+from ..utils import search as search_index
+from ..utils.bulk_import import insert_contacts, delete_contacts
+from ..utils.dedupe import DuplicateIndex, apply_merges
+from ..cache import cached_per_user, invalidate_contacts
+from ..db_routing import read_replica
 
 contacts_bp = Blueprint('contacts', __name__)
 
+# Pagination settings for the contact list
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-@contacts_bp.route('', methods=['GET'])
-@login_required
-def get_contacts():
-    """Get all contacts for current user"""
-    user_id = get_current_user_id()
-    
+# Operations accepted by the batch endpoint, and the max per request
+BATCH_OPS = ['create', 'update', 'delete', 'favorite', 'add_method', 'delete_method']
+MAX_BATCH_OPS = 500
+
+# Max number of contacts merged into one contact per request
+MAX_MERGE_SOURCES = 100
+
+# Fields selectable through the fields= projection
+CONTACT_FIELDS = ['id', 'user_id', 'name', 'is_favorite', 'created_at', 'updated_at', 'methods']
+
+
+def _encode_cursor(contact):
+    """Encode the sort key of a contact as an opaque pagination cursor"""
+    key = [bool(contact.is_favorite), contact.name, contact.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    """Decode a pagination cursor, returns None if it is malformed"""
+    try:
+        is_favorite, name, contact_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if not isinstance(is_favorite, bool) or not isinstance(name, str) or not isinstance(contact_id, int):
+        return None
+    return is_favorite, name, contact_id
+
+
+def _parse_fields(raw):
+    """Parse the fields= projection, returns None for all fields"""
+    if not raw:
+        return None
+    fields = {field.strip() for field in raw.split(',') if field.strip()}
+    if not fields or not fields <= set(CONTACT_FIELDS):
+        return None
+    # The id is always returned so clients can address the contact
+    fields.add('id')
+    return fields
+
+
+def _build_contacts_query(user_id):
+    """Build the filtered contact query shared by the list and count endpoints"""
     # Optional filter by favorite
     favorite_only = request.args.get('favorite', '').lower() == 'true'
     
-    # Optional search by name
+    # Optional search by name and contact method values
     search = request.args.get('search', '').strip()
     
     query = Contact.query.filter_by(user_id=user_id)
@@ -23,13 +71,278 @@ def get_contacts():
         query = query.filter_by(is_favorite=True)
     
     if search:
-        query = query.filter(Contact.name.ilike(f'%{search}%'))
+        query = query.filter(Contact.id.in_(search_index.matching_ids(user_id, search)))
+    
+    return query
+
+
+def _touch(contact):
+    """Record a change of a contact or its methods for caches, ETags and delta sync"""
+    contact.change_version = invalidate_contacts(contact.user_id)
+
+
+def _serialize(rows, include_methods, fields):
+    """Serialize rows of Contact.select_rows, keeping only the requested fields"""
+    data = Contact.serialize_rows(rows, include_methods=include_methods)
+    if fields is not None:
+        data = [{key: value for key, value in item.items() if key in fields} for item in data]
+    return data
+
+
+@contacts_bp.route('', methods=['GET'])
+@login_required
+@read_replica
+@cached_per_user
+def get_contacts():
+    """
+    Get contacts for current user
+    
+    Without `limit` or `cursor` all contacts are returned. Otherwise a page
+    of at most `limit` contacts is returned, ordered by
+    (is_favorite desc, name, id), along with `next_cursor` for the next page.
+    `fields` restricts the returned attributes, e.g. `fields=name`.
+    """
+    user_id = get_current_user_id()
+    
+    fields = _parse_fields(request.args.get('fields', ''))
+    if request.args.get('fields') and fields is None:
+        return jsonify({'error': f'无效的字段，有效字段: {", ".join(CONTACT_FIELDS)}'}), 400
+    include_methods = fields is None or 'methods' in fields
+    
+    # The sort key columns are always selected for the pagination cursor
+    columns = [
+        column for column in Contact.DICT_COLUMNS
+        if fields is None or column in fields or column in ('is_favorite', 'name')
+    ]
+    query = _build_contacts_query(user_id).order_by(Contact.is_favorite.desc(), Contact.name, Contact.id)
+    
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    if not paginated:
+        rows = Contact.select_rows(query, columns).all()
+        return jsonify({
+            'contacts': _serialize(rows, include_methods, fields),
+            'total': len(rows)
+        }), 200
+    
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': '分页参数limit必须是整数'}), 400
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'error': f'分页参数limit必须在1到{MAX_PAGE_SIZE}之间'}), 400
+    
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        key = _decode_cursor(cursor)
+        if key is None:
+            return jsonify({'error': '无效的分页游标'}), 400
+        is_favorite, name, contact_id = key
+        # Keyset condition for the order (is_favorite desc, name, id)
+        after_key = or_(
+            and_(Contact.name == name, Contact.id > contact_id),
+            Contact.name > name
+        )
+        if is_favorite:
+            query = query.filter(or_(
+                Contact.is_favorite == False,  # noqa: E712
+                and_(Contact.is_favorite == True, after_key)  # noqa: E712
+            ))
+        else:
+            query = query.filter(Contact.is_favorite == False, after_key)  # noqa: E712
+    
+    # Fetch one extra row to know whether there is a next page
+    rows = Contact.select_rows(query, columns).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return jsonify({
+        'contacts': _serialize(rows, include_methods, fields),
+        'next_cursor': _encode_cursor(rows[-1]) if has_more else None,
+        'has_more': has_more
+    }), 200
+
+
+@contacts_bp.route('/count', methods=['GET'])
+@login_required
+@read_replica
+@cached_per_user
+def count_contacts():
+    """Count contacts for current user, accepts the same filters as the list"""
+    user_id = get_current_user_id()
+    
+    total = _build_contacts_query(user_id).with_entities(func.count(Contact.id)).scalar()
+    
+    return jsonify({'total': total}), 200
+
+
+@contacts_bp.route('/changes', methods=['GET'])
+@login_required
+@read_replica
+@cached_per_user
+def get_contact_changes():
+    """
+    Get contacts created, updated or deleted since a sync cursor
+    
+    The cursor is the user's contacts version returned by the previous
+    call, start with since=0. Changed contacts are returned in full, with
+    their methods, and deleted contacts as IDs.
+    
+    Deletions are kept for TOMBSTONE_RETENTION. A cursor older than the
+    pruned ones, or newer than the current version (e.g. after a database
+    restore), gets all contacts with full_resync set: the client must
+    replace its copy instead of applying the changes.
+    """
+    user_id = get_current_user_id()
+    
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': '同步游标since必须是整数'}), 400
+    if since < 0:
+        return jsonify({'error': '同步游标since不能为负数'}), 400
+    
+    # Changes committed after this read are left for the next sync
+    cursor, pruned_version = db.session.query(
+        User.contacts_version, User.tombstones_pruned_version
+    ).filter_by(id=user_id).one()
+    full_resync = since > cursor or 0 < since < pruned_version
+    if full_resync:
+        since = 0
+    
+    rows = Contact.select_rows(Contact.query.filter(
+        Contact.user_id == user_id,
+        Contact.change_version > since,
+        Contact.change_version <= cursor
+    ).order_by(Contact.change_version, Contact.id)).all()
+    
+    deleted_ids = [
+        contact_id for contact_id, in db.session.query(ContactTombstone.contact_id).filter(
+            ContactTombstone.user_id == user_id,
+            ContactTombstone.change_version > since,
+            ContactTombstone.change_version <= cursor
+        ).order_by(ContactTombstone.change_version)
+    ]
+    
+    return jsonify({
+        'changes': Contact.serialize_rows(rows),
+        'deleted': deleted_ids,
+        'cursor': cursor,
+        'full_resync': full_resync
+    }), 200
+
+
+@contacts_bp.route('/search', methods=['GET'])
+@login_required
+@read_replica
+@cached_per_user
+def search_contacts():
+    """Search contacts by name, phone, email and address, best match first"""
+    user_id = get_current_user_id()
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': '请提供搜索关键词'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': '分页参数limit必须是整数'}), 400
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'error': f'分页参数limit必须在1到{MAX_PAGE_SIZE}之间'}), 400
+    
+    favorite_only = request.args.get('favorite', '').lower() == 'true'
+    matches = search_index.search_contacts(user_id, query, favorite_only, limit)
+    scores = {contact_id: score for score, contact_id in matches}
+    
+    rows = Contact.select_rows(Contact.query.filter(Contact.id.in_(list(scores)))).all()
+    rows_by_id = {row.id: row for row in rows}
+    ordered = [rows_by_id[contact_id] for _, contact_id in matches if contact_id in rows_by_id]
+    
+    results = Contact.serialize_rows(ordered)
+    for item in results:
+        item['score'] = scores[item['id']]
+    
+    return jsonify({'contacts': results}), 200
+
+
+@contacts_bp.route('/duplicates', methods=['GET'])
+@login_required
+@read_replica
+@cached_per_user
+def get_duplicate_contacts():
+    """
+    Find groups of duplicate contacts of current user
+    
+    Contacts sharing a phone number or email, compared after
+    normalization, or having the same name where one of them has neither,
+    are grouped together.
+    """
+    user_id = get_current_user_id()
+    
+    groups = DuplicateIndex.load(user_id).groups()
+    contact_ids = [contact_id for group in groups for contact_id in group]
+    contacts_map = {}
+    for start in range(0, len(contact_ids), ContactMethod.BATCH_SIZE):
+        chunk = contact_ids[start:start + ContactMethod.BATCH_SIZE]
+        rows = Contact.select_rows(Contact.query.filter(Contact.id.in_(chunk))).all()
+        contacts_map.update((item['id'], item) for item in Contact.serialize_rows(rows))
+    
+    return jsonify({
+        'groups': [[contacts_map[contact_id] for contact_id in group] for group in groups],
+        'total': len(groups)
+    }), 200
+
+
+@contacts_bp.route('/merge', methods=['POST'])
+@login_required
+def merge_contacts():
+    """
+    Merge contacts into one contact
+    
+    The methods of the source contacts not on the target yet are added to
+    it, the target becomes a favorite if any source is one, and the source
+    contacts are deleted. The target keeps its name.
+    """
+    user_id = get_current_user_id()
+    data = request.get_json()
+    
+    if not isinstance(data, dict):
+        return jsonify({'error': '请提供合并信息'}), 400
+    
+    target_id = data.get('target_id')
+    source_ids = data.get('source_ids')
+    if not isinstance(target_id, int) or isinstance(target_id, bool):
+        return jsonify({'error': '参数target_id必须是联系人ID'}), 400
+    if (
+        not isinstance(source_ids, list) or not source_ids
+        or not all(isinstance(source_id, int) and not isinstance(source_id, bool) for source_id in source_ids)
+    ):
+        return jsonify({'error': '参数source_ids必须是非空的联系人ID列表'}), 400
+    source_ids = list(dict.fromkeys(source_ids))
+    if target_id in source_ids:
+        return jsonify({'error': '不能将联系人合并到自身'}), 400
+    if len(source_ids) > MAX_MERGE_SOURCES:
+        return jsonify({'error': f'每次最多合并{MAX_MERGE_SOURCES}个联系人'}), 400
+    
+    contacts = Contact.query.filter(Contact.id.in_([target_id] + source_ids), Contact.user_id == user_id).all()
+    if len(contacts) != len(source_ids) + 1:
+        return jsonify({'error': '联系人不存在'}), 404
+    target = next(contact for contact in contacts if contact.id == target_id)
+    
+    sources = ContactMethod.rows_by_contact(source_ids)
+    sources_data = [
+        {'is_favorite': contact.is_favorite, 'methods': sources.get(contact.id, [])}
+        for contact in contacts if contact.id != target_id
+    ]
     
-    contacts = query.order_by(Contact.is_favorite.desc(), Contact.name).all()
+    version = invalidate_contacts(user_id)
+    apply_merges(user_id, {target_id: sources_data}, version)
+    delete_contacts(user_id, source_ids, version)
+    db.session.commit()
     
     return jsonify({
-        'contacts': [contact.to_dict() for contact in contacts],
-        'total': len(contacts)
+        'message': f'成功合并 {len(source_ids)} 个联系人',
+        'contact': target.to_dict()
     }), 200
 
 
@@ -51,13 +364,14 @@ def create_contact():
     contact = Contact(
         user_id=user_id,
         name=name,
-        is_favorite=data.get('is_favorite', False)
+        is_favorite=bool(data.get('is_favorite', False))
     )
     db.session.add(contact)
     db.session.flush()  # Get the contact ID
     
     # Add contact methods if provided
     methods = data.get('methods', [])
+    method_values = []
     for method_data in methods:
         method_type = method_data.get('type', '').strip()
         method_value = method_data.get('value', '').strip()
@@ -71,7 +385,10 @@ def create_contact():
                 value=method_value
             )
             db.session.add(method)
+            method_values.append(method_value)
     
+    search_index.index_contacts([(user_id, contact.id, name, method_values)])
+    _touch(contact)
     db.session.commit()
     
     return jsonify({
@@ -82,6 +399,8 @@ def create_contact():
 
 @contacts_bp.route('/<int:contact_id>', methods=['GET'])
 @login_required
+@read_replica
+@cached_per_user
 def get_contact(contact_id):
     """Get a single contact"""
     user_id = get_current_user_id()
@@ -110,13 +429,15 @@ def update_contact(contact_id):
     # Update name if provided
     if 'name' in data:
         name = data['name'].strip()
-        if name:
+        if name and name != contact.name:
             contact.name = name
+            search_index.reindex_contact(contact)
     
     # Update favorite status if provided
     if 'is_favorite' in data:
         contact.is_favorite = bool(data['is_favorite'])
     
+    _touch(contact)
     db.session.commit()
     
     return jsonify({
@@ -135,7 +456,14 @@ def delete_contact(contact_id):
     if not contact:
         return jsonify({'error': '联系人不存在'}), 404
     
+    search_index.remove_contact(contact.id)
     db.session.delete(contact)
+    db.session.add(ContactTombstone(
+        user_id=user_id,
+        contact_id=contact.id,
+        change_version=invalidate_contacts(user_id)
+    ))
+    ContactTombstone.prune(user_id)
     db.session.commit()
     
     return jsonify({'message': '联系人删除成功'}), 200
@@ -153,6 +481,7 @@ def toggle_favorite(contact_id):
     
     # Toggle favorite status
     contact.is_favorite = not contact.is_favorite
+    _touch(contact)
     db.session.commit()
     
     return jsonify({
@@ -190,6 +519,8 @@ def add_contact_method(contact_id):
         value=method_value
     )
     db.session.add(method)
+    search_index.reindex_contact(contact)
+    _touch(contact)
     db.session.commit()
     
     return jsonify({
@@ -214,9 +545,226 @@ def delete_contact_method(contact_id, method_id):
         return jsonify({'error': '联系方式不存在'}), 404
     
     db.session.delete(method)
+    search_index.reindex_contact(contact)
+    _touch(contact)
     db.session.commit()
     
     return jsonify({
         'message': '联系方式删除成功',
         'contact': contact.to_dict()
     }), 200
+
+
+def _is_id(value):
+    """Whether a JSON value is an ID, true and false are not"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parse_batch_op(op, known_ids, known_methods):
+    """
+    Validate one batch operation
+    
+    Returns:
+        (op, error) where error is None if the operation is valid
+    """
+    if not isinstance(op, dict):
+        return None, '操作必须是对象'
+    
+    kind = op.get('op')
+    if kind not in BATCH_OPS:
+        return None, f'无效的操作类型，有效类型: {", ".join(BATCH_OPS)}'
+    
+    if kind == 'create':
+        name = str(op.get('name') or '').strip()
+        if not name:
+            return None, '联系人姓名是必填项'
+        methods_data = op.get('methods') or []
+        if not isinstance(methods_data, list) or not all(isinstance(method_data, dict) for method_data in methods_data):
+            return None, '联系方式必须是对象列表'
+        methods = []
+        for method_data in methods_data:
+            method_type = str(method_data.get('type') or '').strip()
+            method_value = str(method_data.get('value') or '').strip()
+            if method_type in ContactMethod.VALID_TYPES and method_value:
+                methods.append({'type': method_type, 'value': method_value})
+        return {'op': kind, 'name': name, 'is_favorite': bool(op.get('is_favorite', False)), 'methods': methods}, None
+    
+    contact_id = op.get('id') if kind in ('update', 'delete', 'favorite') else op.get('contact_id')
+    if not _is_id(contact_id) or contact_id not in known_ids:
+        return None, '联系人不存在'
+    
+    if kind == 'update':
+        parsed = {'op': kind, 'id': contact_id}
+        if 'name' in op:
+            name = str(op['name'] or '').strip()
+            if not name:
+                return None, '联系人姓名不能为空'
+            parsed['name'] = name
+        if 'is_favorite' in op:
+            parsed['is_favorite'] = bool(op['is_favorite'])
+        return parsed, None
+    
+    if kind == 'delete':
+        return {'op': kind, 'id': contact_id}, None
+    
+    if kind == 'favorite':
+        # Without a value the favorite status is toggled
+        value = op.get('value')
+        return {'op': kind, 'id': contact_id, 'value': None if value is None else bool(value)}, None
+    
+    if kind == 'add_method':
+        method_type = str(op.get('type') or '').strip()
+        method_value = str(op.get('value') or '').strip()
+        if not method_type or not method_value:
+            return None, '联系方式类型和值都是必填项'
+        if method_type not in ContactMethod.VALID_TYPES:
+            return None, f'无效的联系方式类型，有效类型: {", ".join(ContactMethod.VALID_TYPES)}'
+        return {'op': kind, 'contact_id': contact_id, 'type': method_type, 'value': method_value}, None
+    
+    # delete_method
+    method_id = op.get('method_id')
+    if not _is_id(method_id) or known_methods.get(method_id) != contact_id:
+        return None, '联系方式不存在'
+    return {'op': kind, 'contact_id': contact_id, 'method_id': method_id}, None
+
+
+@contacts_bp.route('/batch', methods=['POST'])
+@login_required
+def batch_contacts():
+    """
+    Apply a list of contact operations in one transaction
+    
+    Operations: create, update, delete, favorite, add_method and
+    delete_method, referring to existing contacts by ID. A contact can be
+    the target of one update or favorite operation per batch. If any
+    operation is invalid nothing is applied. Operations of the same kind are applied
+    together with set-based statements, in the order creates, updates,
+    favorites, method additions, method deletions, deletes.
+    """
+    user_id = get_current_user_id()
+    data = request.get_json()
+    
+    ops = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': '请提供操作列表operations'}), 400
+    if len(ops) > MAX_BATCH_OPS:
+        return jsonify({'error': f'每次最多{MAX_BATCH_OPS}个操作'}), 400
+    
+    # Load every referenced contact and method with one query each
+    referenced_ids = {
+        op.get('id') if op.get('op') in ('update', 'delete', 'favorite') else op.get('contact_id')
+        for op in ops if isinstance(op, dict)
+    }
+    referenced_ids = {contact_id for contact_id in referenced_ids if _is_id(contact_id)}
+    known_ids = set()
+    if referenced_ids:
+        known_ids = {
+            contact_id for contact_id, in db.session.query(Contact.id).filter(
+                Contact.id.in_(referenced_ids), Contact.user_id == user_id
+            )
+        }
+    method_ids = {op.get('method_id') for op in ops if isinstance(op, dict) and _is_id(op.get('method_id'))}
+    known_methods = {}
+    if method_ids and known_ids:
+        known_methods = dict(db.session.query(ContactMethod.id, ContactMethod.contact_id).filter(
+            ContactMethod.id.in_(method_ids), ContactMethod.contact_id.in_(known_ids)
+        ))
+    
+    parsed_ops = []
+    errors = []
+    for index, op in enumerate(ops):
+        parsed, error = _parse_batch_op(op, known_ids, known_methods)
+        if error:
+            errors.append({'index': index, 'error': error})
+        parsed_ops.append(parsed)
+    
+    deleted_ids = {op['id'] for op in parsed_ops if op and op['op'] == 'delete'}
+    for index, op in enumerate(parsed_ops):
+        if op and op['op'] != 'delete' and (op.get('id') or op.get('contact_id')) in deleted_ids:
+            errors.append({'index': index, 'error': '联系人在同一批操作中被删除'})
+    
+    # Updates and favorites are grouped into set-based statements, which
+    # would not apply several of them to one contact in order
+    updated_ids = set()
+    for index, op in enumerate(parsed_ops):
+        if op and op['op'] in ('update', 'favorite'):
+            if op['id'] in updated_ids:
+                errors.append({'index': index, 'error': '同一联系人在一批操作中只能更新一次'})
+            updated_ids.add(op['id'])
+    
+    if errors:
+        return jsonify({'error': '批量操作校验失败，未执行任何操作', 'errors': errors}), 400
+    
+    version = invalidate_contacts(user_id)
+    results = [{'index': index, 'status': 'ok'} for index in range(len(parsed_ops))]
+    touched_ids = set()
+    reindex_ids = set()
+    contacts_table = Contact.__table__
+    
+    # Creates
+    creates = [(index, op) for index, op in enumerate(parsed_ops) if op['op'] == 'create']
+    new_ids = insert_contacts(user_id, [op for _, op in creates], version)
+    for (index, _), contact_id in zip(creates, new_ids):
+        results[index]['id'] = contact_id
+    
+    # Updates, one executemany per set of updated columns
+    for columns in (('name',), ('is_favorite',), ('name', 'is_favorite')):
+        rows = [
+            {'b_id': op['id'], **{f'b_{column}': op[column] for column in columns}}
+            for op in parsed_ops
+            if op['op'] == 'update' and tuple(column for column in ('name', 'is_favorite') if column in op) == columns
+        ]
+        if rows:
+            db.session.execute(
+                update(contacts_table)
+                .where(contacts_table.c.id == bindparam('b_id'))
+                .values({column: bindparam(f'b_{column}') for column in columns}),
+                rows
+            )
+            touched_ids.update(row['b_id'] for row in rows)
+            if 'name' in columns:
+                reindex_ids.update(row['b_id'] for row in rows)
+    
+    # Favorites, one UPDATE per target value
+    favorite_ops = [op for op in parsed_ops if op['op'] == 'favorite']
+    for value in (True, False, None):
+        ids = [op['id'] for op in favorite_ops if op['value'] is value]
+        if ids:
+            new_value = not_(contacts_table.c.is_favorite) if value is None else value
+            db.session.execute(
+                update(contacts_table).where(contacts_table.c.id.in_(ids)).values(is_favorite=new_value)
+            )
+            touched_ids.update(ids)
+    
+    # Method additions and deletions
+    method_rows = [
+        {'contact_id': op['contact_id'], 'type': op['type'], 'value': op['value']}
+        for op in parsed_ops if op['op'] == 'add_method'
+    ]
+    if method_rows:
+        db.session.execute(insert(ContactMethod.__table__), method_rows)
+    method_ids = [op['method_id'] for op in parsed_ops if op['op'] == 'delete_method']
+    if method_ids:
+        db.session.execute(delete(ContactMethod.__table__).where(ContactMethod.__table__.c.id.in_(method_ids)))
+    method_contact_ids = {op['contact_id'] for op in parsed_ops if op['op'] in ('add_method', 'delete_method')}
+    touched_ids.update(method_contact_ids)
+    reindex_ids.update(method_contact_ids)
+    
+    # Deletes
+    delete_contacts(user_id, deleted_ids, version)
+    
+    if touched_ids:
+        db.session.execute(
+            update(contacts_table)
+            .where(contacts_table.c.id.in_(touched_ids))
+            .values(change_version=version, updated_at=datetime.utcnow())
+        )
+    if reindex_ids:
+        search_index.reindex_contacts(reindex_ids)
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'成功执行 {len(parsed_ops)} 个操作',
+        'results': results
+    }), 200
@@ -1,86 +1,256 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
+import json
+import os
+import tempfile
+import unicodedata
 from datetime import datetime
+from itertools import chain
+from urllib.parse import quote
 from .auth import login_required, get_current_user_id
 from ..models import db, Contact, ContactMethod
-from ..utils.excel import export_contacts_to_excel, import_contacts_from_excel
+from ..utils.excel import write_contacts_to_excel
+from ..utils.formats import (
+    EXPORT_FORMATS, EXCEL_SHEETS, VCARD_VERSIONS, detect_import_format, iter_contacts_from_file,
+    iter_contacts_from_path, iter_export_chunks
+)
+from ..utils.bulk_import import bulk_import_contacts
+from ..utils.dedupe import DUPLICATE_MODES, dedupe_import_contacts
+from ..utils.validation import validate_contacts
+from ..jobs import create_import_job, create_export_job
+from ..db_routing import read_replica
 
 import_export_bp = Blueprint('import_export', __name__)
 
+# Counts returned by a deduplicating import, with their label in the message
+IMPORT_COUNT_LABELS = [
+    ('imported_count', '新增'),
+    ('updated_count', '更新'),
+    ('merged_count', '合并'),
+    ('unchanged_count', '未变化'),
+    ('skipped_count', '跳过'),
+    ('deleted_count', '删除')
+]
+
+# Errors after which a validation stops, unless max_errors is given
+DEFAULT_MAX_ERRORS = 1000
+
 
 @import_export_bp.route('/export', methods=['GET'])
 @login_required
+@read_replica
 def export_contacts():
-    """Export all contacts of current user to Excel"""
+    """Export all contacts of current user as xlsx, csv, ndjson or vcard"""
     user_id = get_current_user_id()
     
-    contacts = Contact.query.filter_by(user_id=user_id).order_by(Contact.name).all()
+    file_format = request.args.get('format', 'xlsx').lower()
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的导出格式，有效格式: {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    vcard_version = request.args.get('version', '3.0')
+    if file_format == 'vcard' and vcard_version not in VCARD_VERSIONS:
+        return jsonify({'error': f'不支持的vCard版本，有效版本: {", ".join(VCARD_VERSIONS)}'}), 400
     
-    if not contacts:
+    if not Contact.query.filter_by(user_id=user_id).with_entities(Contact.id).first():
         return jsonify({'error': '没有联系人可导出'}), 400
     
-    # Generate Excel file
-    excel_file = export_contacts_to_excel(contacts)
+    # Run in the background and let the client poll the job
+    if request.args.get('async', '').lower() == 'true':
+        job = create_export_job(user_id, file_format, {'version': vcard_version})
+        return jsonify({'message': '导出任务已创建', 'job': job.to_dict()}), 202
+    
+    mimetype, extension = EXPORT_FORMATS[file_format]
     
     # Generate filename with timestamp
-    filename = f"通讯录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    filename = f"通讯录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    
+    type_max_count = ContactMethod.max_count_per_type(user_id) if file_format in ('xlsx', 'csv') else {}
+    rows = Contact.iter_with_methods(user_id, current_app.config['EXPORT_CHUNK_SIZE'])
     
+    if file_format != 'xlsx':
+        # Text formats are encoded while the response is being sent
+        response = Response(
+            stream_with_context(iter_export_chunks(file_format, rows, type_max_count, vcard_version)),
+            content_type=mimetype
+        )
+        # Same ASCII fallback plus RFC 5987 filename* as send_file
+        response.headers.set('Content-Disposition', 'attachment', **{
+            'filename': unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii'),
+            'filename*': f"UTF-8''{quote(filename)}"
+        })
+        return response
+    
+    # Generate Excel file into a temporary file, streaming contacts in chunks
+    excel_file = tempfile.TemporaryFile()
+    try:
+        write_contacts_to_excel(rows, type_max_count, excel_file)
+    except Exception:
+        excel_file.close()
+        raise
+    excel_file.seek(0)
+    
+    # send_file streams the temporary file in blocks and closes it afterwards
     return send_file(
         excel_file,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        mimetype=mimetype,
         as_attachment=True,
         download_name=filename
     )
 
 
+def _get_import_file():
+    """
+    Get the uploaded import file and its format
+    
+    Returns:
+        (file, format, None), or (None, None, error response) if the upload is invalid
+    """
+    if 'file' not in request.files:
+        return None, None, (jsonify({'error': '请上传导入文件'}), 400)
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, None, (jsonify({'error': '未选择文件'}), 400)
+    
+    file_format = detect_import_format(file.filename, request.form.get('format') or request.args.get('format'))
+    if file_format is None:
+        return None, None, (
+            jsonify({'error': '请上传Excel、CSV、NDJSON或vCard文件（.xlsx、.xls、.csv、.ndjson、.jsonl或.vcf格式）'}), 400
+        )
+    
+    return file, file_format, None
+
+
+def parse_import_options(values):
+    """
+    Read the duplicate handling, sheet selection and worker count of an import
+    
+    Args:
+        values: Form or JSON values of the request
+        
+    Returns:
+        (options, None) where options are the job params on_duplicate,
+        sheets and workers, or (None, error response) if a value is invalid
+    """
+    # What to do with contacts already in the address book
+    on_duplicate = values.get('on_duplicate', 'insert')
+    if on_duplicate not in DUPLICATE_MODES:
+        return None, (jsonify({'error': f'无效的重复处理方式，有效方式: {", ".join(DUPLICATE_MODES)}'}), 400)
+    
+    # Which sheets of an xlsx file are imported, whatever the worker count
+    sheets = values.get('sheets', 'active')
+    if sheets not in EXCEL_SHEETS:
+        return None, (jsonify({'error': f'无效的工作表范围，有效范围: {", ".join(EXCEL_SHEETS)}'}), 400)
+    
+    # More than one worker parses the sheets of an xlsx file in a process pool
+    try:
+        workers = int(values.get('workers', 1))
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': '参数workers必须是整数'}), 400)
+    if workers < 1:
+        return None, (jsonify({'error': '参数workers必须大于0'}), 400)
+    
+    return {
+        'on_duplicate': on_duplicate,
+        'sheets': sheets,
+        'workers': min(workers, current_app.config['IMPORT_MAX_WORKERS'])
+    }, None
+
+
+@import_export_bp.route('/import/validate', methods=['POST'])
+@login_required
+def validate_import():
+    """
+    Check an import file without importing it
+    
+    Streams an NDJSON report while the file is parsed: one line per
+    problem found in a row, then a summary line. The database is not
+    touched.
+    """
+    file, file_format, error = _get_import_file()
+    if error:
+        return error
+    
+    # The same sheets as the import would read
+    options, error = parse_import_options(request.form)
+    if error:
+        return error
+    
+    try:
+        max_errors = int(request.form.get('max_errors') or request.args.get('max_errors') or DEFAULT_MAX_ERRORS)
+    except ValueError:
+        return jsonify({'error': '参数max_errors必须是整数'}), 400
+    if max_errors < 0:
+        return jsonify({'error': '参数max_errors不能小于0'}), 400
+    
+    report = validate_contacts(
+        iter_contacts_from_file(file.stream, file_format, options['sheets']),
+        current_app.config['DEDUPE_COUNTRY_CODE'],
+        max_errors
+    )
+    lines = (json.dumps(line, ensure_ascii=False) + '\n' for line in report)
+    return Response(stream_with_context(lines), content_type=EXPORT_FORMATS['ndjson'][0])
+
+
 @import_export_bp.route('/import', methods=['POST'])
 @login_required
 def import_contacts():
-    """Import contacts from Excel file"""
+    """Import contacts from an xlsx, csv, ndjson or vcard file"""
     user_id = get_current_user_id()
     
-    if 'file' not in request.files:
-        return jsonify({'error': '请上传Excel文件'}), 400
+    file, file_format, error = _get_import_file()
+    if error:
+        return error
     
-    file = request.files['file']
+    mode = request.form.get('mode', 'atomic')
+    if mode not in ('atomic', 'batched'):
+        return jsonify({'error': '无效的导入模式，有效模式: atomic, batched'}), 400
     
-    if file.filename == '':
-        return jsonify({'error': '未选择文件'}), 400
+    options, error = parse_import_options(request.form)
+    if error:
+        return error
+    on_duplicate = options['on_duplicate']
     
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return jsonify({'error': '请上传Excel文件（.xlsx或.xls格式）'}), 400
+    # Run in the background and let the client poll the job
+    if request.args.get('async', '').lower() == 'true' or request.form.get('async', '').lower() == 'true':
+        job = create_import_job(user_id, file, file_format, options)
+        return jsonify({'message': '导入任务已创建', 'job': job.to_dict()}), 202
     
+    parallel_path = None
     try:
-        # Parse Excel file
-        contacts_data = import_contacts_from_excel(file)
+        if file_format == 'xlsx' and options['workers'] > 1 and options['sheets'] == 'all':
+            # Worker processes reopen the workbook, so it has to be on disk
+            with tempfile.NamedTemporaryFile(dir=current_app.config['UPLOAD_FOLDER'], suffix='.xlsx', delete=False) as upload:
+                parallel_path = upload.name
+            file.save(parallel_path)
+            contacts_data = iter_contacts_from_path(parallel_path, file_format, options['workers'], options['sheets'])
+        else:
+            # Stream contacts out of the uploaded file
+            contacts_data = iter_contacts_from_file(file.stream, file_format, options['sheets'])
         
-        if not contacts_data:
-            return jsonify({'error': 'Excel文件中没有有效的联系人数据'}), 400
+        first_contact = next(contacts_data, None)
+        if first_contact is None:
+            return jsonify({'error': '文件中没有有效的联系人数据'}), 400
         
-        # Import contacts
-        imported_count = 0
-        for contact_data in contacts_data:
-            # Create contact
-            contact = Contact(
-                user_id=user_id,
-                name=contact_data['name'],
-                is_favorite=contact_data.get('is_favorite', False)
+        contacts_data = chain([first_contact], contacts_data)
+        if on_duplicate != 'insert':
+            counts = dedupe_import_contacts(
+                user_id,
+                contacts_data,
+                on_duplicate,
+                batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+                atomic=mode == 'atomic'
             )
-            db.session.add(contact)
-            db.session.flush()
-            
-            # Add contact methods
-            for method_data in contact_data.get('methods', []):
-                if method_data['type'] in ContactMethod.VALID_TYPES:
-                    method = ContactMethod(
-                        contact_id=contact.id,
-                        type=method_data['type'],
-                        value=method_data['value']
-                    )
-                    db.session.add(method)
-            
-            imported_count += 1
+            summary = '，'.join(f'{label} {counts[key]} 个' for key, label in IMPORT_COUNT_LABELS if counts[key])
+            return jsonify({'message': f'导入完成：{summary}', **counts}), 200
         
-        db.session.commit()
+        # Import contacts with multi-row inserts as they are parsed
+        imported_count = bulk_import_contacts(
+            user_id,
+            contacts_data,
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+            atomic=mode == 'atomic'
+        )
         
         return jsonify({
             'message': f'成功导入 {imported_count} 个联系人',
@@ -90,3 +260,7 @@ def import_contacts():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'导入失败: {str(e)}'}), 500
+    
+    finally:
+        if parallel_path and os.path.exists(parallel_path):
+            os.remove(parallel_path)
@@ -0,0 +1,64 @@
+import os
+from flask import Blueprint, jsonify, send_file
+from .auth import login_required, get_current_user_id
+from ..models import Job
+from ..utils.formats import EXPORT_FORMATS
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Number of jobs returned by the job list
+RECENT_JOBS_LIMIT = 20
+
+
+@jobs_bp.route('', methods=['GET'])
+@login_required
+def get_jobs():
+    """Get the recent jobs of current user"""
+    user_id = get_current_user_id()
+    
+    jobs = Job.query.filter_by(user_id=user_id).order_by(Job.created_at.desc()).limit(RECENT_JOBS_LIMIT).all()
+    
+    return jsonify({'jobs': [job.to_dict() for job in jobs]}), 200
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Get the status and progress of a job"""
+    user_id = get_current_user_id()
+    
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first()
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    return jsonify({'job': job.to_dict()}), 200
+
+
+@jobs_bp.route('/<job_id>/download', methods=['GET'])
+@login_required
+def download_job_result(job_id):
+    """Download the file produced by an export job"""
+    user_id = get_current_user_id()
+    
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first()
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    if job.kind != 'export':
+        return jsonify({'error': '该任务没有可下载的文件'}), 400
+    
+    if job.status != 'succeeded':
+        return jsonify({'error': '导出任务尚未完成'}), 409
+    
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': '导出文件已失效'}), 410
+    
+    mimetype, extension = EXPORT_FORMATS[job.file_format]
+    filename = f"通讯录_{job.created_at.strftime('%Y%m%d_%H%M%S')}.{extension}"
+    
+    return send_file(
+        job.file_path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=filename
+    )
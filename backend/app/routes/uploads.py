@@ -0,0 +1,230 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import ClientDisconnected
+from .auth import login_required, get_current_user_id
+from .import_export import parse_import_options
+from ..models import db, Upload
+from ..utils.formats import detect_import_format
+from ..jobs import create_import_job_from_path
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Bytes read from the request body per write
+BLOCK_SIZE = 64 * 1024
+
+
+def _upload_folder(app):
+    """Folder holding the files of unfinished uploads"""
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], 'uploads')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _remove_file(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _remove_expired_uploads(app):
+    """Delete the unfinished uploads older than UPLOAD_EXPIRES, without committing"""
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['UPLOAD_EXPIRES'])
+    for upload in Upload.query.filter(Upload.created_at < cutoff, Upload.job_id.is_(None)).all():
+        _remove_file(upload.file_path)
+        db.session.delete(upload)
+
+
+def _get_upload(upload_id, user_id, for_update=False):
+    query = Upload.query.filter_by(id=upload_id, user_id=user_id)
+    if for_update:
+        # Serializes the checks of concurrent requests on one upload
+        query = query.with_for_update()
+    return query.first()
+
+
+@uploads_bp.route('', methods=['POST'])
+@login_required
+def create_upload():
+    """
+    Start a chunked upload of an import file
+    
+    Files of any size up to UPLOAD_MAX_SIZE are sent in parts that each fit
+    in MAX_CONTENT_LENGTH, written to disk as they arrive, and imported by a
+    background job once complete.
+    """
+    user_id = get_current_user_id()
+    app = current_app._get_current_object()
+    data = request.get_json()
+    
+    if not isinstance(data, dict):
+        return jsonify({'error': '请提供文件信息'}), 400
+    
+    filename = str(data.get('filename') or '').strip()
+    if not filename:
+        return jsonify({'error': '请提供文件名'}), 400
+    
+    file_format = detect_import_format(filename, data.get('format'))
+    if file_format is None:
+        return jsonify({'error': '请上传Excel、CSV、NDJSON或vCard文件（.xlsx、.xls、.csv、.ndjson、.jsonl或.vcf格式）'}), 400
+    
+    size = data.get('size')
+    if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+        return jsonify({'error': '参数size必须是正整数'}), 400
+    if size > app.config['UPLOAD_MAX_SIZE']:
+        return jsonify({'error': f"文件不能超过{app.config['UPLOAD_MAX_SIZE'] // (1024 * 1024)}MB"}), 413
+    
+    _remove_expired_uploads(app)
+    
+    upload_id = uuid.uuid4().hex
+    upload = Upload(
+        id=upload_id,
+        user_id=user_id,
+        filename=filename[:255],
+        file_format=file_format,
+        size=size,
+        file_path=os.path.join(_upload_folder(app), f'{upload_id}.part')
+    )
+    open(upload.file_path, 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    
+    return jsonify({
+        'message': '上传已创建',
+        'upload': upload.to_dict(),
+        'max_part_size': app.config['MAX_CONTENT_LENGTH']
+    }), 201
+
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@login_required
+def get_upload(upload_id):
+    """Get an upload and its offset, the byte to resume from"""
+    user_id = get_current_user_id()
+    
+    upload = _get_upload(upload_id, user_id)
+    if not upload:
+        return jsonify({'error': '上传不存在'}), 404
+    
+    return jsonify({'upload': upload.to_dict()}), 200
+
+
+@uploads_bp.route('/<upload_id>', methods=['PUT'])
+@login_required
+def upload_part(upload_id):
+    """
+    Append a part to an upload
+    
+    The body holds the raw bytes of the part and the offset parameter
+    the position of its first byte, which must be the current offset of
+    the upload. The body is written to disk block by block, so after a
+    dropped connection the bytes received are kept and the client resumes
+    from the offset returned by GET.
+    
+    Blocks are written at their position in the file rather than
+    appended, so a part retried while the first attempt is still being
+    received writes the same bytes to the same place. The upload row is
+    only locked while the offset is checked, not while the body arrives.
+    """
+    user_id = get_current_user_id()
+    
+    upload = _get_upload(upload_id, user_id, for_update=True)
+    if not upload:
+        return jsonify({'error': '上传不存在'}), 404
+    
+    if upload.job_id:
+        return jsonify({'error': '上传已完成'}), 409
+    
+    try:
+        offset = int(request.args['offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': '参数offset必须是整数'}), 400
+    
+    current_offset = upload.get_offset()
+    if offset != current_offset:
+        return jsonify({'error': '偏移量与已上传的大小不一致', 'offset': current_offset}), 409
+    
+    length = request.content_length
+    if length is None:
+        return jsonify({'error': '请提供Content-Length'}), 411
+    if offset + length > upload.size:
+        return jsonify({'error': '上传的数据超出了文件大小', 'offset': current_offset}), 400
+    
+    # Release the row lock before waiting on the client
+    file_path = upload.file_path
+    db.session.commit()
+    
+    written = 0
+    try:
+        with open(file_path, 'r+b') as part_file:
+            part_file.seek(offset)
+            while True:
+                block = request.stream.read(BLOCK_SIZE)
+                if not block:
+                    break
+                part_file.write(block)
+                written += len(block)
+    except ClientDisconnected:
+        # Raised by Werkzeug's own body stream, gunicorn returns a short read instead
+        pass
+    
+    if written != length:
+        return jsonify({'error': '上传的数据不完整，请从offset处继续上传', 'upload': upload.to_dict()}), 400
+    
+    return jsonify({'upload': upload.to_dict()}), 200
+
+
+@uploads_bp.route('/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """
+    Finish an upload and queue the import of the file
+    
+    Accepts the on_duplicate, sheets and workers options of /api/import.
+    """
+    user_id = get_current_user_id()
+    
+    upload = _get_upload(upload_id, user_id, for_update=True)
+    if not upload:
+        return jsonify({'error': '上传不存在'}), 404
+    
+    if upload.job_id:
+        return jsonify({'error': '上传已完成', 'upload': upload.to_dict()}), 409
+    
+    options, error = parse_import_options(request.get_json(silent=True) or {})
+    if error:
+        return error
+    
+    offset = upload.get_offset()
+    if offset != upload.size:
+        return jsonify({'error': '文件尚未上传完整', 'offset': offset}), 409
+    
+    job = create_import_job_from_path(user_id, upload.file_path, upload.file_format, options)
+    upload.job_id = job.id
+    db.session.commit()
+    
+    return jsonify({
+        'message': '导入任务已创建',
+        'job': job.to_dict(),
+        'upload': upload.to_dict()
+    }), 202
+
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    """Cancel an unfinished upload and delete the received data"""
+    user_id = get_current_user_id()
+    
+    upload = _get_upload(upload_id, user_id, for_update=True)
+    if not upload:
+        return jsonify({'error': '上传不存在'}), 404
+    
+    if upload.job_id:
+        return jsonify({'error': '上传已完成'}), 409
+    
+    _remove_file(upload.file_path)
+    db.session.delete(upload)
+    db.session.commit()
+    
+    return jsonify({'message': '上传已取消'}), 200
@@ -0,0 +1,39 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from .models import db
+
+
+def sync_schema():
+    """
+    Bring the database schema up to date with the models
+    
+    Creates missing tables, then adds columns and indexes that were added
+    to existing tables since they were created. New non-nullable columns
+    must have a server_default so existing rows can be filled.
+    
+    Returns:
+        List of applied changes, for logging
+    """
+    # The read replica gets the schema through replication
+    db.create_all(bind_key=None)
+    
+    changes = []
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+            changes.append(f'added column {table.name}.{column.name}')
+        
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            index.create(db.engine)
+            changes.append(f'created index {index.name}')
+    
+    return changes
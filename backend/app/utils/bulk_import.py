@@ -0,0 +1,252 @@
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, delete, select, update, bindparam, text
+from ..models import db, User, Contact, ContactMethod, ContactTombstone, ContactSearchTerm
+from . import search as search_index
+
+
+def _batches(iterable, size):
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def content_hash(name, is_favorite, methods):
+    """
+    Hash of the content of a contact
+    
+    Args:
+        name: Contact name
+        is_favorite: Favorite status
+        methods: Iterable of (type, value) tuples, in any order
+        
+    Returns:
+        Hex SHA-1 digest
+    """
+    content = [name, bool(is_favorite), sorted([method_type, value] for method_type, value in methods)]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def load_content_hashes(user_id):
+    """
+    Get the content hashes of all contacts of a user, without committing
+    
+    A stored hash is current if it was computed at the contact's
+    change_version. Other hashes, e.g. of contacts edited through the
+    contact routes, are recomputed from the rows and stored.
+    
+    Returns:
+        Dict mapping contact ID to content hash
+    """
+    table = Contact.__table__
+    hashes = {}
+    stale_ids = []
+    rows = db.session.execute(
+        select(table.c.id, table.c.content_hash, table.c.content_hash_version, table.c.change_version)
+        .where(table.c.user_id == user_id)
+    )
+    for contact_id, stored_hash, hash_version, change_version in rows:
+        if stored_hash is not None and hash_version == change_version:
+            hashes[contact_id] = stored_hash
+        else:
+            stale_ids.append(contact_id)
+    
+    for chunk in _batches(stale_ids, ContactMethod.BATCH_SIZE):
+        methods_map = ContactMethod.rows_by_contact(chunk)
+        updates = []
+        rows = db.session.execute(
+            select(table.c.id, table.c.name, table.c.is_favorite, table.c.change_version).where(table.c.id.in_(chunk))
+        )
+        for contact_id, name, is_favorite, change_version in rows:
+            methods = [(method['type'], method['value']) for method in methods_map.get(contact_id, [])]
+            hashes[contact_id] = content_hash(name, is_favorite, methods)
+            updates.append({'b_id': contact_id, 'b_hash': hashes[contact_id], 'b_version': change_version})
+        if updates:
+            # Keep updated_at, storing a hash does not change the contact
+            db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam('b_id'))
+                .values(
+                    content_hash=bindparam('b_hash'),
+                    content_hash_version=bindparam('b_version'),
+                    updated_at=table.c.updated_at
+                ),
+                updates
+            )
+    
+    return hashes
+
+
+def _consecutive_ids_supported():
+    """
+    Check whether a multi-row INSERT gets consecutive auto-increment IDs
+    
+    True on MySQL when innodb_autoinc_lock_mode is 0 or 1, in which case
+    the IDs of a batch can be derived from LAST_INSERT_ID().
+    """
+    if db.engine.dialect.name != 'mysql':
+        return False
+    lock_mode = db.session.execute(text('SELECT @@innodb_autoinc_lock_mode')).scalar()
+    return lock_mode is not None and int(lock_mode) in (0, 1)
+
+
+def _insert_contacts(rows, consecutive_ids):
+    """
+    Insert contact rows with one statement and return their IDs in the same order
+    
+    Uses INSERT ... RETURNING where the dialect supports it, and a single
+    multi-row INSERT otherwise. On MySQL with consecutive IDs they are
+    derived from LAST_INSERT_ID(), otherwise the rows are tagged with a
+    batch token and the IDs read back with one SELECT.
+    """
+    table = Contact.__table__
+    dialect = db.engine.dialect
+    
+    if getattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False):
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return [row[0] for row in db.session.execute(stmt, rows)]
+    
+    if consecutive_ids:
+        result = db.session.execute(insert(table).values(rows))
+        first_id = result.lastrowid
+        return list(range(first_id, first_id + len(rows)))
+    
+    # With innodb_autoinc_lock_mode=2 concurrent inserts can interleave
+    # their IDs, but the IDs of one statement still increase in row order
+    token = uuid.uuid4().hex
+    db.session.execute(insert(table).values([{**row, 'import_token': token} for row in rows]))
+    return list(db.session.execute(
+        select(table.c.id).where(table.c.import_token == token).order_by(table.c.id)
+    ).scalars())
+
+
+def insert_contacts(user_id, contacts_data, version, consecutive_ids=None):
+    """
+    Insert contacts, their methods and search entries without committing
+    
+    Args:
+        user_id: Owner ID
+        contacts_data: List of contact dicts as returned by the Excel parser
+        version: User's contacts version stamped on the new contacts
+        consecutive_ids: Result of _consecutive_ids_supported, looked up if None
+        
+    Returns:
+        List of new contact IDs in the order of contacts_data
+    """
+    if not contacts_data:
+        return []
+    if consecutive_ids is None:
+        consecutive_ids = _consecutive_ids_supported()
+    
+    now = datetime.utcnow()
+    contacts_methods = [
+        [
+            (method_data['type'], method_data['value'])
+            for method_data in contact_data.get('methods', [])
+            if method_data['type'] in ContactMethod.VALID_TYPES
+        ]
+        for contact_data in contacts_data
+    ]
+    contact_rows = [
+        {
+            'user_id': user_id,
+            'name': contact_data['name'],
+            'is_favorite': bool(contact_data.get('is_favorite', False)),
+            'created_at': now,
+            'updated_at': now,
+            'change_version': version,
+            'content_hash': content_hash(contact_data['name'], contact_data.get('is_favorite', False), methods),
+            'content_hash_version': version
+        }
+        for contact_data, methods in zip(contacts_data, contacts_methods)
+    ]
+    contact_ids = _insert_contacts(contact_rows, consecutive_ids)
+    
+    method_rows = []
+    documents = []
+    for contact_id, contact_data, methods in zip(contact_ids, contacts_data, contacts_methods):
+        method_rows.extend(
+            {'contact_id': contact_id, 'type': method_type, 'value': value}
+            for method_type, value in methods
+        )
+        documents.append((user_id, contact_id, contact_data['name'], [value for _, value in methods]))
+    
+    if method_rows:
+        db.session.execute(insert(ContactMethod.__table__), method_rows)
+    search_index.index_contacts(documents)
+    
+    return contact_ids
+
+
+def delete_contacts(user_id, contact_ids, version):
+    """
+    Delete contacts with their methods and search entries, without committing
+    
+    Leaves a tombstone per contact for delta sync and prunes the user's
+    expired ones.
+    
+    Args:
+        user_id: Owner ID, the contacts must belong to this user
+        contact_ids: IDs of the contacts to delete
+        version: User's contacts version stamped on the tombstones
+    """
+    contact_ids = list(contact_ids)
+    if not contact_ids:
+        return
+    
+    db.session.execute(
+        delete(ContactSearchTerm.__table__).where(ContactSearchTerm.__table__.c.contact_id.in_(contact_ids))
+    )
+    db.session.execute(
+        delete(ContactMethod.__table__).where(ContactMethod.__table__.c.contact_id.in_(contact_ids))
+    )
+    db.session.execute(delete(Contact.__table__).where(Contact.__table__.c.id.in_(contact_ids)))
+    now = datetime.utcnow()
+    db.session.execute(insert(ContactTombstone.__table__), [
+        {'user_id': user_id, 'contact_id': contact_id, 'change_version': version, 'deleted_at': now}
+        for contact_id in contact_ids
+    ])
+    ContactTombstone.prune(user_id)
+
+
+def bulk_import_contacts(user_id, contacts_data, batch_size=1000, atomic=True, on_batch=None):
+    """
+    Insert parsed contacts and their methods with multi-row statements
+    
+    Args:
+        user_id: Owner ID
+        contacts_data: Iterable of contact dicts as returned by the Excel parser
+        batch_size: Number of contacts inserted per batch
+        atomic: Commit once at the end if True, otherwise after every batch
+        on_batch: Optional callback called with the running count after each
+            batch, before the batch is committed in non-atomic mode
+        
+    Returns:
+        Number of contacts imported
+    """
+    consecutive_ids = _consecutive_ids_supported()
+    imported_count = 0
+    version = None
+    
+    for batch in _batches(contacts_data, batch_size):
+        # One version for an atomic import, one per committed batch otherwise
+        if version is None or not atomic:
+            version = User.bump_contacts_version(user_id)
+        
+        insert_contacts(user_id, batch, version, consecutive_ids)
+        
+        imported_count += len(batch)
+        if on_batch is not None:
+            on_batch(imported_count)
+        if not atomic:
+            db.session.commit()
+    
+    db.session.commit()
+    return imported_count
@@ -0,0 +1,48 @@
+import csv
+from io import StringIO
+from .excel import build_headers, contact_to_row, iter_contacts_from_rows
+
+# Flush the encoder buffer once it holds this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_contacts_to_csv(rows, type_max_count):
+    """
+    Encode contacts as CSV with the same columns as the Excel export
+    
+    Args:
+        rows: Iterable of (Contact, list of ContactMethod) tuples
+        type_max_count: Dict mapping method type to the max count on one contact
+        
+    Yields:
+        Chunks of CSV text, the first one starting with a BOM so that
+        Excel detects UTF-8
+    """
+    headers, method_columns = build_headers(type_max_count)
+    
+    buffer = StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    
+    for contact, methods in rows:
+        writer.writerow(contact_to_row(contact, methods, method_columns))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+
+def iter_contacts_from_csv(text_stream):
+    """
+    Stream contacts from a CSV file
+    
+    Args:
+        text_stream: Text file object opened with newline=''
+        
+    Yields:
+        Dictionaries containing contact data
+    """
+    yield from iter_contacts_from_rows(csv.reader(text_stream))
@@ -0,0 +1,569 @@
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, insert, select, update, delete
+from ..models import db, User, Contact, ContactMethod
+from . import search as search_index
+from .bulk_import import (
+    _batches, _consecutive_ids_supported, content_hash, delete_contacts, insert_contacts, load_content_hashes
+)
+
+# What an import does with a contact that duplicates an existing one,
+# sync also deletes the contacts missing from the file
+DUPLICATE_MODES = ['insert', 'skip', 'merge', 'upsert', 'sync']
+
+# Method types identifying a person, contacts sharing one are duplicates
+IDENTIFYING_TYPES = ('phone', 'email')
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_name(name):
+    """Name key: NFKC folded, case-insensitive, whitespace removed"""
+    return ''.join(unicodedata.normalize('NFKC', name or '').casefold().split())
+
+
+def normalize_phone(value, country_code):
+    """
+    Normalize a phone number to an E.164-style '+<digits>' string
+    
+    Numbers starting with '+' or '00' keep their country code, others are
+    national numbers: a trunk prefix '0' is dropped and country_code is
+    prepended. Punctuation, spaces and full-width digits are ignored.
+    
+    Returns:
+        Normalized number, '' if the value has no digits
+    """
+    value = unicodedata.normalize('NFKC', value or '').strip()
+    digits = _NON_DIGITS.sub('', value)
+    if not digits:
+        return ''
+    if value.startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        return f'+{digits[2:]}'
+    if digits.startswith('0'):
+        digits = digits[1:]
+    return f'+{country_code}{digits}'
+
+
+def normalize_email(value):
+    """Email key: NFKC folded, case-insensitive"""
+    return unicodedata.normalize('NFKC', value or '').strip().casefold()
+
+
+def method_identity(method_type, value, country_code):
+    """
+    Normalized (type, value) of a contact method
+    
+    Two methods with the same identity are the same phone number, email
+    address, etc., however they were written.
+    """
+    if method_type == 'phone':
+        return method_type, normalize_phone(value, country_code)
+    if method_type == 'email':
+        return method_type, normalize_email(value)
+    return method_type, ' '.join(unicodedata.normalize('NFKC', value or '').casefold().split())
+
+
+def default_country_code():
+    """Country code of national phone numbers, from DEDUPE_COUNTRY_CODE"""
+    return current_app.config['DEDUPE_COUNTRY_CODE']
+
+
+class _UnionFind:
+    """Disjoint sets of contact IDs with path halving"""
+    
+    def __init__(self):
+        self.parent = {}
+    
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+    
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+class DuplicateIndex:
+    """
+    Blocking index of the contacts of one user
+    
+    Contacts are filed under their normalized phone numbers, emails and
+    name, so only contacts sharing a key are ever compared and duplicates
+    are found in near-linear time instead of comparing every pair.
+    
+    Two contacts are duplicates when they share a phone number or email,
+    or when they have the same name and one of them has neither. A name
+    alone is ambiguous when several contacts with that name have different
+    phone numbers or emails, and such contacts are not matched by name.
+    """
+    
+    def __init__(self, country_code):
+        self.country_code = country_code
+        self._identifiers = defaultdict(set)  # phone/email key -> contact IDs
+        self._names = defaultdict(set)  # name key -> contact IDs
+        self._bare_names = defaultdict(set)  # name key -> contact IDs without phone or email
+        self._entries = {}  # contact ID -> (name key, identifier keys)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def keys(self, name, methods):
+        """
+        Blocking keys of a contact
+        
+        Args:
+            name: Contact name
+            methods: Iterable of (type, value) tuples
+        
+        Returns:
+            (name key, frozenset of phone and email keys)
+        """
+        identifiers = set()
+        for method_type, value in methods:
+            if method_type in IDENTIFYING_TYPES:
+                identity = method_identity(method_type, value, self.country_code)
+                if identity[1]:
+                    identifiers.add(identity)
+        return normalize_name(name), frozenset(identifiers)
+    
+    def add(self, contact_id, name, methods):
+        """File a contact under its keys, adding to the keys it already has"""
+        name_key, identifiers = self.keys(name, methods)
+        if contact_id in self._entries:
+            old_name_key, old_identifiers = self._entries[contact_id]
+            self.remove(contact_id)
+            if not name_key:
+                name_key = old_name_key
+            identifiers |= old_identifiers
+        
+        self._entries[contact_id] = (name_key, identifiers)
+        for identifier in identifiers:
+            self._identifiers[identifier].add(contact_id)
+        if name_key:
+            self._names[name_key].add(contact_id)
+            if not identifiers:
+                self._bare_names[name_key].add(contact_id)
+    
+    def remove(self, contact_id):
+        """Remove a contact from the index"""
+        entry = self._entries.pop(contact_id, None)
+        if entry is None:
+            return
+        name_key, identifiers = entry
+        for identifier in identifiers:
+            self._discard(self._identifiers, identifier, contact_id)
+        if name_key:
+            self._discard(self._names, name_key, contact_id)
+            self._discard(self._bare_names, name_key, contact_id)
+    
+    @staticmethod
+    def _discard(blocks, key, contact_id):
+        block = blocks.get(key)
+        if block is not None:
+            block.discard(contact_id)
+            if not block:
+                del blocks[key]
+    
+    @staticmethod
+    def _first(contact_ids):
+        """Smallest existing ID, or the first pending one (-1, -2, ...) if none exists"""
+        existing = [contact_id for contact_id in contact_ids if contact_id > 0]
+        return min(existing) if existing else max(contact_ids)
+    
+    def find(self, name, methods):
+        """
+        Find a duplicate of a contact
+        
+        Args:
+            name: Contact name
+            methods: Iterable of (type, value) tuples
+        
+        Returns:
+            ID of the first matching contact, None if there is no match.
+            Existing contacts come before the contacts added with negative
+            IDs while pending insertion, which come in the order added.
+        """
+        name_key, identifiers = self.keys(name, methods)
+        matches = set()
+        for identifier in identifiers:
+            matches |= self._identifiers.get(identifier, set())
+        if matches:
+            return self._first(matches)
+        if not name_key:
+            return None
+        
+        bare = self._bare_names.get(name_key)
+        if bare:
+            return self._first(bare)
+        if not identifiers:
+            named = self._names.get(name_key, set())
+            if len(named) == 1:
+                return next(iter(named))
+        return None
+    
+    def groups(self):
+        """
+        Group the indexed contacts into sets of duplicates
+        
+        Returns:
+            List of sorted contact ID lists with more than one contact,
+            ordered by their smallest ID
+        """
+        sets = _UnionFind()
+        for block in self._identifiers.values():
+            first = min(block)
+            for contact_id in block:
+                sets.union(first, contact_id)
+        for name_key, bare in self._bare_names.items():
+            first = min(bare)
+            for contact_id in bare:
+                sets.union(first, contact_id)
+            # Contacts without phone or email join the one contact of that name having them
+            identified = self._names[name_key] - bare
+            if len(identified) == 1:
+                sets.union(first, next(iter(identified)))
+        
+        members = defaultdict(list)
+        for contact_id in sets.parent:
+            members[sets.find(contact_id)].append(contact_id)
+        return sorted(sorted(group) for group in members.values() if len(group) > 1)
+    
+    def candidate_pairs(self):
+        """Number of contact pairs sharing a block, i.e. compared by the index"""
+        blocks = list(self._identifiers.values()) + list(self._names.values())
+        return sum(len(block) * (len(block) - 1) // 2 for block in blocks)
+    
+    @classmethod
+    def load(cls, user_id, country_code=None, contact_ids=None):
+        """
+        Build the index of the contacts of a user
+        
+        Reads plain rows, one query for the phone numbers and emails and
+        one for the names, per chunk of contact_ids if they are given.
+        
+        Args:
+            user_id: Owner ID
+            country_code: Country code of phone numbers written without one
+            contact_ids: Only index these contacts, None for all of them
+        """
+        index = cls(country_code or default_country_code())
+        contacts_table = Contact.__table__
+        methods_table = ContactMethod.__table__
+        
+        if contact_ids is None:
+            chunks = [None]
+        else:
+            chunks = _batches(sorted(contact_ids), ContactMethod.BATCH_SIZE)
+        for chunk in chunks:
+            contacts_filter = [contacts_table.c.user_id == user_id]
+            if chunk is not None:
+                contacts_filter.append(contacts_table.c.id.in_(chunk))
+            
+            methods_map = defaultdict(list)
+            rows = db.session.execute(
+                select(methods_table.c.contact_id, methods_table.c.type, methods_table.c.value)
+                .join(contacts_table, contacts_table.c.id == methods_table.c.contact_id)
+                .where(*contacts_filter, methods_table.c.type.in_(IDENTIFYING_TYPES))
+            )
+            for contact_id, method_type, value in rows:
+                methods_map[contact_id].append((method_type, value))
+            
+            rows = db.session.execute(select(contacts_table.c.id, contacts_table.c.name).where(*contacts_filter))
+            for contact_id, name in rows:
+                index.add(contact_id, name, methods_map.pop(contact_id, ()))
+        return index
+
+
+def _method_tuples(contact_data):
+    """(type, value) tuples of the valid methods of a parsed contact"""
+    return [
+        (method_data['type'], method_data['value'])
+        for method_data in contact_data.get('methods', [])
+        if method_data['type'] in ContactMethod.VALID_TYPES
+    ]
+
+
+def _merge_data(target, source, country_code):
+    """Merge a parsed contact into another parsed contact, in place"""
+    seen = {method_identity(method_type, value, country_code) for method_type, value in _method_tuples(target)}
+    methods = list(target.get('methods', []))
+    for method_type, value in _method_tuples(source):
+        identity = method_identity(method_type, value, country_code)
+        if identity not in seen:
+            seen.add(identity)
+            methods.append({'type': method_type, 'value': value})
+    target['methods'] = methods
+    target['is_favorite'] = bool(target.get('is_favorite')) or bool(source.get('is_favorite'))
+
+
+def apply_merges(user_id, merges, version, country_code=None):
+    """
+    Merge parsed contacts into existing contacts, without committing
+    
+    Adds the methods not on the target yet, compared by normalized value,
+    and marks the target as favorite if any merged contact is one. Names
+    of the targets are kept.
+    
+    Args:
+        user_id: Owner ID
+        merges: Dict mapping target contact ID to a list of contact dicts
+        version: User's contacts version stamped on changed targets
+        country_code: Country code of national phone numbers
+    
+    Returns:
+        Set of the IDs of targets that changed
+    """
+    if not merges:
+        return set()
+    country_code = country_code or default_country_code()
+    
+    existing = defaultdict(set)
+    for contact_id, methods in ContactMethod.rows_by_contact(merges).items():
+        existing[contact_id] = {method_identity(method['type'], method['value'], country_code) for method in methods}
+    
+    method_rows = []
+    favorite_ids = []
+    for contact_id, sources in merges.items():
+        seen = existing[contact_id]
+        for source in sources:
+            for method_type, value in _method_tuples(source):
+                identity = method_identity(method_type, value, country_code)
+                if identity not in seen:
+                    seen.add(identity)
+                    method_rows.append({'contact_id': contact_id, 'type': method_type, 'value': value})
+            if source.get('is_favorite'):
+                favorite_ids.append(contact_id)
+    
+    contacts_table = Contact.__table__
+    changed_ids = {row['contact_id'] for row in method_rows}
+    if method_rows:
+        db.session.execute(insert(ContactMethod.__table__), method_rows)
+    if favorite_ids:
+        favorite_ids = set(db.session.scalars(
+            select(contacts_table.c.id).where(
+                contacts_table.c.id.in_(favorite_ids),
+                db.or_(contacts_table.c.is_favorite.is_(None), contacts_table.c.is_favorite.is_(False))
+            )
+        ))
+    if favorite_ids:
+        db.session.execute(update(contacts_table).where(contacts_table.c.id.in_(favorite_ids)).values(is_favorite=True))
+        changed_ids |= favorite_ids
+    
+    if changed_ids:
+        # The target may have been written at this version already, so its hash is cleared
+        db.session.execute(
+            update(contacts_table)
+            .where(contacts_table.c.id.in_(changed_ids))
+            .values(change_version=version, updated_at=datetime.utcnow(), content_hash=None)
+        )
+        search_index.reindex_contacts(changed_ids)
+    return changed_ids
+
+
+def apply_upserts(user_id, upserts, version):
+    """
+    Overwrite existing contacts with parsed contacts, without committing
+    
+    Name, favorite status and methods of each target are replaced.
+    
+    Args:
+        user_id: Owner ID
+        upserts: Dict mapping target contact ID to a contact dict
+        version: User's contacts version stamped on the targets
+    """
+    if not upserts:
+        return
+    contacts_table = Contact.__table__
+    methods_table = ContactMethod.__table__
+    
+    db.session.execute(
+        update(contacts_table)
+        .where(contacts_table.c.id == bindparam('b_id'))
+        .values(
+            name=bindparam('b_name'),
+            is_favorite=bindparam('b_is_favorite'),
+            change_version=version,
+            updated_at=datetime.utcnow(),
+            content_hash=bindparam('b_hash'),
+            content_hash_version=version
+        ),
+        [
+            {
+                'b_id': contact_id,
+                'b_name': data['name'],
+                'b_is_favorite': bool(data.get('is_favorite', False)),
+                'b_hash': content_hash(data['name'], data.get('is_favorite', False), _method_tuples(data))
+            }
+            for contact_id, data in upserts.items()
+        ]
+    )
+    db.session.execute(delete(methods_table).where(methods_table.c.contact_id.in_(list(upserts))))
+    method_rows = [
+        {'contact_id': contact_id, 'type': method_type, 'value': value}
+        for contact_id, data in upserts.items()
+        for method_type, value in _method_tuples(data)
+    ]
+    if method_rows:
+        db.session.execute(insert(methods_table), method_rows)
+    search_index.reindex_contacts(upserts)
+
+
+def dedupe_import_contacts(user_id, contacts_data, on_duplicate, batch_size=1000, atomic=True, on_batch=None):
+    """
+    Import parsed contacts, handling the ones that duplicate a contact
+    
+    Contacts are matched against the user's address book and against the
+    contacts imported before them. A duplicate is dropped with 'skip',
+    merged into the matching contact with 'merge' (see apply_merges), or
+    overwrites it with 'upsert'.
+    
+    'sync' makes the address book match the file: rows whose content hash
+    equals that of an existing contact are left alone, other rows update
+    the contact they duplicate or are inserted, and contacts matching no
+    row are deleted. Re-importing an edited file only writes the edits.
+    The file is first read through for the unchanged rows, the changed
+    ones are kept and then matched against an index of the contacts left
+    over, so the methods of unchanged contacts are never loaded.
+    
+    Args:
+        user_id: Owner ID
+        contacts_data: Iterable of contact dicts as returned by the parsers
+        on_duplicate: 'skip', 'merge', 'upsert' or 'sync'
+        batch_size: Number of contacts written per batch
+        atomic: Commit once at the end if True, otherwise after every batch
+        on_batch: Optional callback called with the running count of
+            processed contacts after each batch, before it is committed in
+            non-atomic mode
+    
+    Returns:
+        Dict with imported_count, merged_count, updated_count,
+        unchanged_count, skipped_count and deleted_count
+    """
+    if on_duplicate not in ('skip', 'merge', 'upsert', 'sync'):
+        raise ValueError(f'Unknown duplicate mode: {on_duplicate}')
+    sync = on_duplicate == 'sync'
+    
+    country_code = default_country_code()
+    hashes = load_content_hashes(user_id) if on_duplicate in ('upsert', 'sync') else {}
+    counts = dict.fromkeys(
+        ('imported_count', 'merged_count', 'updated_count', 'unchanged_count', 'skipped_count', 'deleted_count'), 0
+    )
+    processed_count = 0
+    # Contacts not matched by any row yet, looked up by content
+    unmatched = defaultdict(set)
+    
+    if sync:
+        for contact_id, digest in hashes.items():
+            unmatched[digest].add(contact_id)
+        
+        # Rows equal to a contact claim it by content alone
+        changed = []
+        for batch in _batches(contacts_data, batch_size):
+            for contact_data in batch:
+                methods = _method_tuples(contact_data)
+                same_content = unmatched.get(content_hash(contact_data['name'], contact_data.get('is_favorite', False), methods))
+                if same_content:
+                    same_content.remove(min(same_content))
+                    counts['unchanged_count'] += 1
+                else:
+                    changed.append(contact_data)
+            processed_count = counts['unchanged_count']
+            if on_batch is not None:
+                on_batch(processed_count)
+        
+        contacts_data = changed
+        unclaimed_ids = {contact_id for contact_ids in unmatched.values() for contact_id in contact_ids}
+        index = DuplicateIndex.load(user_id, country_code, unclaimed_ids)
+    else:
+        index = DuplicateIndex.load(user_id, country_code)
+    
+    def claim(contact_id):
+        """Take a contact out of the matching of a sync"""
+        index.remove(contact_id)
+        same_content = unmatched.get(hashes[contact_id])
+        if same_content is not None:
+            same_content.discard(contact_id)
+    
+    consecutive_ids = _consecutive_ids_supported()
+    version = None
+    
+    for batch in _batches(contacts_data, batch_size):
+        # New contacts of the batch get negative IDs until they are inserted
+        pending = []
+        merges = defaultdict(list)
+        upserts = {}
+        for contact_data in batch:
+            methods = _method_tuples(contact_data)
+            digest = content_hash(contact_data['name'], contact_data.get('is_favorite', False), methods)
+            match = index.find(contact_data['name'], methods)
+            if match is None:
+                pending.append(contact_data)
+                if not sync:
+                    index.add(-len(pending), contact_data['name'], methods)
+                counts['imported_count'] += 1
+            elif on_duplicate == 'skip':
+                counts['skipped_count'] += 1
+            elif on_duplicate == 'merge':
+                counts['merged_count'] += 1
+                index.add(match, contact_data['name'], methods)
+                if match < 0:
+                    _merge_data(pending[-match - 1], contact_data, country_code)
+                else:
+                    merges[match].append(contact_data)
+            elif sync:
+                counts['updated_count'] += 1
+                claim(match)
+                upserts[match] = contact_data
+            elif match > 0 and hashes.get(match) == digest:
+                counts['unchanged_count'] += 1
+            else:
+                index.remove(match)
+                index.add(match, contact_data['name'], methods)
+                if match < 0:
+                    # Still one new contact, already counted as imported
+                    pending[-match - 1] = contact_data
+                else:
+                    counts['updated_count'] += 1
+                    upserts[match] = contact_data
+                    hashes[match] = digest
+        
+        if pending or merges or upserts:
+            # One version for an atomic import, one per committed batch otherwise
+            if version is None or not atomic:
+                version = User.bump_contacts_version(user_id)
+            
+            new_ids = insert_contacts(user_id, pending, version, consecutive_ids)
+            if not sync:
+                for position, (contact_id, contact_data) in enumerate(zip(new_ids, pending), 1):
+                    index.remove(-position)
+                    index.add(contact_id, contact_data['name'], _method_tuples(contact_data))
+            apply_merges(user_id, merges, version, country_code)
+            apply_upserts(user_id, upserts, version)
+        
+        processed_count += len(batch)
+        if on_batch is not None:
+            on_batch(processed_count)
+        if not atomic:
+            db.session.commit()
+    
+    if sync:
+        deleted_ids = sorted(contact_id for contact_ids in unmatched.values() for contact_id in contact_ids)
+        for chunk in _batches(deleted_ids, batch_size):
+            if version is None or not atomic:
+                version = User.bump_contacts_version(user_id)
+            delete_contacts(user_id, chunk, version)
+            if not atomic:
+                db.session.commit()
+        counts['deleted_count'] = len(deleted_ids)
+    
+    db.session.commit()
+    return counts
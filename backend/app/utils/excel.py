@@ -1,166 +1,242 @@
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
 from io import BytesIO
 from collections import defaultdict
 
 
-def export_contacts_to_excel(contacts):
+# Column order and header names for contact methods
+METHOD_TYPE_ORDER = ['phone', 'email', 'address', 'social']
+METHOD_TYPE_NAMES = {
+    'phone': '电话',
+    'email': '邮箱',
+    'address': '地址',
+    'social': '社交媒体'
+}
+
+HEADER_STYLE_NAME = 'contact_header'
+
+
+def _header_style():
+    """Named style for the header row"""
+    side = Side(style='thin')
+    return NamedStyle(
+        name=HEADER_STYLE_NAME,
+        font=Font(bold=True, color="FFFFFF"),
+        fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+        alignment=Alignment(horizontal="center", vertical="center"),
+        border=Border(left=side, right=side, top=side, bottom=side)
+    )
+
+
+def build_headers(type_max_count):
+    """
+    Build the spreadsheet header row
+    
+    Args:
+        type_max_count: Dict mapping method type to the max count on one contact
+    
+    Returns:
+        (headers, method_columns) where method_columns holds the
+        (type, index) of each contact method column
+    """
+    headers = ['姓名', '是否收藏']
+    method_columns = []
+    
+    for method_type in METHOD_TYPE_ORDER:
+        count = type_max_count.get(method_type, 1) or 1  # At least one column per type
+        for i in range(count):
+            suffix = f"{i + 1}" if count > 1 else ""
+            headers.append(f"{METHOD_TYPE_NAMES.get(method_type, method_type)}{suffix}")
+            method_columns.append((method_type, i))
+    
+    return headers, method_columns
+
+
+def contact_to_row(contact, methods, method_columns):
+    """Convert a contact and its methods to a spreadsheet row"""
+    # Group methods by type
+    methods_by_type = defaultdict(list)
+    for method in methods:
+        methods_by_type[method.type].append(method.value)
+    
+    row = [contact.name, "是" if contact.is_favorite else "否"]
+    for method_type, index in method_columns:
+        values = methods_by_type.get(method_type, [])
+        row.append(values[index] if index < len(values) else "")
+    return row
+
+
+def write_contacts_to_excel(rows, type_max_count, output):
+    """
+    Write contacts to an Excel file in write-only mode
+    
+    Rows are written as they are produced, so memory does not grow with
+    the number of contacts. Only the header row is styled.
+    
+    Args:
+        rows: Iterable of (Contact, list of ContactMethod) tuples
+        type_max_count: Dict mapping method type to the max count on one contact
+        output: Writable binary file object
+    """
+    wb = Workbook(write_only=True)
+    wb.add_named_style(_header_style())
+    ws = wb.create_sheet("通讯录")
+    
+    headers, method_columns = build_headers(type_max_count)
+    
+    # Column widths must be set before any row is written
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+    
+    # Write headers
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.style = HEADER_STYLE_NAME
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    # Write data
+    for contact, methods in rows:
+        ws.append(contact_to_row(contact, methods, method_columns))
+    
+    wb.save(output)
+
+
+def export_contacts_to_excel(contacts, methods_map=None):
     """
     Export contacts to an Excel file
     
     Args:
         contacts: List of Contact objects
-        
+        methods_map: Optional dict of contact ID to preloaded ContactMethod list
+    
     Returns:
         BytesIO object containing the Excel file
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "通讯录"
-    
-    # Define styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    if methods_map is None:
+        methods_map = {contact.id: list(contact.methods) for contact in contacts}
     
     # Collect all contact method types and find max count per type
     type_max_count = defaultdict(int)
     for contact in contacts:
         type_count = defaultdict(int)
-        for method in contact.methods:
+        for method in methods_map.get(contact.id, []):
             type_count[method.type] += 1
         for method_type, count in type_count.items():
             type_max_count[method_type] = max(type_max_count[method_type], count)
     
-    # Define column order for contact methods
-    method_type_order = ['phone', 'email', 'address', 'social']
-    method_type_names = {
-        'phone': '电话',
-        'email': '邮箱',
-        'address': '地址',
-        'social': '社交媒体'
-    }
-    
-    # Create headers
-    headers = ['姓名', '是否收藏']
-    method_columns = []  # Track (type, index) for each column
-    
-    for method_type in method_type_order:
-        count = type_max_count.get(method_type, 1)
-        if count == 0:
-            count = 1  # At least one column per type
-        for i in range(count):
-            suffix = f"{i + 1}" if count > 1 else ""
-            headers.append(f"{method_type_names.get(method_type, method_type)}{suffix}")
-            method_columns.append((method_type, i))
-    
-    # Write headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-    
-    # Write data
-    for row, contact in enumerate(contacts, 2):
-        # Name
-        ws.cell(row=row, column=1, value=contact.name).border = thin_border
-        
-        # Is favorite
-        ws.cell(row=row, column=2, value="是" if contact.is_favorite else "否").border = thin_border
-        
-        # Group methods by type
-        methods_by_type = defaultdict(list)
-        for method in contact.methods:
-            methods_by_type[method.type].append(method.value)
-        
-        # Write methods
-        for col, (method_type, index) in enumerate(method_columns, 3):
-            values = methods_by_type.get(method_type, [])
-            value = values[index] if index < len(values) else ""
-            ws.cell(row=row, column=col, value=value).border = thin_border
-    
-    # Adjust column widths
-    for col in range(1, len(headers) + 1):
-        ws.column_dimensions[chr(64 + col) if col <= 26 else f"A{chr(64 + col - 26)}"].width = 15
-    
-    # Save to BytesIO
     output = BytesIO()
-    wb.save(output)
+    rows = ((contact, methods_map.get(contact.id, [])) for contact in contacts)
+    write_contacts_to_excel(rows, type_max_count, output)
     output.seek(0)
     
     return output
 
 
-def import_contacts_from_excel(file_stream):
+# Map header names to contact method types
+HEADER_TYPE_MAPPING = {
+    '电话': 'phone',
+    '邮箱': 'email',
+    '地址': 'address',
+    '社交媒体': 'social'
+}
+
+
+def _header_method_type(header):
+    """Determine the contact method type of a column from its header"""
+    if not header:
+        return None
+    header = str(header)
+    for cn_name, en_type in HEADER_TYPE_MAPPING.items():
+        if cn_name in header:
+            return en_type
+    return None
+
+
+def iter_contacts_from_rows(rows, sheet=None):
     """
-    Import contacts from an Excel file
+    Parse contacts from spreadsheet rows, the first row being the headers
     
     Args:
-        file_stream: File stream of the Excel file
-        
-    Returns:
-        List of dictionaries containing contact data
+        rows: Iterator of row value sequences
+        sheet: Sheet name stored on each contact, None to leave it out
+    
+    Yields:
+        Dictionaries containing contact data, row being the 1-based row number
     """
-    wb = load_workbook(file_stream)
-    ws = wb.active
-    
-    contacts = []
-    headers = []
-    
-    # Read headers from first row
-    for col in range(1, ws.max_column + 1):
-        header = ws.cell(row=1, column=col).value
-        headers.append(header if header else "")
-    
-    # Map headers to types
-    type_mapping = {
-        '电话': 'phone',
-        '邮箱': 'email',
-        '地址': 'address',
-        '社交媒体': 'social'
-    }
-    
-    # Parse each row
-    for row in range(2, ws.max_row + 1):
-        row_data = []
-        for col in range(1, ws.max_column + 1):
-            cell_value = ws.cell(row=row, column=col).value
-            row_data.append(cell_value if cell_value else "")
-        
+    # Read headers from first row and map them to types once
+    headers = next(rows, None)
+    if headers is None:
+        return
+    method_columns = [
+        (col, method_type)
+        for col, method_type in enumerate(map(_header_method_type, headers))
+        if col >= 2 and method_type
+    ]
+    
+    # Parse each row, the headers being row 1
+    for row_number, row_data in enumerate(rows, 2):
         # Skip empty rows
-        if not row_data[0]:
+        if not row_data or not row_data[0]:
             continue
         
+        is_favorite = row_data[1] if len(row_data) > 1 else None
         contact = {
             'name': str(row_data[0]).strip(),
-            'is_favorite': str(row_data[1]).strip() == "是" if len(row_data) > 1 else False,
-            'methods': []
+            'is_favorite': str(is_favorite).strip() == "是" if is_favorite else False,
+            'methods': [],
+            'row': row_number
         }
+        if sheet is not None:
+            contact['sheet'] = sheet
         
         # Parse contact methods
-        for col, header in enumerate(headers[2:], 2):
+        for col, method_type in method_columns:
             if col < len(row_data) and row_data[col]:
-                # Determine type from header
-                method_type = None
-                for cn_name, en_type in type_mapping.items():
-                    if header and cn_name in header:
-                        method_type = en_type
-                        break
-                
-                if method_type:
-                    contact['methods'].append({
-                        'type': method_type,
-                        'value': str(row_data[col]).strip()
-                    })
+                contact['methods'].append({
+                    'type': method_type,
+                    'value': str(row_data[col]).strip()
+                })
         
-        contacts.append(contact)
+        yield contact
+
+
+def iter_contacts_from_excel(file_stream, sheets='active'):
+    """
+    Stream contacts from an Excel file
+    
+    The workbook is opened in read-only mode and read row by row, so memory
+    stays flat regardless of the file size.
+    
+    Args:
+        file_stream: File stream of the Excel file
+        sheets: 'active' for the active sheet only, 'all' for every worksheet
+    
+    Yields:
+        Dictionaries containing contact data, with the sheet name when
+        several sheets are read
+    """
+    wb = load_workbook(file_stream, read_only=True)
+    try:
+        worksheets = wb.worksheets if sheets == 'all' else [wb.active]
+        for ws in worksheets:
+            sheet = ws.title if len(worksheets) > 1 else None
+            yield from iter_contacts_from_rows(ws.iter_rows(values_only=True), sheet)
+    finally:
+        wb.close()
+
+
+def import_contacts_from_excel(file_stream):
+    """
+    Import contacts from an Excel file
     
-    return contacts
+    Args:
+        file_stream: File stream of the Excel file
+    
+    Returns:
+        List of dictionaries containing contact data
+    """
+    return list(iter_contacts_from_excel(file_stream))
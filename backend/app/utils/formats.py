@@ -0,0 +1,127 @@
+import io
+import os
+from .csv_format import iter_contacts_to_csv, iter_contacts_from_csv
+from .excel import iter_contacts_from_excel
+from .parallel_excel import iter_contacts_from_excel_parallel
+from .ndjson import iter_contacts_to_ndjson, iter_contacts_from_ndjson
+from .vcard import iter_contacts_to_vcard, iter_contacts_from_vcard, VERSIONS as VCARD_VERSIONS
+
+# Export formats: format name -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+    'vcard': ('text/vcard; charset=utf-8', 'vcf')
+}
+
+# Import file extensions and the format they are parsed as
+IMPORT_EXTENSIONS = {
+    '.xlsx': 'xlsx',
+    '.xls': 'xlsx',
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.vcf': 'vcard'
+}
+
+IMPORT_FORMATS = sorted(set(IMPORT_EXTENSIONS.values()))
+
+# Sheets of an xlsx file imported: the active one, or every worksheet
+EXCEL_SHEETS = ['active', 'all']
+
+
+def detect_import_format(filename, requested=None):
+    """
+    Determine the format of an uploaded file
+    
+    Args:
+        filename: Uploaded file name
+        requested: Format given explicitly by the client, if any
+        
+    Returns:
+        Format name, or None if it is not supported
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in IMPORT_FORMATS else None
+    extension = os.path.splitext(filename or '')[1].lower()
+    return IMPORT_EXTENSIONS.get(extension)
+
+
+def iter_contacts_from_path(file_path, file_format, workers=1, sheets='active'):
+    """
+    Stream contacts from a file on disk in any supported import format
+    
+    The worker count only changes how the contacts are parsed: with more
+    than one worker and several sheets to import, xlsx sheets are parsed
+    in a process pool.
+    
+    Args:
+        file_path: Path of the file
+        file_format: One of IMPORT_FORMATS
+        workers: Number of processes parsing xlsx sheets
+        sheets: xlsx sheets to import, one of EXCEL_SHEETS
+        
+    Yields:
+        Dictionaries containing contact data
+    """
+    if file_format == 'xlsx' and workers > 1 and sheets == 'all':
+        yield from iter_contacts_from_excel_parallel(file_path, workers, sheets)
+        return
+    
+    with open(file_path, 'rb') as file_stream:
+        yield from iter_contacts_from_file(file_stream, file_format, sheets)
+
+
+def iter_contacts_from_file(file_stream, file_format, sheets='active'):
+    """
+    Stream contacts from a file in any supported import format
+    
+    Args:
+        file_stream: Binary file object
+        file_format: One of IMPORT_FORMATS
+        sheets: xlsx sheets to import, one of EXCEL_SHEETS
+        
+    Yields:
+        Dictionaries containing contact data
+    """
+    if file_format == 'xlsx':
+        yield from iter_contacts_from_excel(file_stream, sheets)
+        return
+    
+    # utf-8-sig drops the BOM written by Excel and our CSV export
+    text_stream = io.TextIOWrapper(file_stream, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'csv':
+            yield from iter_contacts_from_csv(text_stream)
+        elif file_format == 'ndjson':
+            yield from iter_contacts_from_ndjson(text_stream)
+        elif file_format == 'vcard':
+            yield from iter_contacts_from_vcard(text_stream)
+        else:
+            raise ValueError(f'不支持的导入格式: {file_format}')
+    finally:
+        # Leave the underlying stream open for the caller
+        text_stream.detach()
+
+
+def iter_export_chunks(file_format, rows, type_max_count, vcard_version='3.0'):
+    """
+    Encode contacts in a text export format
+    
+    Args:
+        file_format: csv, ndjson or vcard
+        rows: Iterable of (Contact, list of ContactMethod) tuples
+        type_max_count: Dict mapping method type to the max count on one contact
+        vcard_version: vCard version, one of VCARD_VERSIONS
+        
+    Returns:
+        Generator of text chunks
+    """
+    if file_format == 'csv':
+        return iter_contacts_to_csv(rows, type_max_count)
+    if file_format == 'ndjson':
+        return iter_contacts_to_ndjson(rows)
+    if file_format == 'vcard':
+        return iter_contacts_to_vcard(rows, vcard_version)
+    raise ValueError(f'不支持的导出格式: {file_format}')
@@ -0,0 +1,92 @@
+import json
+from io import StringIO
+
+# Flush the encoder buffer once it holds this many characters
+CHUNK_SIZE = 64 * 1024
+
+# String values of is_favorite read as true, other strings are false
+TRUE_STRINGS = {'true', '1', 'yes', '是'}
+
+
+def _parse_favorite(value):
+    """Read an is_favorite value, strings such as "false" or "否" are false"""
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_STRINGS
+    return bool(value)
+
+
+def contact_to_record(contact, methods):
+    """Convert a contact and its methods to a JSON-Lines record"""
+    return {
+        'name': contact.name,
+        'is_favorite': bool(contact.is_favorite),
+        'methods': [{'type': method.type, 'value': method.value} for method in methods]
+    }
+
+
+def iter_contacts_to_ndjson(rows):
+    """
+    Encode contacts as newline-delimited JSON, one contact per line
+    
+    Args:
+        rows: Iterable of (Contact, list of ContactMethod) tuples
+        
+    Yields:
+        Chunks of NDJSON text
+    """
+    buffer = StringIO()
+    for contact, methods in rows:
+        buffer.write(json.dumps(contact_to_record(contact, methods), ensure_ascii=False))
+        buffer.write('\n')
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+
+def iter_contacts_from_ndjson(text_stream):
+    """
+    Stream contacts from a newline-delimited JSON file
+    
+    Args:
+        text_stream: Text file object
+        
+    Yields:
+        Dictionaries containing contact data, row being the line number
+        
+    Raises:
+        ValueError: If a line is not a JSON object
+    """
+    for line_number, line in enumerate(text_stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f'第{line_number}行不是有效的JSON')
+        if not isinstance(record, dict):
+            raise ValueError(f'第{line_number}行不是JSON对象')
+        
+        name = str(record.get('name') or '').strip()
+        if not name:
+            continue
+        
+        methods = []
+        for method in record.get('methods') or []:
+            if not isinstance(method, dict):
+                continue
+            method_type = str(method.get('type') or '').strip()
+            method_value = str(method.get('value') or '').strip()
+            if method_type and method_value:
+                methods.append({'type': method_type, 'value': method_value})
+        
+        yield {
+            'name': name,
+            'is_favorite': _parse_favorite(record.get('is_favorite', False)),
+            'methods': methods,
+            'row': line_number
+        }
@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already queued"""
+
+
+@lru_cache(maxsize=8)
+def hash_prefix(method):
+    """
+    Method part of the hashes generate_password_hash writes for a method
+    
+    Expands shorthands such as 'scrypt' to 'scrypt:32768:8:1' so stored
+    hashes can be compared with the configured method.
+    """
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a small thread pool
+    
+    hashlib releases the GIL while hashing, so the pool size caps the CPU
+    spent on hashing per process. Calls beyond max_pending are rejected
+    instead of queued, so a burst of logins cannot tie up every request
+    thread of the server.
+    """
+    
+    def __init__(self, method, workers, max_pending):
+        self.method = method
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+    
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+    
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than the configured ones"""
+        return password_hash.split('$', 1)[0] != hash_prefix(self.method)
+
+
+def get_password_hasher():
+    """Get the app's password hasher, creating it on first use"""
+    app = current_app._get_current_object()
+    hasher = app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = PasswordHasher(
+            app.config['PASSWORD_HASH_METHOD'],
+            app.config['PASSWORD_HASH_WORKERS'],
+            app.config['PASSWORD_HASH_MAX_PENDING']
+        )
+        hasher = app.extensions.setdefault('password_hasher', hasher)
+    return hasher
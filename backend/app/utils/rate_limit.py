@@ -0,0 +1,50 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """
+    In-process token bucket rate limiter keyed by client IP, username, etc.
+    
+    Every key starts with capacity tokens and regains rate tokens per
+    second. At most max_keys buckets are kept, the least recently used
+    are dropped first, which only ever makes the limiter more lenient.
+    """
+    
+    def __init__(self, capacity, rate, max_keys=100000):
+        # A bucket that never refills would lock keys out for good
+        if capacity < 1:
+            raise ValueError(f'Rate limit capacity must be at least 1, got {capacity}')
+        if rate <= 0:
+            raise ValueError(f'Rate limit rate must be positive, got {rate}')
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def consume(self, *keys):
+        """
+        Take one token from the bucket of every key, or from none of them
+        
+        A call refused by one key does not use up the tokens of the others,
+        e.g. an attacker locked out of an account does not also drain the
+        bucket of the client IP it shares with the account's owner.
+        
+        Returns:
+            0 if the call is allowed, otherwise the seconds until every key has a token
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = {}
+            for key in keys:
+                tokens, updated_at = self._buckets.pop(key, (self.capacity, now))
+                buckets[key] = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            wait = max((math.ceil((1 - tokens) / self.rate) for tokens in buckets.values() if tokens < 1), default=0)
+            for key, tokens in buckets.items():
+                self._buckets[key] = (tokens if wait else tokens - 1, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
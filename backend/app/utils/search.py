@@ -0,0 +1,389 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+from sqlalchemy import bindparam, exists, false, func, literal, literal_column, select, union_all
+from ..models import db, Contact, ContactMethod, ContactSearchTerm
+
+# Longest n-gram stored in the index, queries longer than this are
+# matched on their n-grams of this length
+GRAM_SIZE = 3
+
+# Max number of query n-grams used to look up candidates
+MAX_QUERY_GRAMS = 8
+
+# Max number of ids per IN (...) clause
+BATCH_SIZE = 1000
+
+# Matches of a score tier ranked per search, the first ones by contact ID.
+# Bounds the work of a query matching most of the address book
+TIER_CANDIDATES = 200
+
+# Index rows counted per query n-gram to pick the rarest one
+GRAM_COUNT_LIMIT = 1000
+
+# Method values are indexed by the prefixes of their words for short queries
+WORD_SEPARATORS = re.compile(r'[\W_]+')
+
+NAME_PREFIX = ContactSearchTerm.NAME_PREFIX
+NAME = ContactSearchTerm.NAME
+VALUE = ContactSearchTerm.VALUE
+
+
+def normalize(text):
+    """Normalize text for indexing and searching"""
+    return ' '.join(str(text).lower().split()) if text else ''
+
+
+def _grams(text, sizes):
+    """N-grams of the given sizes of a normalized text, blank ones left out"""
+    grams = set()
+    for size in sizes:
+        for start in range(len(text) - size + 1):
+            gram = text[start:start + size]
+            if gram.strip():
+                grams.add(gram)
+    return grams
+
+
+def tokenize(name, values):
+    """
+    Split a contact into the terms stored in the index
+    
+    Names are short, all their 1, 2 and 3 character grams are kept so that
+    any part of a name is found, e.g. a single Chinese character. Method
+    values are long, only their 3-grams and the first 1 and 2 characters
+    of each word are kept, so short queries find values by word prefix.
+    
+    Args:
+        name: Contact name
+        values: Iterable of contact method values
+    
+    Returns:
+        Set of (term, field) tuples
+    """
+    name = normalize(name)
+    terms = {(name[:size], NAME_PREFIX) for size in range(1, min(len(name), GRAM_SIZE) + 1)}
+    terms |= {(gram, NAME) for gram in _grams(name, range(1, GRAM_SIZE + 1))}
+    for value in values:
+        value = normalize(value)
+        terms |= {(gram, VALUE) for gram in _grams(value, [GRAM_SIZE])}
+        for word in WORD_SEPARATORS.split(value):
+            terms |= {(word[:size], VALUE) for size in range(1, min(len(word), GRAM_SIZE - 1) + 1)}
+    return terms
+
+
+def query_grams(query):
+    """Return the n-grams a query must all match"""
+    query = normalize(query)
+    if len(query) <= GRAM_SIZE:
+        return [query] if query else []
+    grams = {query[start:start + GRAM_SIZE] for start in range(len(query) - GRAM_SIZE + 1)}
+    grams = [gram for gram in grams if gram.strip()]
+    return sorted(grams)[:MAX_QUERY_GRAMS]
+
+
+def index_contact(user_id, contact_id, name, values):
+    """
+    Replace the index entries of a contact
+    
+    Args:
+        user_id: Owner ID
+        contact_id: Contact ID
+        name: Contact name
+        values: Iterable of contact method values
+    """
+    remove_contact(contact_id)
+    index_contacts([(user_id, contact_id, name, values)])
+
+
+def index_contacts(documents):
+    """
+    Add index entries for new contacts in bulk
+    
+    Args:
+        documents: Iterable of (user_id, contact_id, name, values) tuples
+    """
+    rows = []
+    for user_id, contact_id, name, values in documents:
+        rows.extend(
+            {'user_id': user_id, 'contact_id': contact_id, 'term': term, 'field': field}
+            for term, field in tokenize(name, values)
+        )
+    
+    if rows:
+        db.session.execute(ContactSearchTerm.__table__.insert(), rows)
+
+
+def reindex_contact(contact):
+    """Rebuild the index entries of a contact from its current state"""
+    values = [method.value for method in contact.methods]
+    index_contact(contact.user_id, contact.id, contact.name, values)
+
+
+def reindex_contacts(contact_ids):
+    """Rebuild the index entries of many contacts from their current state"""
+    contact_ids = list(contact_ids)
+    for start in range(0, len(contact_ids), BATCH_SIZE):
+        chunk = contact_ids[start:start + BATCH_SIZE]
+        db.session.execute(
+            ContactSearchTerm.__table__.delete().where(ContactSearchTerm.contact_id.in_(chunk))
+        )
+        
+        values_map = defaultdict(list)
+        stmt = select(ContactMethod.contact_id, ContactMethod.value).where(ContactMethod.contact_id.in_(chunk))
+        for contact_id, value in db.session.execute(stmt):
+            values_map[contact_id].append(value)
+        
+        stmt = select(Contact.user_id, Contact.id, Contact.name).where(Contact.id.in_(chunk))
+        index_contacts(
+            (user_id, contact_id, name, values_map[contact_id])
+            for user_id, contact_id, name in db.session.execute(stmt)
+        )
+
+
+def remove_contact(contact_id):
+    """Remove the index entries of a contact"""
+    db.session.execute(
+        ContactSearchTerm.__table__.delete().where(ContactSearchTerm.contact_id == contact_id)
+    )
+
+
+def rebuild_index(user_id=None):
+    """
+    Rebuild the whole index, or the index of one user
+    
+    Returns:
+        Number of contacts indexed
+    """
+    contact_query = Contact.query
+    term_delete = ContactSearchTerm.__table__.delete()
+    if user_id is not None:
+        contact_query = contact_query.filter_by(user_id=user_id)
+        term_delete = term_delete.where(ContactSearchTerm.user_id == user_id)
+    db.session.execute(term_delete)
+    
+    contacts = contact_query.order_by(Contact.id).all()
+    methods_map = ContactMethod.group_by_contact([contact.id for contact in contacts])
+    index_contacts(
+        (contact.user_id, contact.id, contact.name, [method.value for method in methods_map.get(contact.id, [])])
+        for contact in contacts
+    )
+    return len(contacts)
+
+
+def _like_pattern(text, prefix=False):
+    """LIKE pattern matching text literally, as a prefix or anywhere"""
+    text = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{text}%' if prefix else f'%{text}%'
+
+
+def _gram_param(field, position):
+    """Name of the parameter binding an n-gram of a query in a field"""
+    return f'gram_{field}_{position}'
+
+
+@lru_cache(maxsize=None)
+def _gram_counts_statement(field, gram_count):
+    """
+    Select (position, rows) of each n-gram of a query in one field
+    
+    Rows are counted up to GRAM_COUNT_LIMIT. The statement is built once
+    per shape, the user and the n-grams are bound at execution.
+    """
+    terms = ContactSearchTerm.__table__
+    return union_all(*(
+        select(literal(position).label('position'), func.count().label('rows')).select_from(
+            select(terms.c.contact_id).where(
+                terms.c.user_id == bindparam('user_id'),
+                terms.c.term == bindparam(_gram_param(field, position)),
+                terms.c.field == field
+            ).limit(GRAM_COUNT_LIMIT).subquery()
+        )
+        for position in range(gram_count)
+    ))
+
+
+def _rarest_grams(user_id, query, field):
+    """
+    The n-grams of a query in one field of the index, rarest first
+    
+    Counting the rows of each n-gram up to GRAM_COUNT_LIMIT tells a rare
+    n-gram of a long query (the end of a phone number) from one shared by
+    most contacts (its "000") with one statement.
+    
+    Returns:
+        List of n-grams, empty if one of them is not in the field at all
+    """
+    grams = query_grams(query)
+    if len(grams) < 2:
+        return grams
+    
+    params = {_gram_param(field, position): gram for position, gram in enumerate(grams)}
+    rows = dict(db.session.execute(_gram_counts_statement(field, len(grams)), {'user_id': user_id, **params}).all())
+    if not all(rows.values()):
+        return []
+    return [gram for position, gram in sorted(enumerate(grams), key=lambda item: rows[item[0]])]
+
+
+@lru_cache(maxsize=None)
+def _field_matches_statement(field, gram_count, verify):
+    """
+    Select the contacts matching the n-grams of a query in one field of the index
+    
+    The index rows of the first n-gram are read in contact ID order and the
+    other ones are looked up per contact, so a LIMIT stops reading the
+    index early. Queries longer than GRAM_SIZE can match their n-grams out
+    of order, so with verify the stored text is checked against the bound
+    pattern too. The statement is built once per shape.
+    
+    Args:
+        field: ContactSearchTerm field
+        gram_count: Number of n-grams, the first one drives the lookup
+        verify: Check the stored text against the pattern parameter
+    
+    Returns:
+        Select of (contact_id, is_favorite, name)
+    """
+    terms = ContactSearchTerm.__table__
+    stmt = (
+        select(terms.c.contact_id, Contact.is_favorite, Contact.name)
+        .join(Contact, Contact.id == terms.c.contact_id)
+        .where(
+            terms.c.user_id == bindparam('user_id'),
+            terms.c.term == bindparam(_gram_param(field, 0)),
+            terms.c.field == field
+        )
+    )
+    if gram_count > 1:
+        # A contact has one row per term and field
+        other = terms.alias()
+        stmt = stmt.where(select(func.count()).where(
+            other.c.user_id == bindparam('user_id'),
+            other.c.term.in_([bindparam(_gram_param(field, position)) for position in range(1, gram_count)]),
+            other.c.field == field,
+            other.c.contact_id == terms.c.contact_id
+        ).scalar_subquery() == gram_count - 1)
+    
+    if verify:
+        name = func.lower(Contact.name)
+        if field == NAME_PREFIX:
+            stmt = stmt.where(name.like(bindparam('prefix_pattern'), escape='\\'))
+        elif field == NAME:
+            stmt = stmt.where(name.like(bindparam('pattern'), escape='\\'))
+        else:
+            methods = ContactMethod.__table__
+            stmt = stmt.where(exists().where(
+                methods.c.contact_id == terms.c.contact_id,
+                func.lower(methods.c.value).like(bindparam('pattern'), escape='\\')
+            ))
+    return stmt
+
+
+def _query_params(user_id, query, fields):
+    """
+    Look up the n-grams of a normalized query in the index
+    
+    Returns:
+        (shape, params) tuple, shape is a tuple of (field, gram_count) of
+        each field that can match the query, params binds the statements
+        of _field_matches_statement
+    """
+    params = {
+        'user_id': user_id,
+        'prefix_pattern': _like_pattern(query, prefix=True),
+        'pattern': _like_pattern(query)
+    }
+    shape = []
+    for field in fields:
+        if field == NAME_PREFIX:
+            grams = query_grams(query[:GRAM_SIZE])
+        else:
+            grams = _rarest_grams(user_id, query, field)
+        if grams:
+            shape.append((field, len(grams)))
+            params.update({_gram_param(field, position): gram for position, gram in enumerate(grams)})
+    return tuple(shape), params
+
+
+def matching_ids(user_id, query):
+    """
+    Select the IDs of the contacts matching a search, to filter other contact queries with
+    
+    Args:
+        user_id: Owner ID
+        query: Search string
+    """
+    query = normalize(query)
+    terms = ContactSearchTerm.__table__
+    if len(query) <= GRAM_SIZE:
+        return select(terms.c.contact_id).where(terms.c.user_id == user_id, terms.c.term == query)
+    
+    # Name prefixes are name matches too
+    shape, params = _query_params(user_id, query, (NAME, VALUE))
+    if not shape:
+        return select(terms.c.contact_id).where(false())
+    return union_all(*(
+        _field_matches_statement(field, gram_count, True).with_only_columns(terms.c.contact_id)
+        for field, gram_count in shape
+    )).params(params)
+
+
+@lru_cache(maxsize=None)
+def _search_statement(shape, verify, favorite_only, limited):
+    """
+    Rank the matches of each field of a query shape, see search_contacts
+    
+    The statement is built once per shape, the limits are bound as the
+    candidates and limit parameters.
+    """
+    tiers = []
+    for field, gram_count in shape:
+        stmt = _field_matches_statement(field, gram_count, verify)
+        if favorite_only:
+            stmt = stmt.where(Contact.is_favorite == True)  # noqa: E712
+        if limited:
+            stmt = stmt.order_by(ContactSearchTerm.__table__.c.contact_id).limit(bindparam('candidates'))
+        tier = stmt.subquery()
+        tiers.append(select(tier.c.contact_id, tier.c.is_favorite, tier.c.name, literal(field).label('field')))
+    
+    # A contact matching several tiers is ranked by its best one
+    matches = union_all(*tiers).subquery()
+    stmt = (
+        select(matches.c.contact_id, func.max(matches.c.field).label('score'))
+        .group_by(matches.c.contact_id, matches.c.is_favorite, matches.c.name)
+        .order_by(literal_column('score').desc(), matches.c.is_favorite.desc(), matches.c.name, matches.c.contact_id)
+    )
+    if limited:
+        stmt = stmt.limit(bindparam('limit'))
+    return stmt
+
+
+def search_contacts(user_id, query, favorite_only=False, limit=None):
+    """
+    Search contacts by name and method values
+    
+    Matches are ranked by score (name prefix 3 > name substring 2 >
+    method value 1), then favorites first, then by name. Each score tier
+    is read from the index in contact ID order and only its first
+    max(limit, TIER_CANDIDATES) contacts are ranked, so a short query
+    matching most of the address book reads a bounded number of rows.
+    The ranking is exact for tiers with fewer matches than that.
+    
+    Args:
+        user_id: Owner ID
+        query: Search string
+        favorite_only: Only return favorite contacts
+        limit: Max number of results, None for all
+    
+    Returns:
+        List of (score, contact_id) tuples, best match first
+    """
+    query = normalize(query)
+    shape, params = _query_params(user_id, query, (NAME_PREFIX, NAME, VALUE))
+    if not shape:
+        return []
+    
+    stmt = _search_statement(shape, len(query) > GRAM_SIZE, bool(favorite_only), limit is not None)
+    if limit is not None:
+        params.update(candidates=max(limit, TIER_CANDIDATES), limit=limit)
+    return [(score, contact_id) for contact_id, score in db.session.execute(stmt, params)]
@@ -0,0 +1,100 @@
+from ..models import Contact, ContactMethod
+from .dedupe import DuplicateIndex
+
+# Column lengths the values are checked against
+NAME_MAX_LENGTH = Contact.__table__.c.name.type.length
+VALUE_MAX_LENGTH = ContactMethod.__table__.c.value.type.length
+
+
+def _problem(row, level, field, message, sheet=None):
+    problem = {'type': 'problem', 'row': row, 'level': level, 'field': field, 'message': message}
+    # Rows of a workbook read sheet by sheet are numbered per sheet
+    if sheet is not None:
+        problem['sheet'] = sheet
+    return problem
+
+
+def validate_contacts(contacts_data, country_code, max_errors=0):
+    """
+    Check parsed contacts for problems an import would run into
+    
+    Nothing is read from or written to the database. Errors are rows that
+    cannot be imported as written: names or values longer than their
+    column, or unknown method types, which an import drops. Warnings are
+    rows duplicating an earlier row of the file. Contacts parsed from
+    several sheets carry their sheet name, which their problems include.
+    
+    Args:
+        contacts_data: Iterable of contact dicts as returned by the parsers
+        country_code: Country code of national phone numbers
+        max_errors: Stop after this many errors, 0 for no limit
+    
+    Yields:
+        Problem dicts as the rows are read, then one summary dict
+    """
+    index = DuplicateIndex(country_code)
+    # Contacts are filed by read order, row numbers restart on every sheet
+    locations = {}
+    summary = {'type': 'summary', 'rows': 0, 'valid_rows': 0, 'errors': 0, 'warnings': 0, 'truncated': False}
+    
+    contacts = iter(contacts_data)
+    while True:
+        try:
+            contact_data = next(contacts, None)
+        except Exception as e:
+            # The rest of the file cannot be read
+            summary['errors'] += 1
+            yield _problem(None, 'error', None, f'文件解析失败: {e}')
+            break
+        if contact_data is None:
+            break
+        
+        summary['rows'] += 1
+        row = contact_data.get('row', summary['rows'])
+        sheet = contact_data.get('sheet')
+        problems = []
+        
+        name = contact_data['name']
+        if len(name) > NAME_MAX_LENGTH:
+            problems.append(_problem(row, 'error', 'name', f'姓名超过{NAME_MAX_LENGTH}个字符', sheet))
+        
+        methods = []
+        for method_data in contact_data.get('methods', []):
+            method_type, value = method_data['type'], method_data['value']
+            if method_type not in ContactMethod.VALID_TYPES:
+                problems.append(_problem(
+                    row, 'error', 'methods',
+                    f'无效的联系方式类型: {method_type}，有效类型: {", ".join(ContactMethod.VALID_TYPES)}',
+                    sheet
+                ))
+                continue
+            if len(value) > VALUE_MAX_LENGTH:
+                problems.append(_problem(
+                    row, 'error', 'methods', f'联系方式超过{VALUE_MAX_LENGTH}个字符: {value[:20]}…', sheet
+                ))
+            methods.append((method_type, value))
+        
+        duplicate = index.find(name, methods)
+        if duplicate is None:
+            index.add(summary['rows'], name, methods)
+            locations[summary['rows']] = (sheet, row)
+        else:
+            duplicate_sheet, duplicate_row = locations[duplicate]
+            if duplicate_sheet == sheet:
+                message = f'与第{duplicate_row}行的联系人重复'
+            else:
+                message = f'与工作表{duplicate_sheet}第{duplicate_row}行的联系人重复'
+            problems.append(_problem(row, 'warning', None, message, sheet))
+        
+        errors = sum(1 for problem in problems if problem['level'] == 'error')
+        summary['errors'] += errors
+        summary['warnings'] += len(problems) - errors
+        if not errors:
+            summary['valid_rows'] += 1
+        yield from problems
+        
+        if max_errors and summary['errors'] >= max_errors:
+            summary['truncated'] = True
+            break
+    
+    yield summary
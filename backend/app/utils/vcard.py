@@ -0,0 +1,217 @@
+from io import StringIO
+
+# Supported vCard versions
+VERSIONS = ['3.0', '4.0']
+
+# Category marking a favorite contact
+FAVORITE_CATEGORY = 'favorite'
+
+# Max line length in octets before folding, per RFC 6350
+LINE_LENGTH = 75
+
+# Flush the encoder buffer once it holds this many characters
+CHUNK_SIZE = 64 * 1024
+
+# vCard properties read as each contact method type
+PROPERTY_TYPES = {
+    'TEL': 'phone',
+    'EMAIL': 'email',
+    'ADR': 'address',
+    'X-SOCIALPROFILE': 'social',
+    'IMPP': 'social'
+}
+
+
+def _escape(value):
+    """Escape a text value"""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace(',', '\\,')
+        .replace(';', '\\;')
+    )
+
+
+def _unescape(value):
+    """Unescape a text value"""
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '')
+            result.append('\n' if char in ('n', 'N') else char)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def _split_components(value):
+    """Split a structured value on unescaped semicolons"""
+    components = []
+    current = []
+    escaped = False
+    for char in value:
+        if escaped:
+            current.append('\\' + char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == ';':
+            components.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    components.append(''.join(current))
+    return [_unescape(component) for component in components]
+
+
+def _fold(line):
+    """Fold a content line at 75 octets without splitting UTF-8 characters"""
+    if len(line.encode('utf-8')) <= LINE_LENGTH:
+        return line + '\r\n'
+    
+    parts = []
+    current = ''
+    current_length = 0
+    limit = LINE_LENGTH
+    for char in line:
+        char_length = len(char.encode('utf-8'))
+        if current_length + char_length > limit:
+            parts.append(current)
+            current = ''
+            current_length = 0
+            limit = LINE_LENGTH - 1  # Continuation lines start with a space
+        current += char
+        current_length += char_length
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def contact_to_vcard(contact, methods, version='3.0'):
+    """
+    Convert a contact and its methods to a vCard
+    
+    Args:
+        contact: Contact object
+        methods: List of ContactMethod objects
+        version: vCard version, 3.0 or 4.0
+        
+    Returns:
+        vCard text
+    """
+    name = _escape(contact.name)
+    lines = ['BEGIN:VCARD', f'VERSION:{version}', f'FN:{name}', f'N:{name};;;;']
+    
+    for method in methods:
+        value = _escape(method.value)
+        if method.type == 'phone':
+            lines.append(f'TEL:{value}')
+        elif method.type == 'email':
+            lines.append(f'EMAIL:{value}')
+        elif method.type == 'address':
+            # Whole address goes in the street component
+            lines.append(f'ADR:;;{value};;;;')
+        elif method.type == 'social':
+            lines.append(f'X-SOCIALPROFILE:{value}')
+    
+    if contact.is_favorite:
+        lines.append(f'CATEGORIES:{FAVORITE_CATEGORY}')
+    lines.append('END:VCARD')
+    
+    return ''.join(_fold(line) for line in lines)
+
+
+def iter_contacts_to_vcard(rows, version='3.0'):
+    """
+    Encode contacts as a vCard file
+    
+    Args:
+        rows: Iterable of (Contact, list of ContactMethod) tuples
+        version: vCard version, 3.0 or 4.0
+        
+    Yields:
+        Chunks of vCard text
+    """
+    buffer = StringIO()
+    for contact, methods in rows:
+        buffer.write(contact_to_vcard(contact, methods, version))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+
+def _iter_unfolded_lines(text_stream):
+    """Read (line number, content line) tuples, joining folded continuation lines"""
+    current = None
+    start = 0
+    for line_number, line in enumerate(text_stream, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, line_number
+    if current is not None:
+        yield start, current
+
+
+def _parse_property(line):
+    """Split a content line into its upper-cased property name and raw value"""
+    name, separator, value = line.partition(':')
+    if not separator:
+        return None, None
+    # Drop parameters (TEL;TYPE=cell) and group prefixes (item1.EMAIL)
+    name = name.split(';', 1)[0].rsplit('.', 1)[-1].upper()
+    return name, value
+
+
+def iter_contacts_from_vcard(text_stream):
+    """
+    Stream contacts from a vCard 3.0 or 4.0 file
+    
+    Args:
+        text_stream: Text file object
+        
+    Yields:
+        Dictionaries containing contact data, row being the line of BEGIN:VCARD
+    """
+    contact = None
+    structured_name = ''
+    for line_number, line in _iter_unfolded_lines(text_stream):
+        name, value = _parse_property(line)
+        if name is None:
+            continue
+        
+        if name == 'BEGIN' and value.upper() == 'VCARD':
+            contact = {'name': '', 'is_favorite': False, 'methods': [], 'row': line_number}
+            structured_name = ''
+        elif contact is None:
+            continue
+        elif name == 'END' and value.upper() == 'VCARD':
+            if not contact['name']:
+                contact['name'] = structured_name
+            if contact['name']:
+                yield contact
+            contact = None
+        elif name == 'FN':
+            contact['name'] = _unescape(value).strip()
+        elif name == 'N':
+            # Family;Given;Additional;Prefix;Suffix
+            components = _split_components(value)
+            structured_name = ''.join(part.strip() for part in components[:2])
+        elif name == 'CATEGORIES':
+            categories = [category.strip().lower() for category in _split_components(value.replace(',', ';'))]
+            if FAVORITE_CATEGORY in categories:
+                contact['is_favorite'] = True
+        elif name in PROPERTY_TYPES:
+            if name == 'ADR':
+                method_value = ' '.join(part.strip() for part in _split_components(value) if part.strip())
+            else:
+                method_value = _unescape(value).strip()
+            if method_value:
+                contact['methods'].append({'type': PROPERTY_TYPES[name], 'value': method_value})
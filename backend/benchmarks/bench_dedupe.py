@@ -0,0 +1,116 @@
+"""
+Benchmark duplicate detection and deduplicating imports
+
+Seeds an address book where about DUPLICATE_RATE of the contacts
+duplicate another one, written differently (spaces and dashes in phone
+numbers, a +86 prefix, upper-case emails), then times loading the
+blocking index, grouping the duplicates, re-importing the same
+contacts in every duplicate mode, and syncing a copy with EDIT_RATE of
+the rows edited, which only writes the edited rows.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_dedupe [sizes...]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from app.models import db, User
+from app.utils.bulk_import import bulk_import_contacts
+from app.utils.dedupe import DuplicateIndex, dedupe_import_contacts
+
+DEFAULT_SIZES = [10000, 100000]
+DUPLICATE_RATE = 0.1
+EDIT_RATE = 0.01
+
+
+def generate_contacts(count):
+    """Parsed contact dicts, every 1 / DUPLICATE_RATE-th one a variant of the one before"""
+    step = round(1 / DUPLICATE_RATE)
+    for i in range(count):
+        n = i - 1 if i % step == step - 1 else i
+        phone = f'138{n:08d}'
+        if n != i:
+            yield {
+                'name': f'联系人 {n:06d}',
+                'is_favorite': False,
+                'methods': [
+                    {'type': 'phone', 'value': f'+86 {phone[:3]}-{phone[3:7]}-{phone[7:]}'},
+                    {'type': 'email', 'value': f'USER{n}@EXAMPLE.COM'}
+                ]
+            }
+        else:
+            yield {
+                'name': f'联系人{n:06d}',
+                'is_favorite': i % 10 == 0,
+                'methods': [
+                    {'type': 'phone', 'value': phone},
+                    {'type': 'email', 'value': f'user{n}@example.com'}
+                ]
+            }
+
+
+def edited(contacts, rate):
+    """Change the email of every 1 / rate-th contact"""
+    step = round(1 / rate)
+    for i, contact in enumerate(contacts):
+        if i % step == 0:
+            contact['methods'] = [*contact['methods'][:1], {'type': 'email', 'value': f'edited{i}@example.com'}]
+        yield contact
+
+
+def timed(func):
+    """Call func, returns (result, seconds)"""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run(sizes):
+    app = create_app('development')
+    results = []
+    with app.app_context():
+        db.create_all()
+        for size in sizes:
+            user = User(username=f'bench_dedupe_{size}_{time.time_ns()}', email=f'{time.time_ns()}@bench.local')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+            bulk_import_contacts(user.id, generate_contacts(size), batch_size=app.config['IMPORT_BATCH_SIZE'])
+            
+            index, load_seconds = timed(lambda: DuplicateIndex.load(user.id))
+            groups, group_seconds = timed(index.groups)
+            pairs = index.candidate_pairs()
+            result = {
+                'rows': size,
+                'groups': len(groups),
+                'candidate_pairs': pairs,
+                'all_pairs': size * (size - 1) // 2,
+                'load_seconds': round(load_seconds, 3),
+                'group_seconds': round(group_seconds, 3)
+            }
+            print(f'{size:>8} rows  load {load_seconds:7.3f}s  group {group_seconds:7.3f}s  '
+                  f'{len(groups)} groups  {pairs} candidate pairs of {result["all_pairs"]}')
+            
+            imports = [
+                ('skip', generate_contacts(size)),
+                ('merge', generate_contacts(size)),
+                ('upsert', generate_contacts(size)),
+                ('sync', generate_contacts(size)),
+                ('sync', edited(generate_contacts(size), EDIT_RATE))
+            ]
+            for number, (mode, contacts) in enumerate(imports):
+                counts, seconds = timed(lambda: dedupe_import_contacts(
+                    user.id, contacts, mode, batch_size=app.config['IMPORT_BATCH_SIZE']
+                ))
+                result[f'{number}_{mode}_seconds'] = round(seconds, 3)
+                print(f'{size:>8} rows  import on_duplicate={mode:<6} {seconds:8.3f}s  {size / seconds:10.0f} rows/s  {counts}')
+            results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+    run([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
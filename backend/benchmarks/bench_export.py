@@ -0,0 +1,74 @@
+"""
+Benchmark the streaming Excel export
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_export [sizes...]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from app.models import db, Contact, ContactMethod, User
+from app.utils.bulk_import import bulk_import_contacts
+from app.utils.excel import write_contacts_to_excel
+from benchmarks.bench_import import generate_contacts
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def export(user_id, chunk_size):
+    """Export the contacts of a user to a temporary file, returns its size"""
+    with tempfile.TemporaryFile() as output:
+        write_contacts_to_excel(
+            Contact.iter_with_methods(user_id, chunk_size),
+            ContactMethod.max_count_per_type(user_id),
+            output
+        )
+        return output.tell()
+
+
+def run(sizes):
+    app = create_app('development')
+    results = []
+    with app.app_context():
+        db.create_all()
+        for size in sizes:
+            user = User(username=f'bench_export_{size}_{time.time_ns()}', email=f'{time.time_ns()}@bench.local')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+            bulk_import_contacts(user.id, generate_contacts(size))
+            
+            chunk_size = app.config['EXPORT_CHUNK_SIZE']
+            start = time.perf_counter()
+            file_size = export(user.id, chunk_size)
+            elapsed = time.perf_counter() - start
+            
+            # Measure memory in a second run, tracemalloc slows down the export
+            tracemalloc.start()
+            export(user.id, chunk_size)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            
+            # ru_maxrss is in kilobytes on Linux
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            results.append({
+                'rows': size,
+                'seconds': round(elapsed, 3),
+                'rows_per_second': round(size / elapsed),
+                'peak_python_bytes': peak,
+                'max_rss_kb': max_rss,
+                'file_bytes': file_size
+            })
+            print(f'{size:>8} rows  {elapsed:8.3f}s  peak {peak / 1024 / 1024:7.1f} MB  max RSS {max_rss / 1024:7.1f} MB')
+    return results
+
+
+if __name__ == '__main__':
+    run([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
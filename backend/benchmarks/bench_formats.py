@@ -0,0 +1,75 @@
+"""
+Compare encode, decode and validation throughput of the import/export formats
+
+Runs in memory, no database needed.
+
+Usage:
+    python -m benchmarks.bench_formats [rows]
+"""
+import io
+import sys
+import time
+from types import SimpleNamespace
+
+from app.utils.excel import write_contacts_to_excel
+from app.utils.formats import iter_contacts_from_file, iter_export_chunks
+from app.utils.validation import validate_contacts
+
+DEFAULT_ROWS = 10000
+FORMATS = ['xlsx', 'csv', 'ndjson', 'vcard']
+
+
+def generate_rows(count):
+    """Generate (contact, methods) tuples shaped like Contact.iter_with_methods"""
+    for i in range(count):
+        contact = SimpleNamespace(name=f'联系人{i:06d}', is_favorite=i % 10 == 0)
+        methods = [
+            SimpleNamespace(type='phone', value=f'138{i:08d}'),
+            SimpleNamespace(type='email', value=f'user{i}@example.com'),
+            SimpleNamespace(type='address', value=f'福建省福州市大学城学园路{i}号')
+        ]
+        yield contact, methods
+
+
+def encode(file_format, count):
+    """Encode count contacts, returns the file content"""
+    type_max_count = {'phone': 1, 'email': 1, 'address': 1}
+    if file_format == 'xlsx':
+        output = io.BytesIO()
+        write_contacts_to_excel(generate_rows(count), type_max_count, output)
+        return output.getvalue()
+    return ''.join(iter_export_chunks(file_format, generate_rows(count), type_max_count)).encode('utf-8')
+
+
+def run(count):
+    results = []
+    for file_format in FORMATS:
+        start = time.perf_counter()
+        content = encode(file_format, count)
+        encode_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        decoded = sum(1 for _ in iter_contacts_from_file(io.BytesIO(content), file_format))
+        decode_seconds = time.perf_counter() - start
+        
+        # Decoding plus the checks of /api/import/validate
+        start = time.perf_counter()
+        report = list(validate_contacts(iter_contacts_from_file(io.BytesIO(content), file_format), '86'))
+        validate_seconds = time.perf_counter() - start
+        
+        results.append({
+            'format': file_format,
+            'rows': decoded,
+            'bytes': len(content),
+            'encode_rows_per_second': round(count / encode_seconds),
+            'decode_rows_per_second': round(decoded / decode_seconds),
+            'validate_rows_per_second': round(report[-1]['rows'] / validate_seconds)
+        })
+        print(f'{file_format:>7}  {len(content) / 1024:9.0f} KB  '
+              f'encode {count / encode_seconds:9.0f} rows/s  decode {decoded / decode_seconds:9.0f} rows/s  '
+              f'validate {report[-1]["rows"] / validate_seconds:9.0f} rows/s')
+    return results
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
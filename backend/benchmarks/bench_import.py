@@ -0,0 +1,54 @@
+"""
+Benchmark the bulk import path
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_import [sizes...]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from app.models import db, User
+from app.utils.bulk_import import bulk_import_contacts
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def generate_contacts(count):
+    """Generate parsed contact dicts like the Excel parser returns"""
+    for i in range(count):
+        yield {
+            'name': f'联系人{i:06d}',
+            'is_favorite': i % 10 == 0,
+            'methods': [
+                {'type': 'phone', 'value': f'138{i:08d}'},
+                {'type': 'email', 'value': f'user{i}@example.com'}
+            ]
+        }
+
+
+def run(sizes):
+    app = create_app('development')
+    results = []
+    with app.app_context():
+        db.create_all()
+        for size in sizes:
+            user = User(username=f'bench_import_{size}_{time.time_ns()}', email=f'{time.time_ns()}@bench.local')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+            
+            start = time.perf_counter()
+            imported = bulk_import_contacts(user.id, generate_contacts(size), batch_size=app.config['IMPORT_BATCH_SIZE'])
+            elapsed = time.perf_counter() - start
+            
+            results.append({'rows': imported, 'seconds': round(elapsed, 3), 'rows_per_second': round(imported / elapsed)})
+            print(f'{imported:>8} rows  {elapsed:8.3f}s  {imported / elapsed:10.0f} rows/s')
+    return results
+
+
+if __name__ == '__main__':
+    run([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
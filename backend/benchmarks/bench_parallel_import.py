@@ -0,0 +1,53 @@
+"""
+Measure how parsing a multi-sheet workbook scales with worker processes
+
+Usage:
+    python -m benchmarks.bench_parallel_import [sheets] [rows_per_sheet]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from openpyxl import Workbook
+
+from app.utils.parallel_excel import iter_contacts_from_excel_parallel
+
+DEFAULT_SHEETS = 8
+DEFAULT_ROWS_PER_SHEET = 25000
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def write_workbook(path, sheets, rows_per_sheet):
+    """Write a workbook with the Excel export layout on every sheet"""
+    wb = Workbook(write_only=True)
+    for sheet in range(sheets):
+        ws = wb.create_sheet(f'通讯录{sheet + 1}')
+        ws.append(['姓名', '是否收藏', '电话', '邮箱', '地址'])
+        for i in range(rows_per_sheet):
+            ws.append([f'联系人{sheet}-{i}', '否', f'138{i:08d}', f'user{i}@example.com', f'学园路{i}号'])
+    wb.save(path)
+
+
+def run(sheets, rows_per_sheet):
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    results = []
+    try:
+        write_workbook(path, sheets, rows_per_sheet)
+        baseline = None
+        for workers in WORKER_COUNTS:
+            start = time.perf_counter()
+            count = sum(1 for _ in iter_contacts_from_excel_parallel(path, workers, 'all'))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            results.append({'workers': workers, 'rows': count, 'seconds': round(elapsed, 3), 'speedup': round(baseline / elapsed, 2)})
+            print(f'{workers} workers  {count:>8} rows  {elapsed:8.3f}s  speedup {baseline / elapsed:5.2f}x')
+    finally:
+        os.remove(path)
+    return results
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*(args + [DEFAULT_SHEETS, DEFAULT_ROWS_PER_SHEET][len(args):]))
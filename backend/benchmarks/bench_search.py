@@ -0,0 +1,99 @@
+"""
+Benchmark contact search on large address books
+
+Imports N contacts with names drawn from common surnames and given
+names, then times typeahead queries of 1 to 4+ characters through the
+search endpoint's ranking query and the filtered count of the list.
+Short queries match most of the address book. Reports the import rate
+and the p50 and p95 of each query against TARGET_P95_MS.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_search [sizes...]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from app.models import db, User, Contact
+from app.utils import search as search_index
+from app.utils.bulk_import import bulk_import_contacts
+
+DEFAULT_SIZES = [100000]
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗'
+GIVEN_NAMES = ['伟', '芳', '娜', '敏', '静', '丽', '强', '磊', '军', '洋', '勇', '艳', '杰', '娟', '涛', '明', '超', '秀英', '霞', '平']
+QUERIES = ['张', '13', 'li', '张伟', '138', 'example', '13800012345', '陈秀英']
+REPEAT = 20
+LIMIT = 50
+TARGET_P95_MS = 10
+
+
+def generate_contacts(count):
+    """Parsed contact dicts with Chinese names, a phone and an email each"""
+    for i in range(count):
+        yield {
+            'name': f'{SURNAMES[i % len(SURNAMES)]}{GIVEN_NAMES[i // len(SURNAMES) % len(GIVEN_NAMES)]}{i // 400 or ""}',
+            'is_favorite': i % 10 == 0,
+            'methods': [
+                {'type': 'phone', 'value': f'138{i:08d}'},
+                {'type': 'email', 'value': f'li{i}@example.com'}
+            ]
+        }
+
+
+def timed(func):
+    """REPEAT calls of func after a warm-up one, returns (result, p50 milliseconds, p95 milliseconds)"""
+    func()
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return result, timings[len(timings) // 2], timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def run(sizes):
+    app = create_app('development')
+    results = []
+    with app.app_context():
+        db.create_all()
+        for size in sizes:
+            user = User(username=f'bench_search_{size}_{time.time_ns()}', email=f'{time.time_ns()}@bench.local')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+            start = time.perf_counter()
+            bulk_import_contacts(user.id, generate_contacts(size), batch_size=app.config['IMPORT_BATCH_SIZE'])
+            rows_per_second = size / (time.perf_counter() - start)
+            print(f'{size:>8} rows  import {rows_per_second:8.0f} rows/s')
+            
+            for query in QUERIES:
+                matches, search_p50, search_p95 = timed(
+                    lambda: search_index.search_contacts(user.id, query, limit=LIMIT)
+                )
+                total, count_p50, count_p95 = timed(lambda: Contact.query.filter(
+                    Contact.user_id == user.id,
+                    Contact.id.in_(search_index.matching_ids(user.id, query))
+                ).count())
+                results.append({
+                    'rows': size,
+                    'query': query,
+                    'matches': total,
+                    'import_rows_per_second': round(rows_per_second),
+                    'search_p50_ms': round(search_p50, 2),
+                    'search_p95_ms': round(search_p95, 2),
+                    'count_p50_ms': round(count_p50, 2),
+                    'count_p95_ms': round(count_p95, 2),
+                    'meets_target': search_p95 < TARGET_P95_MS
+                })
+                print(f'{size:>8} rows  q={query:<12} {total:>8} matches  top {len(matches):>3}  '
+                      f'p50 {search_p50:8.2f}ms  p95 {search_p95:8.2f}ms '
+                      f'{"ok" if search_p95 < TARGET_P95_MS else "MISS":>4}  count p95 {count_p95:8.2f}ms')
+    return results
+
+
+if __name__ == '__main__':
+    run([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
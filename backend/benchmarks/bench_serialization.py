@@ -0,0 +1,72 @@
+"""
+Compare ORM to_dict + stdlib JSON with row serialization + orjson
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_serialization [sizes...]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from app.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+from app.models import db, Contact, User
+from app.utils.bulk_import import bulk_import_contacts
+from benchmarks.bench_import import generate_contacts
+
+DEFAULT_SIZES = [1000, 10000]
+RUNS = 3
+
+
+def orm_path(app, user_id):
+    contacts = Contact.query.filter_by(user_id=user_id).order_by(Contact.is_favorite.desc(), Contact.name, Contact.id).all()
+    data = Contact.serialize_many(contacts)
+    body = StdlibJSONProvider(app).dumps({'contacts': data, 'total': len(data)})
+    db.session.expunge_all()
+    return body
+
+
+def row_path(app, user_id, provider_class):
+    query = Contact.query.filter_by(user_id=user_id).order_by(Contact.is_favorite.desc(), Contact.name, Contact.id)
+    data = Contact.serialize_rows(Contact.select_rows(query).all())
+    return provider_class(app).dumps({'contacts': data, 'total': len(data)})
+
+
+def best_of(func):
+    """Fastest of RUNS calls in seconds"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes):
+    app = create_app('production')
+    paths = [('orm + json', lambda user_id: orm_path(app, user_id))]
+    paths.append(('rows + json', lambda user_id: row_path(app, user_id, StdlibJSONProvider)))
+    if orjson is not None:
+        paths.append(('rows + orjson', lambda user_id: row_path(app, user_id, OrjsonProvider)))
+    
+    results = []
+    with app.app_context():
+        db.create_all()
+        for size in sizes:
+            user = User(username=f'bench_json_{size}_{time.time_ns()}', email=f'{time.time_ns()}@bench.local')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+            bulk_import_contacts(user.id, generate_contacts(size))
+            
+            for name, func in paths:
+                seconds = best_of(lambda: func(user.id))
+                results.append({'rows': size, 'path': name, 'seconds': round(seconds, 4)})
+                print(f'{size:>8} rows  {name:<14} {seconds * 1000:9.1f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    run([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,144 @@
+"""
+Benchmark app startup and requests/sec of the contact list under gunicorn
+
+Usage:
+    python -m benchmarks.bench_serving [workers...]
+
+Uses a temporary SQLite file unless DATABASE_URL is set, the database has
+to be shared by the gunicorn workers.
+"""
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_database_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(_database_dir, "bench.db")}')
+
+from app import create_app
+from app.models import db, User
+from app.utils.bulk_import import bulk_import_contacts
+from benchmarks.bench_import import generate_contacts
+
+DEFAULT_WORKERS = [1, 2, 4]
+CONTACTS = 1000
+CLIENTS = 8
+DURATION = 5  # seconds per worker count
+STARTUP_RUNS = 5
+PATH = '/api/contacts?limit=50'
+
+
+def measure_startup(config_name):
+    """Median seconds spent in create_app over STARTUP_RUNS runs"""
+    timings = []
+    for _ in range(STARTUP_RUNS):
+        start = time.perf_counter()
+        create_app(config_name)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def seed():
+    """Create the schema and a user with CONTACTS contacts, returns the credentials"""
+    app = create_app('development')
+    with app.app_context():
+        username = f'bench_serving_{time.time_ns()}'
+        user = User(username=username, email=f'{username}@bench.local')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.commit()
+        bulk_import_contacts(user.id, generate_contacts(CONTACTS))
+    return {'username': username, 'password': 'benchmark'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+
+def login(port, credentials):
+    """Log in and return the session cookie"""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/api/auth/login', json.dumps(credentials), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def client(port, cookie, deadline):
+    """Send requests over a keep-alive connection until the deadline"""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    count = 0
+    while time.time() < deadline:
+        try:
+            connection.request('GET', PATH, headers={'Cookie': cookie})
+            response = connection.getresponse()
+            response.read()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # Workers close keep-alive connections when they are recycled
+            connection.close()
+            continue
+        if response.status != 200:
+            raise RuntimeError(f'{PATH} returned {response.status}')
+        count += 1
+    return count
+
+
+def measure_throughput(workers, credentials):
+    """Requests/sec on the contact list with the given gunicorn worker count"""
+    port = free_port()
+    env = dict(os.environ, WEB_BIND=f'127.0.0.1:{port}', WEB_WORKERS=str(workers), WEB_ACCESS_LOG='')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env=env)
+    try:
+        wait_for_server(port)
+        cookie = login(port, credentials)
+        deadline = time.time() + DURATION
+        with ThreadPoolExecutor(CLIENTS) as executor:
+            counts = list(executor.map(lambda _: client(port, cookie, deadline), range(CLIENTS)))
+        return sum(counts) / DURATION
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(worker_counts):
+    credentials = seed()
+    results = {
+        'startup_seconds': {
+            'auto_migrate': round(measure_startup('development'), 4),
+            'production': round(measure_startup('production'), 4)
+        },
+        'requests_per_second': {}
+    }
+    print(f"create_app with schema sync {results['startup_seconds']['auto_migrate'] * 1000:8.1f} ms")
+    print(f"create_app without          {results['startup_seconds']['production'] * 1000:8.1f} ms")
+    
+    for workers in worker_counts:
+        rps = measure_throughput(workers, credentials)
+        results['requests_per_second'][workers] = round(rps)
+        print(f'{workers:>3} workers  {rps:10.0f} req/s  GET {PATH}')
+    return results
+
+
+if __name__ == '__main__':
+    run([int(workers) for workers in sys.argv[1:]] or DEFAULT_WORKERS)
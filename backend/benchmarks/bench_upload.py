@@ -0,0 +1,84 @@
+"""
+Benchmark chunked uploads followed by the background import
+
+Writes a CSV file of N contacts, uploads it through /api/uploads in
+parts read from disk one at a time, completes the upload and waits for
+the import job.
+
+Usage:
+    python -m benchmarks.bench_upload [contacts] [part size in MB]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from benchmarks.bench_api import csv_file
+
+DEFAULT_CONTACTS = 20000
+DEFAULT_PART_MB = 8
+PASSWORD = 'benchmark'
+
+
+def run(contacts, part_size):
+    app = create_app('development')
+    app.config['MAX_CONTENT_LENGTH'] = part_size
+    client = app.test_client()
+    username = f'bench_upload_{time.time_ns()}'
+    client.post('/api/auth/register', json={'username': username, 'email': f'{username}@bench.local', 'password': PASSWORD})
+    
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as source:
+        source.write(csv_file(contacts))
+        path = source.name
+    try:
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        upload = client.post('/api/uploads', json={'filename': 'contacts.csv', 'size': size}).get_json()['upload']
+        
+        parts = 0
+        with open(path, 'rb') as source:
+            while True:
+                part = source.read(part_size)
+                if not part:
+                    break
+                response = client.put(f"/api/uploads/{upload['id']}?offset={upload['offset']}", data=part)
+                if response.status_code != 200:
+                    raise RuntimeError(f'Part upload failed: {response.get_json()}')
+                upload = response.get_json()['upload']
+                parts += 1
+        upload_seconds = time.perf_counter() - start
+        
+        job = client.post(f"/api/uploads/{upload['id']}/complete").get_json()['job']
+        while job['status'] in ('pending', 'running'):
+            time.sleep(0.1)
+            job = client.get(f"/api/jobs/{job['id']}").get_json()['job']
+        total_seconds = time.perf_counter() - start
+    finally:
+        os.remove(path)
+    
+    if job['status'] != 'succeeded':
+        raise RuntimeError(f"Import job failed: {job['error']}")
+    
+    result = {
+        'contacts': contacts,
+        'bytes': size,
+        'parts': parts,
+        'upload_seconds': round(upload_seconds, 3),
+        'upload_mb_per_second': round(size / 1024 / 1024 / upload_seconds, 1),
+        'total_seconds': round(total_seconds, 3),
+        'imported_count': job['result']['imported_count']
+    }
+    print(f"{size / 1024 / 1024:8.1f} MB in {parts} parts  upload {upload_seconds:7.3f}s "
+          f"({result['upload_mb_per_second']} MB/s)  upload + import {total_seconds:7.3f}s  "
+          f"{result['imported_count']} contacts")
+    return result
+
+
+if __name__ == '__main__':
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CONTACTS,
+        int(float(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PART_MB) * 1024 * 1024)
+    )
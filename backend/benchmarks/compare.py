@@ -0,0 +1,56 @@
+"""
+Compare two benchmark result files from benchmarks.bench_api
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+
+Exits with status 1 if any scenario's p50 or p95 got slower by more
+than the threshold.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ['p50_ms', 'p95_ms']
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    return report, {(row['size'], row['scenario']): row for row in report['results']}
+
+
+def compare(baseline_path, candidate_path, threshold):
+    """Print the change of every shared scenario, returns the regressions"""
+    baseline, baseline_rows = load(baseline_path)
+    candidate, candidate_rows = load(candidate_path)
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    
+    regressions = []
+    for key in sorted(baseline_rows.keys() & candidate_rows.keys()):
+        old, new = baseline_rows[key], candidate_rows[key]
+        changes = []
+        for metric in METRICS:
+            ratio = new[metric] / old[metric] - 1 if old[metric] else 0.0
+            changes.append(f'{metric} {old[metric]:9.2f} -> {new[metric]:9.2f} ({ratio:+6.1%})')
+            if ratio > threshold:
+                regressions.append((key, metric, ratio))
+        print(f'{key[0]:>7} {key[1]:<16} ' + '  '.join(changes))
+    
+    for (size, scenario), metric, ratio in regressions:
+        print(f'REGRESSION {scenario} at {size} contacts: {metric} {ratio:+.1%}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two bench_api result files')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown, 0.1 is 10%%')
+    args = parser.parse_args()
+    if compare(args.baseline, args.candidate, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
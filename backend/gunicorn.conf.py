@@ -0,0 +1,47 @@
+"""Gunicorn settings, every value can be overridden from the environment"""
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND') or '0.0.0.0:5001'
+
+# Each worker keeps its own SQLAlchemy pool, so workers * DB_POOL_SIZE
+# must stay below the database's max_connections
+workers = int(os.environ.get('WEB_WORKERS') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('WEB_THREADS') or 4)
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT') or 120)  # long imports and exports
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth, workers running
+# background jobs wait until the jobs are done (see pre_request)
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS') or 1000)
+max_requests_jitter = max_requests // 10
+
+# Load the app once in the master and fork it into the workers
+preload_app = True
+
+# Set WEB_ACCESS_LOG to an empty value to turn the access log off
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """
+    Drop connections inherited from the master, each worker opens its own
+    
+    Then fail the background jobs of workers that exited, e.g. recycled ones.
+    """
+    from app.models import db
+    from app.jobs import recover_jobs
+    app = worker.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    recover_jobs(app)
+
+
+def pre_request(worker, req):
+    """Put off max_requests recycling while the worker runs background jobs, they would be lost"""
+    from app.jobs import active_job_count
+    if worker.nr + 1 >= worker.max_requests and active_job_count(worker.app.wsgi()):
+        worker.nr = worker.max_requests - 2
@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from app.models import db
+
+PASSWORD = 'password'
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh in-memory SQLite database, uploads go to a temporary folder"""
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as a newly registered user"""
+    client = app.test_client()
+    register(client, 'alice')
+    return client
+
+
+def register(client, username):
+    """Register a user, which also logs the client in"""
+    response = client.post('/api/auth/register', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': PASSWORD
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['user']
+
+
+def create_contacts(client, count, methods=2, favorite_every=0):
+    """Create contacts through the batch endpoint, returns their IDs"""
+    ops = [
+        {
+            'op': 'create',
+            'name': f'Contact {i:05d}',
+            'is_favorite': bool(favorite_every) and i % favorite_every == 0,
+            'methods': [
+                {'type': 'phone', 'value': f'138{i:04d}{j:04d}'} if j % 2 == 0
+                else {'type': 'email', 'value': f'contact{i}.{j}@example.com'}
+                for j in range(methods)
+            ]
+        }
+        for i in range(count)
+    ]
+    ids = []
+    for start in range(0, len(ops), 500):
+        response = client.post('/api/contacts/batch', json={'operations': ops[start:start + 500]})
+        assert response.status_code == 200, response.get_json()
+        ids.extend(result['id'] for result in response.get_json()['results'])
+    return ids
+
+
+@contextmanager
+def capture_queries(engine):
+    """Collect the SQL statements run on an engine inside the block"""
+    statements = []
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
@@ -0,0 +1,72 @@
+import pytest
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import config
+from app import create_app
+from app.models import db
+from app.utils.rate_limit import TokenBucketLimiter
+from conftest import PASSWORD, register
+
+
+def _login(client, username, password=PASSWORD, ip='203.0.113.1'):
+    return client.post('/api/auth/login', json={'username': username, 'password': password},
+                       headers={'X-Forwarded-For': ip})
+
+
+def test_refused_call_does_not_use_the_other_buckets():
+    limiter = TokenBucketLimiter(capacity=1, rate=1 / 60)
+    assert limiter.consume('ip:a', 'user:alice') == 0
+    
+    assert limiter.consume('ip:b', 'user:alice') > 0
+    
+    # ip:b kept its token although the call was refused by user:alice
+    assert limiter.consume('ip:b', 'user:bob') == 0
+
+
+@pytest.fixture
+def proxied_app(tmp_path, monkeypatch):
+    """App behind one trusted proxy with a login burst of 2"""
+    monkeypatch.setattr(config.TestingConfig, 'TRUSTED_PROXY_HOPS', 1)
+    monkeypatch.setattr(config.TestingConfig, 'LOGIN_RATE_LIMIT_BURST', 2)
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_login_limit_is_per_forwarded_client_ip(proxied_app):
+    client = proxied_app.test_client()
+    register(client, 'alice')
+    register(client, 'bobby')
+    
+    assert _login(client, 'alice', 'wrong').status_code == 401
+    assert _login(client, 'bobby', 'wrong').status_code == 401
+    refused = _login(client, 'carol', 'wrong')
+    
+    assert refused.status_code == 429
+    assert int(refused.headers['Retry-After']) > 0
+    # Another client behind the same proxy is not throttled
+    assert _login(client, 'alice', ip='198.51.100.7').status_code == 200
+
+
+def test_proxy_fix_keeps_the_flask_app_for_gunicorn_hooks(proxied_app):
+    # gunicorn.conf.py uses worker.app.wsgi() as the Flask app
+    assert isinstance(proxied_app, Flask)
+    assert isinstance(proxied_app.wsgi_app, ProxyFix)
+
+
+@pytest.mark.parametrize('capacity, rate', [(1, 0), (1, -1), (0, 1)])
+def test_limiter_rejects_settings_that_never_refill(capacity, rate):
+    with pytest.raises(ValueError):
+        TokenBucketLimiter(capacity=capacity, rate=rate)
+
+
+def test_invalid_login_rate_limit_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(config.TestingConfig, 'LOGIN_RATE_LIMIT_PER_MINUTE', 0)
+    
+    with pytest.raises(ValueError):
+        create_app('testing')
@@ -0,0 +1,37 @@
+import pytest
+
+from conftest import create_contacts
+
+
+def _batch(client, *operations):
+    return client.post('/api/contacts/batch', json={'operations': list(operations)})
+
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'create', 'name': 'Bad', 'methods': ['x']},
+    {'op': 'create', 'name': 'Bad', 'methods': 'phone'},
+    {'op': 'favorite', 'id': True},
+    {'op': 'add_method', 'contact_id': True, 'type': 'email', 'value': 'a@example.com'}
+])
+def test_malformed_operation_is_rejected(client, operation):
+    create_contacts(client, 1)
+    
+    response = _batch(client, operation)
+    
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['index'] == 0
+
+
+def test_contact_updated_twice_in_one_batch_is_rejected(client):
+    contact_id, = create_contacts(client, 1)
+    
+    response = _batch(
+        client,
+        {'op': 'favorite', 'id': contact_id},
+        {'op': 'favorite', 'id': contact_id}
+    )
+    
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [1]
+    contact = client.get(f'/api/contacts/{contact_id}').get_json()['contact']
+    assert contact['is_favorite'] is False
@@ -0,0 +1,31 @@
+import pytest
+
+from app.models import db, Contact, ContactMethod
+from app.utils import bulk_import
+
+
+def _contacts(count):
+    return [
+        {'name': f'Contact {i}', 'methods': [{'type': 'phone', 'value': f'1380000{i:04d}'}]}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize('returning', [True, False])
+def test_insert_contacts_returns_ids_in_row_order(app, client, monkeypatch, returning):
+    with app.app_context():
+        dialect = db.engine.dialect
+        if not returning:
+            # Take the batch token path used on MySQL with innodb_autoinc_lock_mode=2
+            monkeypatch.setattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False)
+        user_id = client.get('/api/auth/me').get_json()['user']['id']
+        
+        ids = bulk_import.insert_contacts(user_id, _contacts(25), version=1, consecutive_ids=False)
+        db.session.commit()
+        
+        names = dict(db.session.query(Contact.id, Contact.name).filter(Contact.id.in_(ids)))
+        phones = dict(db.session.query(ContactMethod.contact_id, ContactMethod.value).filter(ContactMethod.contact_id.in_(ids)))
+        tokens = {token for token, in db.session.query(Contact.import_token).filter(Contact.id.in_(ids))}
+    assert [names[contact_id] for contact_id in ids] == [f'Contact {i}' for i in range(25)]
+    assert [phones[contact_id] for contact_id in ids] == [f'1380000{i:04d}' for i in range(25)]
+    assert (tokens == {None}) == returning
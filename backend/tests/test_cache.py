@@ -0,0 +1,46 @@
+import threading
+
+from app.cache import ContactCache, LRUCache, UserCache
+
+THREADS = 8
+LOOKUPS = 5000
+
+
+def _run_threads(target):
+    threads = [threading.Thread(target=target) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_contact_cache_counts_every_lookup_across_threads():
+    cache = ContactCache(LRUCache())
+    cache.set(1, 1, 'hit', b'{}')
+    
+    def lookups():
+        for i in range(LOOKUPS):
+            cache.get(1, 1, 'hit' if i % 2 else 'miss')
+    
+    _run_threads(lookups)
+    
+    stats = cache.stats()
+    assert stats['hits'] == stats['misses'] == THREADS * LOOKUPS // 2
+    assert stats['hit_rate'] == 0.5
+
+
+def test_user_cache_counts_every_lookup_across_threads():
+    cache = UserCache()
+    cache.set(1, {'id': 1})
+    
+    def lookups():
+        for i in range(LOOKUPS):
+            cache.get(1 if i % 2 else 2)
+            cache.record_memo_hit()
+    
+    _run_threads(lookups)
+    
+    stats = cache.stats()
+    assert stats['hits'] == stats['misses'] == THREADS * LOOKUPS // 2
+    assert stats['memo_hits'] == THREADS * LOOKUPS
+    assert stats['queries_saved'] == stats['hits'] + stats['memo_hits']
@@ -0,0 +1,124 @@
+import pytest
+
+from app.models import db
+from conftest import capture_queries, create_contacts
+
+
+def _count_list_queries(app, client, query_string):
+    with app.app_context():
+        engine = db.engine
+    with capture_queries(engine) as statements:
+        response = client.get(f'/api/contacts{query_string}')
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+@pytest.mark.parametrize('query_string', ['', '?limit=100', '?fields=name,methods', '?search=contact'])
+def test_list_query_count_does_not_grow_with_contacts(app, client, query_string):
+    create_contacts(client, 1)
+    one_count, one = _count_list_queries(app, client, query_string)
+    
+    create_contacts(client, 49)
+    many_count, many = _count_list_queries(app, client, query_string)
+    
+    assert len(one['contacts']) == 1
+    assert len(many['contacts']) == 50
+    assert all(len(contact['methods']) == 2 for contact in many['contacts'])
+    assert many_count == one_count
+
+
+def _create_named(client, names_and_favorites):
+    response = client.post('/api/contacts/batch', json={'operations': [
+        {'op': 'create', 'name': name, 'is_favorite': is_favorite, 'methods': [{'type': 'phone', 'value': '13800000000'}]}
+        for name, is_favorite in names_and_favorites
+    ]})
+    assert response.status_code == 200, response.get_json()
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def _walk_pages(client, limit, query_string=''):
+    """Follow next_cursor from the first page, returns the contacts of all pages"""
+    contacts = []
+    cursor = None
+    while True:
+        params = f'?limit={limit}{query_string}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(f'/api/contacts{params}')
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        assert len(page['contacts']) <= limit
+        contacts.extend(page['contacts'])
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            return contacts
+        cursor = page['next_cursor']
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 5])
+def test_pages_join_to_the_full_ordered_list(client, limit):
+    # Duplicate names on both sides of the favorite boundary, created out of order
+    _create_named(client, [
+        ('Bob', False), ('Amy', True), ('Bob', True), ('Amy', False), ('Bob', False),
+        ('Cat', True), ('Amy', False), ('Bob', True), ('Amy', True), ('Zoe', False), ('Bob', False)
+    ])
+    full = client.get('/api/contacts').get_json()['contacts']
+    
+    pages = _walk_pages(client, limit)
+    
+    assert [contact['id'] for contact in pages] == [contact['id'] for contact in full]
+    assert len({contact['id'] for contact in pages}) == len(full) == 11
+    keys = [(not contact['is_favorite'], contact['name'], contact['id']) for contact in pages]
+    assert keys == sorted(keys)
+
+
+def test_pages_of_favorites_only_join_to_the_favorite_list(client):
+    _create_named(client, [('Bob', True), ('Amy', False), ('Bob', True), ('Amy', True), ('Bob', False)])
+    full = client.get('/api/contacts?favorite=true').get_json()['contacts']
+    
+    pages = _walk_pages(client, 1, '&favorite=true')
+    
+    assert [contact['id'] for contact in pages] == [contact['id'] for contact in full]
+    assert all(contact['is_favorite'] for contact in pages)
+    assert len(pages) == 3
+
+
+@pytest.mark.parametrize('query_string', ['?cursor=not-a-cursor', '?limit=0', '?limit=501', '?limit=abc'])
+def test_invalid_page_parameters_are_rejected(client, query_string):
+    response = client.get(f'/api/contacts{query_string}')
+    
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ('name', {'id', 'name'}),
+    ('name,is_favorite', {'id', 'name', 'is_favorite'}),
+    ('id,methods', {'id', 'methods'}),
+    (' name , updated_at ', {'id', 'name', 'updated_at'})
+])
+def test_fields_projection_returns_only_the_requested_fields(client, fields, expected):
+    create_contacts(client, 3, favorite_every=2)
+    
+    for query_string in ('', '&limit=2'):
+        response = client.get(f'/api/contacts?fields={fields}{query_string}')
+        
+        assert response.status_code == 200
+        assert all(set(contact) == expected for contact in response.get_json()['contacts'])
+
+
+def test_fields_projection_keeps_pagination_working(client):
+    create_contacts(client, 5, favorite_every=2)
+    full = client.get('/api/contacts').get_json()['contacts']
+    
+    pages = _walk_pages(client, 2, '&fields=id')
+    
+    assert pages == [{'id': contact['id']} for contact in full]
+
+
+@pytest.mark.parametrize('fields', ['nickname', 'name,password_hash', ','])
+def test_unknown_field_is_rejected(client, fields):
+    create_contacts(client, 1)
+    
+    response = client.get(f'/api/contacts?fields={fields}')
+    
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
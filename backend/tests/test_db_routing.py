@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+import config
+from app import create_app
+from app.models import db, REPLICA_BIND_KEY
+from conftest import capture_queries, create_contacts, register
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """App on a SQLite primary with a second SQLite database as its read replica"""
+    primary_path = tmp_path / 'primary.db'
+    replica_path = tmp_path / 'replica.db'
+    
+    class ReplicaConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{primary_path}'
+        SQLALCHEMY_BINDS = {REPLICA_BIND_KEY: f'sqlite:///{replica_path}'}
+    
+    monkeypatch.setitem(config.config, 'replica_testing', ReplicaConfig)
+    app = create_app('replica_testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.replicate = lambda: _copy_database(primary_path, replica_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _copy_database(source_path, target_path):
+    """Bring the replica up to date with the primary"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def _get_contacts(app, client):
+    """List contacts, returns the statements run on the primary and on the replica"""
+    with app.app_context():
+        primary, replica = db.engines[None], db.engines[REPLICA_BIND_KEY]
+    with capture_queries(primary) as primary_statements, capture_queries(replica) as replica_statements:
+        response = client.get('/api/contacts')
+    assert response.status_code == 200
+    return response.get_json(), primary_statements, replica_statements
+
+
+def _reads_contacts(statements):
+    return any('FROM contacts' in statement for statement in statements)
+
+
+def test_reads_go_to_an_up_to_date_replica(replica_app):
+    client = replica_app.test_client()
+    register(client, 'alice')
+    create_contacts(client, 3)
+    replica_app.replicate()
+    
+    data, primary_statements, replica_statements = _get_contacts(replica_app, client)
+    
+    assert len(data['contacts']) == 3
+    assert _reads_contacts(replica_statements)
+    assert not _reads_contacts(primary_statements)
+
+
+def test_read_after_write_falls_back_to_the_primary_while_the_replica_lags(replica_app):
+    client = replica_app.test_client()
+    register(client, 'alice')
+    create_contacts(client, 3)
+    replica_app.replicate()
+    
+    create_contacts(client, 1)
+    data, primary_statements, replica_statements = _get_contacts(replica_app, client)
+    
+    assert len(data['contacts']) == 4
+    assert _reads_contacts(primary_statements)
+    assert not _reads_contacts(replica_statements)
@@ -0,0 +1,69 @@
+import io
+import json
+
+from app.utils.dedupe import DuplicateIndex
+from conftest import create_contacts
+
+PHONE = ('phone', '13800000001')
+EMAIL = ('email', 'b@example.com')
+
+
+def test_find_prefers_existing_contacts_over_pending_ones():
+    index = DuplicateIndex('86')
+    index.add(5, 'Alice', [PHONE])
+    index.add(-1, 'Alice B', [EMAIL])
+    
+    assert index.find('Alice', [PHONE, EMAIL]) == 5
+
+
+def test_find_returns_the_first_pending_contact():
+    index = DuplicateIndex('86')
+    index.add(-1, 'Alice', [PHONE])
+    index.add(-2, 'Alice B', [EMAIL])
+    
+    assert index.find('Alice', [PHONE, EMAIL]) == -1
+
+
+def _import_ndjson(client, records, on_duplicate):
+    data = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+    return client.post('/api/import', data={
+        'file': (io.BytesIO(data), 'contacts.ndjson'),
+        'on_duplicate': on_duplicate
+    }, content_type='multipart/form-data')
+
+
+def test_upsert_of_a_row_earlier_in_the_file_counts_one_import(client):
+    methods = [{'type': PHONE[0], 'value': PHONE[1]}]
+    
+    response = _import_ndjson(client, [
+        {'name': 'Alice', 'methods': methods},
+        {'name': 'Alice Liddell', 'methods': methods}
+    ], 'upsert')
+    
+    assert response.status_code == 200
+    counts = response.get_json()
+    assert (counts['imported_count'], counts['updated_count']) == (1, 0)
+    contacts = client.get('/api/contacts').get_json()['contacts']
+    assert [contact['name'] for contact in contacts] == ['Alice Liddell']
+
+
+def test_sync_indexes_only_the_contacts_left_by_unchanged_rows(client, monkeypatch):
+    ids = create_contacts(client, 10)
+    exported = client.get('/api/export?format=csv').get_data(as_text=True)
+    indexed = []
+    load = DuplicateIndex.load.__func__
+    
+    def spy(cls, user_id, country_code=None, contact_ids=None):
+        indexed.append(contact_ids)
+        return load(cls, user_id, country_code, contact_ids)
+    
+    monkeypatch.setattr(DuplicateIndex, 'load', classmethod(spy))
+    response = client.post('/api/import', data={
+        'file': (io.BytesIO(exported.replace('Contact 00003,', 'Renamed 00003,').encode('utf-8')), 'contacts.csv'),
+        'on_duplicate': 'sync'
+    }, content_type='multipart/form-data')
+    
+    assert response.status_code == 200
+    counts = response.get_json()
+    assert (counts['unchanged_count'], counts['updated_count'], counts['deleted_count']) == (9, 1, 0)
+    assert indexed == [{ids[3]}]
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from conftest import create_contacts
+
+
+def _first_method_id(client, contact_id):
+    return client.get(f'/api/contacts/{contact_id}').get_json()['contact']['methods'][0]['id']
+
+
+def _import(client, contact_ids):
+    data = {'file': (io.BytesIO('{"name": "Imported"}\n'.encode()), 'contacts.ndjson')}
+    return client.post('/api/import', data=data, content_type='multipart/form-data')
+
+
+MUTATIONS = {
+    'create': lambda client, ids: client.post('/api/contacts', json={'name': 'New'}),
+    'update': lambda client, ids: client.put(f'/api/contacts/{ids[0]}', json={'name': 'Renamed'}),
+    'delete': lambda client, ids: client.delete(f'/api/contacts/{ids[0]}'),
+    'favorite': lambda client, ids: client.post(f'/api/contacts/{ids[0]}/favorite'),
+    'add_method': lambda client, ids: client.post(
+        f'/api/contacts/{ids[0]}/methods', json={'type': 'email', 'value': 'new@example.com'}
+    ),
+    'delete_method': lambda client, ids: client.delete(
+        f'/api/contacts/{ids[0]}/methods/{_first_method_id(client, ids[0])}'
+    ),
+    'batch': lambda client, ids: client.post('/api/contacts/batch', json={
+        'operations': [{'op': 'update', 'id': ids[0], 'name': 'Batched'}]
+    }),
+    'merge': lambda client, ids: client.post('/api/contacts/merge', json={
+        'target_id': ids[0], 'source_ids': [ids[1]]
+    }),
+    'import': _import
+}
+
+
+@pytest.mark.parametrize('mutation', MUTATIONS.values(), ids=MUTATIONS.keys())
+def test_mutation_changes_the_list_etag(client, mutation):
+    ids = create_contacts(client, 2)
+    response = client.get('/api/contacts')
+    etag = response.headers['ETag']
+    assert client.get('/api/contacts', headers={'If-None-Match': etag}).status_code == 304
+    
+    result = mutation(client, ids)
+    assert result.status_code < 300, result.get_json()
+    
+    response = client.get('/api/contacts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
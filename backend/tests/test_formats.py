@@ -0,0 +1,55 @@
+import io
+import json
+
+import pytest
+from openpyxl import Workbook
+
+from app.utils.formats import iter_contacts_from_file, iter_contacts_from_path
+from app.utils.ndjson import iter_contacts_from_ndjson
+
+
+@pytest.mark.parametrize('value, expected', [
+    (True, True), (False, False), (1, True), (0, False), (None, False),
+    ('true', True), ('TRUE', True), ('1', True), ('是', True),
+    ('false', False), ('0', False), ('否', False), ('', False)
+])
+def test_ndjson_favorite_values(value, expected):
+    line = json.dumps({'name': 'Alice', 'is_favorite': value}, ensure_ascii=False)
+    
+    contacts = list(iter_contacts_from_ndjson(io.StringIO(line + '\n')))
+    
+    assert contacts[0]['is_favorite'] is expected
+
+
+def _workbook(path):
+    """Two sheets, the second one being the active one"""
+    wb = Workbook()
+    first = wb.active
+    first.title = 'First'
+    second = wb.create_sheet('Second')
+    for ws, prefix in ((first, 'a'), (second, 'b')):
+        ws.append(['姓名', '是否收藏', '电话'])
+        for i in range(3):
+            ws.append([f'{prefix}{i}', '否', f'1380000000{i}'])
+    wb.active = 1
+    wb.save(path)
+
+
+@pytest.mark.parametrize('sheets, names', [
+    ('active', ['b0', 'b1', 'b2']),
+    ('all', ['a0', 'a1', 'a2', 'b0', 'b1', 'b2'])
+])
+def test_worker_count_does_not_change_imported_sheets(tmp_path, sheets, names):
+    path = tmp_path / 'contacts.xlsx'
+    _workbook(path)
+    
+    # Contacts carry their sheet name when several sheets are read
+    sheet_names = [{'a': 'First', 'b': 'Second'}[name[0]] if sheets == 'all' else None for name in names]
+    for workers in (1, 2):
+        contacts = list(iter_contacts_from_path(str(path), 'xlsx', workers, sheets))
+        assert [contact['name'] for contact in contacts] == names
+        assert [contact.get('sheet') for contact in contacts] == sheet_names
+        with open(path, 'rb') as file_stream:
+            contacts = list(iter_contacts_from_file(file_stream, 'xlsx', sheets))
+        assert [contact['name'] for contact in contacts] == names
+        assert [contact.get('sheet') for contact in contacts] == sheet_names
@@ -0,0 +1,61 @@
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from app import jobs
+from app.models import db, Job
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _add_job(user_id, worker, status='running', file_path=None, finished_at=None):
+    job = Job(
+        id=os.urandom(16).hex(), user_id=user_id, kind='import', status=status, file_format='csv',
+        worker=worker, file_path=file_path, finished_at=finished_at
+    )
+    db.session.add(job)
+    return job.id
+
+
+def test_recover_jobs_fails_only_jobs_of_exited_processes_of_this_host(app, client, tmp_path):
+    user_id = client.get('/api/auth/me').get_json()['user']['id']
+    host = socket.gethostname()
+    upload = tmp_path / 'job.upload'
+    upload.write_bytes(b'name\n')
+    with app.app_context():
+        dead = _add_job(user_id, f'{host}:{_dead_pid()}', file_path=str(upload))
+        pending = _add_job(user_id, f'{host}:{_dead_pid()}', status='pending')
+        alive = _add_job(user_id, f'{host}:{os.getppid()}')
+        other_host = _add_job(user_id, f'{host}-other:{_dead_pid()}')
+        db.session.commit()
+    
+    assert jobs.recover_jobs(app) == 2
+    
+    with app.app_context():
+        statuses = {job.id: job.status for job in Job.query}
+    assert statuses == {dead: 'failed', pending: 'failed', alive: 'running', other_host: 'running'}
+    assert not upload.exists()
+
+
+def test_expired_job_files_are_removed(app, client, tmp_path):
+    user_id = client.get('/api/auth/me').get_json()['user']['id']
+    old_file, new_file = tmp_path / 'old.csv', tmp_path / 'new.csv'
+    old_file.write_bytes(b'old')
+    new_file.write_bytes(b'new')
+    expired = datetime.utcnow() - timedelta(seconds=app.config['JOB_FILES_EXPIRES'] + 60)
+    with app.app_context():
+        old = _add_job(user_id, None, status='succeeded', file_path=str(old_file), finished_at=expired)
+        new = _add_job(user_id, None, status='succeeded', file_path=str(new_file), finished_at=datetime.utcnow())
+        
+        jobs._remove_expired_files(app)
+        db.session.commit()
+        
+        paths = {job.id: job.file_path for job in Job.query}
+    assert paths == {old: None, new: str(new_file)}
+    assert not old_file.exists() and new_file.exists()
@@ -0,0 +1,89 @@
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.json_provider import OrjsonProvider, StdlibJSONProvider
+from app.models import Contact, ContactMethod
+
+pytest.importorskip('orjson')
+
+NAMES = ['张伟', 'Zoë Ångström', 'O\'Brien "Bob"', 'emoji 📇', 'line\nbreak']
+
+
+def _providers(app):
+    return {'orjson': OrjsonProvider(app), 'stdlib': StdlibJSONProvider(app)}
+
+
+def _create_contacts(client):
+    for i, name in enumerate(NAMES):
+        response = client.post('/api/contacts', json={
+            'name': name,
+            'is_favorite': i % 2 == 0,
+            'methods': [
+                {'type': 'address', 'value': f'北京市朝阳区{i}号'},
+                {'type': 'email', 'value': f'user{i}@例子.cn'}
+            ]
+        })
+        assert response.status_code == 201
+
+
+def test_providers_encode_values_alike(app):
+    value = {
+        'name': '张伟 Zoë 📇',
+        'naive': datetime(2024, 5, 6, 7, 8, 9, 123456),
+        'aware': datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone.utc),
+        'whole_second': datetime(2024, 5, 6, 7, 8, 9),
+        'day': date(2024, 5, 6),
+        'amount': Decimal('1.10'),
+        'nested': [{'b': 1, 'a': None}, True, 1.5]
+    }
+    
+    encoded = {name: provider.dumps(value) for name, provider in _providers(app).items()}
+    
+    assert json.loads(encoded['orjson']) == json.loads(encoded['stdlib'])
+    assert json.loads(encoded['stdlib'])['naive'] == '2024-05-06T07:08:09.123456'
+
+
+def test_serialize_rows_matches_to_dict_under_both_providers(app, client):
+    _create_contacts(client)
+    
+    with app.app_context():
+        contacts = Contact.query.order_by(Contact.id).all()
+        methods = ContactMethod.group_by_contact([contact.id for contact in contacts])
+        from_models = [contact.to_dict(methods=methods.get(contact.id, [])) for contact in contacts]
+        from_rows = Contact.serialize_rows(Contact.select_rows(Contact.query.order_by(Contact.id)).all())
+        
+        decoded = {
+            (name, source): json.loads(provider.dumps(data))
+            for name, provider in _providers(app).items()
+            for source, data in (('to_dict', from_models), ('serialize_rows', from_rows))
+        }
+    
+    expected = decoded['stdlib', 'to_dict']
+    assert [contact['name'] for contact in expected] == NAMES
+    assert all(result == expected for result in decoded.values())
+
+
+@pytest.mark.parametrize('path', [
+    '/api/contacts',
+    '/api/contacts?limit=2&fields=name,created_at,methods',
+    '/api/contacts/changes?since=0',
+    '/api/contacts/search?q=北京'
+])
+def test_responses_are_the_same_under_both_providers(app, client, path):
+    _create_contacts(client)
+    separator = '&' if '?' in path else '?'
+    
+    bodies = {}
+    for name, provider in _providers(app).items():
+        app.json = provider
+        # The provider parameter keeps the responses apart in the response cache
+        response = client.get(f'{path}{separator}provider={name}')
+        assert response.status_code == 200
+        bodies[name] = response.get_data(as_text=True)
+    
+    decoded = json.loads(bodies['stdlib'])
+    assert json.loads(bodies['orjson']) == decoded
+    assert decoded.get('contacts') or decoded.get('changes')
@@ -0,0 +1,141 @@
+import cProfile
+import os
+
+import pytest
+
+import config
+from app import create_app, metrics
+from app.models import db
+
+TOKEN = 'metrics-token'
+
+
+@pytest.fixture
+def metrics_app(tmp_path, monkeypatch):
+    """App with instrumentation on and a metrics token"""
+    monkeypatch.setattr(config.TestingConfig, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(config.TestingConfig, 'METRICS_TOKEN', TOKEN)
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _get_metrics(client):
+    response = client.get('/api/metrics', headers={'Authorization': f'Bearer {TOKEN}'})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_request_raising_an_unhandled_exception_is_counted(metrics_app):
+    def boom():
+        raise RuntimeError('boom')
+    
+    metrics_app.add_url_rule('/api/boom', 'boom', boom)
+    client = metrics_app.test_client()
+    
+    with pytest.raises(RuntimeError):
+        client.get('/api/boom')
+    
+    text = _get_metrics(client)
+    assert 'addressbook_requests_total{endpoint="boom",method="GET",status="500"} 1' in text
+    assert 'addressbook_request_duration_seconds_count{endpoint="boom",method="GET"} 1' in text
+
+
+def test_handled_request_is_counted_once(metrics_app):
+    client = metrics_app.test_client()
+    
+    assert client.get('/api/health').status_code == 200
+    
+    text = _get_metrics(client)
+    assert 'addressbook_requests_total{endpoint="health_check",method="GET",status="200"} 1' in text
+
+
+@pytest.mark.parametrize('path', ['/api/metrics', '/api/cache/stats'])
+@pytest.mark.parametrize('headers', [{}, {'Authorization': 'Bearer wrong'}])
+def test_monitoring_endpoints_require_the_token(metrics_app, path, headers):
+    client = metrics_app.test_client()
+    
+    assert client.get(path, headers=headers).status_code == 401
+    assert client.get(path, headers={'Authorization': f'Bearer {TOKEN}'}).status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/api/metrics', '/api/cache/stats'])
+def test_monitoring_endpoints_are_closed_without_a_token(app, path):
+    assert app.test_client().get(path, headers={'Authorization': 'Bearer '}).status_code == 401
+
+
+@pytest.fixture
+def profiling_app(tmp_path, monkeypatch):
+    """App profiling every request to the health check"""
+    monkeypatch.setattr(config.TestingConfig, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(config.TestingConfig, 'PROFILE_ENDPOINT', 'health_check')
+    monkeypatch.setattr(config.TestingConfig, 'PROFILE_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(config.TestingConfig, 'PROFILE_FOLDER', str(tmp_path / 'profiles'))
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _profiles(app):
+    folder = app.config['PROFILE_FOLDER']
+    return os.listdir(folder) if os.path.isdir(folder) else []
+
+
+def test_sampled_request_is_profiled(profiling_app):
+    client = profiling_app.test_client()
+    
+    assert client.get('/api/health').status_code == 200
+    assert client.get('/api/health').status_code == 200
+    
+    assert len(_profiles(profiling_app)) == 2
+    assert not metrics._profiler_lock.locked()
+
+
+def test_request_is_not_profiled_while_another_one_is(profiling_app):
+    client = profiling_app.test_client()
+    
+    # Held by a concurrent profiled request
+    with metrics._profiler_lock:
+        assert client.get('/api/health').status_code == 200
+    
+    assert _profiles(profiling_app) == []
+
+
+def test_profiler_started_outside_the_app_does_not_fail_requests(profiling_app):
+    client = profiling_app.test_client()
+    outside = cProfile.Profile()
+    
+    # Python 3.12+ refuses a second active profiler
+    outside.enable()
+    try:
+        response = client.get('/api/health')
+    finally:
+        outside.disable()
+    
+    assert response.status_code == 200
+    assert not metrics._profiler_lock.locked()
+
+
+def test_profiler_is_released_when_the_view_raises(profiling_app):
+    def boom():
+        raise RuntimeError('boom')
+    
+    profiling_app.add_url_rule('/api/boom', 'boom', boom)
+    profiling_app.config['PROFILE_ENDPOINT'] = 'boom'
+    client = profiling_app.test_client()
+    
+    with pytest.raises(RuntimeError):
+        client.get('/api/boom')
+    
+    assert not metrics._profiler_lock.locked()
+    profiling_app.config['PROFILE_ENDPOINT'] = 'health_check'
+    assert client.get('/api/health').status_code == 200
+    assert len(_profiles(profiling_app)) == 1
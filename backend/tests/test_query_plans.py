@@ -0,0 +1,167 @@
+"""
+Query plans of the contact and import/export routes
+
+Every route is called on a seeded address book while its SQL is
+recorded, then each SELECT, UPDATE and DELETE is EXPLAINed, including
+the ones run with executemany. A plan that scans a whole table or sorts
+rows instead of reading them in index order fails the test.
+"""
+import io
+
+import pytest
+from sqlalchemy import event
+
+import config
+from app import create_app
+from app.models import db
+from conftest import create_contacts, register
+
+CONTACTS = 200
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+# (method, path, json body), formatted with the seeded IDs
+ROUTE_CALLS = [
+    ('GET', '/api/contacts', None),
+    ('GET', '/api/contacts?limit=50', None),
+    ('GET', '/api/contacts?limit=50&cursor={cursor}', None),
+    ('GET', '/api/contacts?limit=50&favorite=true', None),
+    ('GET', '/api/contacts?limit=50&search=Contact 0001', None),
+    ('GET', '/api/contacts?fields=name', None),
+    ('GET', '/api/contacts/count', None),
+    ('GET', '/api/contacts/count?favorite=true', None),
+    ('GET', '/api/contacts/changes?since=1', None),
+    ('GET', '/api/contacts/search?q=Contact 0001', None),
+    ('GET', '/api/contacts/{ids[0]}', None),
+    ('GET', '/api/contacts/duplicates', None),
+    ('GET', '/api/export?format=csv', None),
+    ('GET', '/api/export?format=xlsx', None),
+    ('POST', '/api/contacts', {'name': 'New', 'methods': [{'type': 'phone', 'value': '13900000000'}]}),
+    ('PUT', '/api/contacts/{ids[0]}', {'name': 'Renamed', 'methods': [{'type': 'email', 'value': 'a@b.c'}]}),
+    ('POST', '/api/contacts/{ids[0]}/favorite', None),
+    ('POST', '/api/contacts/{ids[0]}/methods', {'type': 'phone', 'value': '13911111111'}),
+    ('DELETE', '/api/contacts/{ids[1]}/methods/{method_id}', None),
+    ('POST', '/api/contacts/batch', {'operations': [
+        {'op': 'update', 'id': '{ids[2]}', 'name': 'Batch renamed'},
+        {'op': 'favorite', 'id': '{ids[3]}', 'value': True},
+        {'op': 'favorite', 'id': '{ids[4]}'},
+        {'op': 'add_method', 'contact_id': '{ids[5]}', 'type': 'email', 'value': 'batch@example.com'},
+        {'op': 'delete', 'id': '{ids[6]}'}
+    ]}),
+    ('DELETE', '/api/contacts/{ids[7]}', None),
+    ('POST', '/api/contacts/merge', {'target_id': '{ids[8]}', 'source_ids': ['{ids[9]}', '{ids[10]}']})
+]
+
+
+@pytest.fixture
+def seeded(tmp_path, monkeypatch):
+    """
+    Logged in client of a user with CONTACTS contacts, and the values route paths are formatted with
+    
+    The contact cache is off so that every call reaches the database. One
+    contact is renamed through its route, leaving its stored content hash
+    stale for the imports to recompute.
+    """
+    monkeypatch.setattr(config.TestingConfig, 'CACHE_MAX_SIZE', 0)
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    client = app.test_client()
+    register(client, 'alice')
+    ids = create_contacts(client, CONTACTS, favorite_every=7)
+    assert client.put(f'/api/contacts/{ids[20]}', json={'name': 'Edited'}).status_code == 200
+    values = {
+        'ids': ids,
+        'method_id': client.get(f'/api/contacts/{ids[1]}').get_json()['contact']['methods'][0]['id'],
+        'cursor': client.get('/api/contacts?limit=50').get_json()['next_cursor']
+    }
+    yield app, client, values
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _format(value, values):
+    """Fill the seeded values into a path or JSON body, '{ids[0]}' alone becomes the ID itself"""
+    if isinstance(value, dict):
+        return {key: _format(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_format(item, values) for item in value]
+    if isinstance(value, str):
+        formatted = value.format(**values)
+        return int(formatted) if value.startswith('{') and formatted.isdigit() else formatted
+    return value
+
+
+def plan_problems(statement, plan):
+    """Full table scans and sorts found in the SQLite query plan of a statement"""
+    # Search results are ranked by a score computed per match, which no index can provide
+    ranked = 'ORDER BY score' in ' '.join(statement.split())
+    problems = []
+    for step in plan:
+        # "SCAN contacts" without an index, "USE TEMP B-TREE FOR ORDER BY"
+        if step.startswith('SCAN ') and step.split()[1] in db.metadata.tables and ' USING ' not in step:
+            problems.append(f'full scan: {step}')
+        if 'TEMP B-TREE FOR' in step and 'ORDER BY' in step and not ranked:
+            problems.append(f'sort: {step}')
+    return problems
+
+
+def _check_plans(app, client, method, path, **kwargs):
+    """Call a route and return the plan problems of the statements it ran"""
+    captured = []
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+            # The plan of an executemany is the same for every parameter set
+            captured.append((statement, parameters[0] if executemany else parameters))
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code < 400, response.get_data(as_text=True)[:200]
+    assert captured
+    
+    problems = []
+    with engine.connect() as connection:
+        for statement, parameters in captured:
+            plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            problems.extend(f"{problem} in {' '.join(statement.split())[:160]}" for problem in plan_problems(statement, plan))
+    return captured, problems
+
+
+@pytest.mark.parametrize('method, path, body', ROUTE_CALLS, ids=[f'{method} {path}' for method, path, _ in ROUTE_CALLS])
+def test_route_query_plans_use_indexes(seeded, method, path, body):
+    app, client, values = seeded
+    kwargs = {} if body is None else {'json': _format(body, values)}
+    
+    _, problems = _check_plans(app, client, method, _format(path, values), **kwargs)
+    
+    assert problems == []
+
+
+@pytest.mark.parametrize('on_duplicate', ['insert', 'skip', 'merge', 'upsert', 'sync'])
+def test_import_query_plans_use_indexes(seeded, on_duplicate):
+    app, client, values = seeded
+    # The exported address book with one contact renamed, so that
+    # upsert and sync update it and sync deletes nothing else
+    exported = client.get('/api/export?format=csv').get_data(as_text=True)
+    csv_file = exported.replace('Contact 00001,', 'Imported 00001,').encode('utf-8')
+    
+    captured, problems = _check_plans(app, client, 'POST', '/api/import', data={
+        'file': (io.BytesIO(csv_file), 'contacts.csv'),
+        'on_duplicate': on_duplicate
+    })
+    
+    assert problems == []
+    if on_duplicate in ('upsert', 'sync'):
+        hash_writes = {
+            statement for statement, _ in captured
+            if statement.startswith('UPDATE contacts SET') and 'content_hash=?' in statement
+        }
+        # The stale hash refresh and the update of the renamed contact, both run with executemany
+        assert len(hash_writes) == 2
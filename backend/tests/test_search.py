@@ -0,0 +1,93 @@
+from sqlalchemy import inspect, text
+from app import migrate_app
+from app.models import db, ContactSearchTerm
+
+
+def _create(client, name, methods=(), is_favorite=False):
+    response = client.post('/api/contacts', json={
+        'name': name,
+        'is_favorite': is_favorite,
+        'methods': [{'type': method_type, 'value': value} for method_type, value in methods]
+    })
+    assert response.status_code == 201
+    return response.get_json()['contact']['id']
+
+
+def test_search_ranks_name_prefix_then_substring_then_value(client):
+    value_match = _create(client, 'Zed', [('email', 'anna@example.com')])
+    substring = _create(client, 'Joanna')
+    prefix = _create(client, 'Anna')
+    favorite_prefix = _create(client, 'Annabel', is_favorite=True)
+    _create(client, 'Bob', [('phone', '13800000000')])
+    
+    contacts = client.get('/api/contacts/search?q=anna').get_json()['contacts']
+    
+    assert [(contact['id'], contact['score']) for contact in contacts] == [
+        (favorite_prefix, 3), (prefix, 3), (substring, 2), (value_match, 1)
+    ]
+
+
+def test_search_limit_keeps_scores_on_their_contacts(client):
+    _create(client, 'Lee', [('email', 'li@example.com')])
+    best = _create(client, 'Li Lei')
+    
+    contacts = client.get('/api/contacts/search?q=li&limit=1').get_json()['contacts']
+    
+    assert [(contact['id'], contact['score']) for contact in contacts] == [(best, 3)]
+
+
+def test_long_query_grams_out_of_order_do_not_match(client):
+    # Has the 3-grams of "abcd" but not "abcd" itself
+    _create(client, 'xabcx bcdx')
+    match = _create(client, 'Abcde')
+    
+    contacts = client.get('/api/contacts/search?q=abcd').get_json()['contacts']
+    listed = client.get('/api/contacts?search=abcd').get_json()['contacts']
+    
+    assert [contact['id'] for contact in contacts] == [match]
+    assert [contact['id'] for contact in listed] == [match]
+
+
+def test_like_wildcards_in_queries_are_literal(client):
+    # Has the 3-grams of "xa_cx", and "xabcx" which "xa_cx" matches as a LIKE pattern
+    _create(client, 'xa_cy a_cx xabcx')
+    match = _create(client, 'xa_cx')
+    
+    contacts = client.get('/api/contacts/search', query_string={'q': 'xa_cx'}).get_json()['contacts']
+    
+    assert [contact['id'] for contact in contacts] == [match]
+
+
+def test_migrate_indexes_contacts_created_before_the_search_index(app, client):
+    contact_id = _create(client, 'Grace Hopper', [('email', 'grace@navy.mil')])
+    with app.app_context():
+        ContactSearchTerm.__table__.drop(db.engine)
+        
+        changes = migrate_app(app)
+    
+    assert 'indexed 1 contacts for search' in changes
+    contacts = client.get('/api/contacts/search?q=navy').get_json()['contacts']
+    assert [contact['id'] for contact in contacts] == [contact_id]
+
+
+def test_short_queries_match_words_of_values_by_prefix(client):
+    word_start = _create(client, 'Zed', [('email', 'li@example.com')])
+    _create(client, 'Yan', [('email', 'ali@example.com')])
+    
+    contacts = client.get('/api/contacts/search?q=li').get_json()['contacts']
+    
+    assert [contact['id'] for contact in contacts] == [word_start]
+
+
+def test_migrate_drops_the_legacy_search_table(app, client):
+    contact_id = _create(client, 'Grace Hopper')
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text('CREATE TABLE contact_search_tokens (id INTEGER PRIMARY KEY, token VARCHAR(3))'))
+        
+        changes = migrate_app(app)
+        
+        assert 'dropped table contact_search_tokens' in changes
+        assert not inspect(db.engine).has_table('contact_search_tokens')
+    contacts = client.get('/api/contacts/search?q=gra').get_json()['contacts']
+    assert [contact['id'] for contact in contacts] == [contact_id]
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from app import create_app
+from app.models import db, ContactTombstone
+from conftest import create_contacts, register
+
+
+def _changes(client, since):
+    response = client.get('/api/contacts/changes', query_string={'since': since})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _age_tombstones(app, days):
+    with app.app_context():
+        db.session.execute(
+            db.update(ContactTombstone).values(deleted_at=datetime.utcnow() - timedelta(days=days))
+        )
+        db.session.commit()
+
+
+def test_deleted_contact_comes_back_as_a_tombstone(client):
+    kept, deleted = create_contacts(client, 2)
+    cursor = _changes(client, 0)['cursor']
+    
+    assert client.delete(f'/api/contacts/{deleted}').status_code == 200
+    
+    changes = _changes(client, cursor)
+    assert changes['changes'] == []
+    assert changes['deleted'] == [deleted]
+    assert changes['full_resync'] is False
+    assert changes['cursor'] > cursor
+    assert _changes(client, changes['cursor'])['deleted'] == []
+    assert [contact['id'] for contact in _changes(client, 0)['changes']] == [kept]
+
+
+def test_batch_delete_comes_back_as_tombstones(client):
+    contact_ids = create_contacts(client, 3)
+    cursor = _changes(client, 0)['cursor']
+    
+    response = client.post('/api/contacts/batch', json={'operations': [
+        {'op': 'delete', 'id': contact_id} for contact_id in contact_ids[:2]
+    ]})
+    
+    assert response.status_code == 200
+    assert sorted(_changes(client, cursor)['deleted']) == contact_ids[:2]
+
+
+@pytest.mark.parametrize('change', ['add', 'delete', 'batch_add', 'batch_delete'])
+def test_method_change_returns_its_contact(client, change):
+    contact_id, _ = create_contacts(client, 2)
+    contact = client.get(f'/api/contacts/{contact_id}').get_json()['contact']
+    method_id = contact['methods'][0]['id']
+    cursor = _changes(client, 0)['cursor']
+    
+    if change == 'add':
+        response = client.post(f'/api/contacts/{contact_id}/methods', json={'type': 'social', 'value': 'alice_wx'})
+    elif change == 'delete':
+        response = client.delete(f'/api/contacts/{contact_id}/methods/{method_id}')
+    elif change == 'batch_add':
+        response = client.post('/api/contacts/batch', json={'operations': [
+            {'op': 'add_method', 'contact_id': contact_id, 'type': 'social', 'value': 'alice_wx'}
+        ]})
+    else:
+        response = client.post('/api/contacts/batch', json={'operations': [
+            {'op': 'delete_method', 'contact_id': contact_id, 'method_id': method_id}
+        ]})
+    assert response.status_code in (200, 201), response.get_json()
+    
+    changes = _changes(client, cursor)
+    assert [contact['id'] for contact in changes['changes']] == [contact_id]
+    values = {method['value'] for method in changes['changes'][0]['methods']}
+    assert ('alice_wx' in values) == change.endswith('add')
+    assert len(values) == (3 if change.endswith('add') else 1)
+    assert changes['deleted'] == []
+
+
+def test_changes_of_other_users_are_not_returned(app, client):
+    create_contacts(client, 1)
+    other = app.test_client()
+    register(other, 'bob')
+    
+    assert _changes(other, 0)['changes'] == []
+
+
+@pytest.mark.parametrize('since', ['abc', '1.5', '-1'])
+def test_invalid_since_is_rejected(client, since):
+    response = client.get('/api/contacts/changes', query_string={'since': since})
+    
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_since_ahead_of_the_current_version_gets_a_full_resync(client):
+    contact_ids = create_contacts(client, 2)
+    cursor = _changes(client, 0)['cursor']
+    
+    changes = _changes(client, cursor + 100)
+    
+    assert changes['full_resync'] is True
+    assert changes['cursor'] == cursor
+    assert sorted(contact['id'] for contact in changes['changes']) == contact_ids
+
+
+@pytest.fixture
+def retention_app(monkeypatch, tmp_path):
+    """App keeping tombstones for one day"""
+    monkeypatch.setattr(config.TestingConfig, 'TOMBSTONE_RETENTION', 86400)
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_expired_tombstones_are_pruned_on_delete(retention_app):
+    client = retention_app.test_client()
+    register(client, 'alice')
+    first, second, kept = create_contacts(client, 3)
+    cursor = _changes(client, 0)['cursor']
+    client.delete(f'/api/contacts/{first}')
+    _age_tombstones(retention_app, days=2)
+    
+    client.delete(f'/api/contacts/{second}')
+    
+    with retention_app.app_context():
+        assert [contact_id for contact_id, in db.session.query(ContactTombstone.contact_id)] == [second]
+    # The first deletion is gone, a client that has not seen it must resync
+    changes = _changes(client, cursor)
+    assert changes['full_resync'] is True
+    assert [contact['id'] for contact in changes['changes']] == [kept]
+    # Clients that synced after the pruned deletion still get deltas
+    after_first = changes['cursor'] - 1
+    changes = _changes(client, after_first)
+    assert changes['full_resync'] is False
+    assert changes['deleted'] == [second]
+
+
+def test_recent_tombstones_are_kept(retention_app):
+    client = retention_app.test_client()
+    register(client, 'alice')
+    first, second = create_contacts(client, 2)
+    cursor = _changes(client, 0)['cursor']
+    
+    client.delete(f'/api/contacts/{first}')
+    client.delete(f'/api/contacts/{second}')
+    
+    changes = _changes(client, cursor)
+    assert changes['full_resync'] is False
+    assert changes['deleted'] == [first, second]
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+
+DATA = b'{"name": "Alice"}\n{"name": "Bob"}\n'
+
+
+def _without_input_terminated(wsgi_app):
+    """Serve requests the way Werkzeug's server does, which lets the app enforce Content-Length"""
+    def middleware(environ, start_response):
+        environ.pop('wsgi.input_terminated', None)
+        return wsgi_app(environ, start_response)
+    return middleware
+
+
+def _put(client, upload_id, offset, body, content_length=None):
+    return client.put(f'/api/uploads/{upload_id}', query_string={'offset': offset}, environ_overrides={
+        'wsgi.input': io.BytesIO(body),
+        'CONTENT_LENGTH': str(len(body) if content_length is None else content_length)
+    })
+
+
+@pytest.mark.parametrize('server', ['gunicorn', 'werkzeug'])
+def test_upload_resumes_after_a_truncated_part(app, client, server):
+    if server == 'werkzeug':
+        app.wsgi_app = _without_input_terminated(app.wsgi_app)
+    upload = client.post('/api/uploads', json={'filename': 'contacts.ndjson', 'size': len(DATA)}).get_json()['upload']
+    
+    # The connection drops after 10 of the 20 bytes of the first part
+    truncated = _put(client, upload['id'], 0, DATA[:10], content_length=20)
+    assert truncated.status_code == 400
+    offset = client.get(f"/api/uploads/{upload['id']}").get_json()['upload']['offset']
+    assert offset == 10
+    
+    resumed = _put(client, upload['id'], offset, DATA[offset:])
+    
+    assert resumed.status_code == 200
+    assert resumed.get_json()['upload']['offset'] == len(DATA)
+    with open(f"{app.config['UPLOAD_FOLDER']}/uploads/{upload['id']}.part", 'rb') as part_file:
+        assert part_file.read() == DATA
+
+
+class _RacingBody(io.BytesIO):
+    """Request body that runs another request before its first byte is read"""
+    
+    def __init__(self, data, race):
+        super().__init__(data)
+        self.race = race
+    
+    def _run_race(self):
+        race, self.race = self.race, None
+        if race is not None:
+            race()
+    
+    def read(self, size=-1):
+        self._run_race()
+        return super().read(size)
+    
+    def readinto(self, buffer):
+        self._run_race()
+        return super().readinto(buffer)
+
+
+def test_concurrent_parts_at_the_same_offset_do_not_corrupt_the_file(app, client):
+    upload = client.post('/api/uploads', json={'filename': 'contacts.ndjson', 'size': len(DATA)}).get_json()['upload']
+    retries = []
+    
+    # A retried part passes the offset check while the first attempt is still being received
+    body = _RacingBody(DATA, lambda: retries.append(_put(client, upload['id'], 0, DATA)))
+    first = client.put(f"/api/uploads/{upload['id']}", query_string={'offset': 0}, environ_overrides={
+        'wsgi.input': body,
+        'CONTENT_LENGTH': str(len(DATA))
+    })
+    
+    assert retries[0].status_code == 200
+    assert first.status_code == 200
+    assert first.get_json()['upload']['offset'] == len(DATA)
+    with open(f"{app.config['UPLOAD_FOLDER']}/uploads/{upload['id']}.part", 'rb') as part_file:
+        assert part_file.read() == DATA
@@ -0,0 +1,73 @@
+import io
+import json
+
+import pytest
+from openpyxl import Workbook
+
+from app.utils.validation import NAME_MAX_LENGTH
+
+TOO_LONG = json.dumps({'name': 'x' * (NAME_MAX_LENGTH + 1)}) + '\n'
+
+
+def _validate(client, query_string, form):
+    response = client.post('/api/import/validate', query_string=query_string, data={
+        'file': (io.BytesIO((TOO_LONG * 5).encode('utf-8')), 'contacts.ndjson'),
+        **form
+    })
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('query_string, form', [({'max_errors': '2'}, {}), ({}, {'max_errors': '2'})])
+def test_max_errors_is_read_from_the_form_or_the_query_string(client, query_string, form):
+    lines = _validate(client, query_string, form)
+    
+    assert len([line for line in lines if line.get('level') == 'error']) == 2
+    assert lines[-1]['truncated'] is True
+
+
+def _two_sheet_workbook():
+    """Sheets with a too long name on row 3 of each, and a row of the first repeated in the second"""
+    wb = Workbook()
+    first = wb.active
+    first.title = 'Friends'
+    second = wb.create_sheet('Work')
+    for ws in (first, second):
+        ws.append(['姓名', '是否收藏', '电话'])
+    first.append(['Alice', '否', '13800000001'])
+    first.append(['x' * (NAME_MAX_LENGTH + 1), '否', '13800000002'])
+    second.append(['Bob', '否', '13800000003'])
+    second.append(['y' * (NAME_MAX_LENGTH + 1), '否', '13800000004'])
+    second.append(['Alice', '否', '13800000001'])
+    second.append(['Bob', '否', '13800000003'])
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+def _validate_workbook(client, sheets):
+    response = client.post('/api/import/validate', data={
+        'file': (_two_sheet_workbook(), 'contacts.xlsx'),
+        'sheets': sheets
+    })
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_problems_of_several_sheets_name_their_sheet(client):
+    lines = _validate_workbook(client, 'all')
+    
+    problems = [(line['sheet'], line['row'], line['level']) for line in lines if line['type'] == 'problem']
+    assert problems == [('Friends', 3, 'error'), ('Work', 3, 'error'), ('Work', 4, 'warning'), ('Work', 5, 'warning')]
+    warnings = [line['message'] for line in lines if line.get('level') == 'warning']
+    assert warnings == ['与工作表Friends第2行的联系人重复', '与第2行的联系人重复']
+    assert lines[-1]['rows'] == 6
+
+
+def test_problems_of_one_sheet_have_no_sheet(client):
+    lines = _validate_workbook(client, 'active')
+    
+    problems = [line for line in lines if line['type'] == 'problem']
+    assert [(line['row'], line['level']) for line in problems] == [(3, 'error')]
+    assert 'sheet' not in problems[0]